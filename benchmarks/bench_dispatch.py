@@ -0,0 +1,83 @@
+"""
+Wall-clock per model turn: serial call_function loop vs. call_functions dispatcher.
+
+    python benchmarks/bench_dispatch.py --calls 8 --latency-ms 20
+
+--latency-ms adds a fixed delay to every tool call to model slow storage (network
+file systems, cold page cache); with 0 the numbers show the raw dispatcher overhead.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.genai import types
+from coding_agent.functions import call_function as dispatch
+from coding_agent.functions.registry import DEFAULT_REGISTRY
+
+
+def make_tree(root, n_files):
+    for i in range(n_files):
+        with open(os.path.join(root, f"file_{i}.py"), "w") as f:
+            f.write(f"# file {i}\n" + "x = 1\n" * 2000)
+
+
+def with_latency(func, delay):
+    def wrapped(*args, **kwargs):
+        time.sleep(delay)
+        return func(*args, **kwargs)
+    return wrapped
+
+
+def serial_turn(function_calls, work_dir):
+    return [dispatch.call_function(fc.name, fc.args, work_dir) for fc in function_calls]
+
+
+def parallel_turn(function_calls, work_dir):
+    return dispatch.call_functions(function_calls, work_dir)
+
+
+def measure(turn_fn, function_calls, work_dir, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        turn_fn(function_calls, work_dir)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=8, help="function calls per model turn")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="simulated per-call tool latency")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.latency_ms:
+        delay = args.latency_ms / 1000
+        for name in ("get_file_content", "get_files_info", "write_file"):
+            tool = DEFAULT_REGISTRY.get(name)
+            tool.function = with_latency(tool.function, delay)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        make_tree(work_dir, args.calls)
+        reads = [types.FunctionCall(name="get_file_content", args={"file_path": f"file_{i}.py"})
+                 for i in range(args.calls)]
+        mixed = reads[: args.calls // 2] + [
+            types.FunctionCall(name="write_file", args={"file_path": "out.txt", "content": "done"}),
+            types.FunctionCall(name="get_files_info", args={}),
+        ] + reads[args.calls // 2:]
+
+        print(f"{'turn':<20}{'serial ms':>12}{'parallel ms':>14}{'speedup':>10}")
+        for label, calls in ((f"{args.calls} reads", reads), ("reads + write", mixed)):
+            serial = measure(serial_turn, calls, work_dir, args.repeat)
+            parallel = measure(parallel_turn, calls, work_dir, args.repeat)
+            print(f"{label:<20}{serial * 1000:>12.2f}{parallel * 1000:>14.2f}{serial / parallel:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
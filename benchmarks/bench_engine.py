@@ -0,0 +1,79 @@
+"""
+Per-iteration overhead of AgentEngine: everything the loop does besides waiting on the model and tools.
+
+The model is the scripted stub (instant answers) and the only tool is a no-op registered in its own
+registry, so the time per iteration is the engine itself: history compaction, streaming, scheduling,
+dispatch and bookkeeping. Each hook is measured on its own.
+
+    python benchmarks/bench_engine.py --iterations 200 --calls 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.genai import types
+from coding_agent.engine import AgentEngine
+from coding_agent.functions.cache import ToolCache
+from coding_agent.functions.call_function import call_function
+from coding_agent.functions.registry import Tool, ToolRegistry
+from coding_agent.replay import ScriptedClient
+from coding_agent.tracing import Tracer
+
+NOOP = Tool(lambda working_directory, **kwargs: "ok", types.FunctionDeclaration(name="noop", description="Do nothing."),
+            read_only=True)
+
+
+def session_turns(iterations, calls):
+    call = types.Part(function_call=types.FunctionCall(name="noop", args={}))
+    return [[call] * calls] * (iterations - 1) + [["done"]]
+
+
+def per_iteration_us(work_dir, iterations, calls, repeat, **hooks):
+    registry = ToolRegistry([NOOP])
+    samples = []
+    for _ in range(repeat):
+        engine = AgentEngine(ScriptedClient(session_turns(iterations, calls)), registry=registry,
+                             max_iters=iterations, **{k: v() for k, v in hooks.items()})
+        started = time.perf_counter()
+        result = engine.run("benchmark", work_dir)
+        samples.append((time.perf_counter() - started) / iterations * 1e6)
+        assert result["text"] == "done", result
+    return statistics.median(samples)
+
+
+def dispatch_us(work_dir, n=20000):
+    registry = ToolRegistry([NOOP])
+    started = time.perf_counter()
+    for _ in range(n):
+        call_function("noop", {}, work_dir, registry=registry)
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200, help="iterations per session")
+    parser.add_argument("--calls", type=int, default=1, help="tool calls per iteration")
+    parser.add_argument("--repeat", type=int, default=5, help="sessions per variant (median is kept)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        variants = {
+            "bare": {},
+            "tool cache": {"tool_cache": ToolCache},
+            "tracer": {"tracer": Tracer},
+            "no history budget": {"history_budget": lambda: 0},
+        }
+        print(f"{args.iterations} iterations x {args.calls} call(s), median of {args.repeat} sessions")
+        for name, hooks in variants.items():
+            us = per_iteration_us(work_dir, args.iterations, args.calls, args.repeat, **hooks)
+            print(f"  {name:<20}{us:>9.0f} us/iteration")
+        print(f"  {'dispatch only':<20}{dispatch_us(work_dir):>9.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
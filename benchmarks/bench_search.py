@@ -0,0 +1,92 @@
+"""
+search_code index: build time, on-disk size, incremental update and query latency.
+
+    python benchmarks/bench_search.py --files 10000
+
+Generates a synthetic repository of --files Python modules, then compares indexed
+queries with a plain scan of every file (what the model otherwise does via
+get_files_info + get_file_content, minus the model round-trips).
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_repo(root, n_files, rng):
+    words = ["user", "order", "invoice", "client", "session", "cache", "parser", "token", "event", "report"]
+    for i in range(n_files):
+        package = os.path.join(root, f"pkg_{i % 100}")
+        os.makedirs(package, exist_ok=True)
+        lines = [f"import os\n\n"]
+        for j in range(20):
+            name = f"{rng.choice(words)}_{rng.choice(words)}_{i}_{j}"
+            lines.append(f"def {name}(value):\n    return handle_{rng.choice(words)}(value, {j})\n\n")
+        with open(os.path.join(package, f"module_{i}.py"), "w") as f:
+            f.write("".join(lines))
+
+
+def scan(root, query):
+    pattern = re.compile(re.escape(query), re.IGNORECASE)
+    hits = 0
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            with open(os.path.join(dirpath, name), errors="replace") as f:
+                hits += sum(1 for line in f if pattern.search(line))
+    return hits
+
+
+def timed(fn, *args, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # keep the index out of the real cache dir
+        os.environ["XDG_CACHE_HOME"] = os.path.join(tmp, "cache")
+        from coding_agent.functions import search_code as sc
+
+        repo = os.path.join(tmp, "repo")
+        make_repo(repo, args.files, random.Random(0))
+
+        start = time.perf_counter()
+        sc.update_index(repo)
+        build = time.perf_counter() - start
+        size = os.path.getsize(sc.index_path(repo))
+        noop = timed(sc.update_index, repo)
+
+        for i in range(0, args.files, max(args.files // 100, 1)):
+            path = os.path.join(repo, f"pkg_{i % 100}", f"module_{i}.py")
+            with open(path, "a") as f:
+                f.write("\ndef freshly_added_helper():\n    pass\n")
+        start = time.perf_counter()
+        changed, _ = sc.update_index(repo)
+        incremental = time.perf_counter() - start
+
+        print(f"files: {args.files}")
+        print(f"index build: {build:.2f}s, size {size / 1e6:.1f} MB")
+        print(f"no-op update: {noop * 1000:.1f} ms; update after touching {changed} files: {incremental * 1000:.1f} ms")
+        print(f"{'query':<28}{'search_code ms':>16}{'full scan ms':>14}")
+        for query in (f"invoice_client_{args.files // 2}_3", "freshly_added_helper", "handle_token(value, 7)"):
+            indexed = timed(sc.search_code, repo, query)
+            full = timed(scan, repo, query, repeat=2)
+            print(f"{query:<28}{indexed * 1000:>16.1f}{full * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
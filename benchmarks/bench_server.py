@@ -0,0 +1,105 @@
+"""
+Session throughput and p95 turn latency of `coding-agent serve` against the local stub model.
+
+    python benchmarks/bench_server.py --sessions 200 --concurrency 32 --latency-ms 50
+
+The server runs in a subprocess with one shared client pointed at benchmarks/stub_model.py;
+every session lists its own work dir and then answers, i.e. two model turns per session.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from coding_agent.server import request_session
+from stub_model import start_stub
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_for_port(port, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+async def drive(port, sessions, concurrency, n_dirs):
+    turns = []
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    def on_event(event):
+        if event["type"] == "iteration":
+            turns.append(event["seconds"])
+
+    async def one(i):
+        nonlocal failures
+        async with semaphore:
+            result = await request_session("List the files", work_dir=f"session_{i % n_dirs}", port=port,
+                                           on_event=on_event)
+            if not result or result["status"] != "ok":
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(sessions)))
+    return time.perf_counter() - start, turns, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="stub model latency per response")
+    args = parser.parse_args()
+
+    stub, base_url = start_stub(latency=args.latency_ms / 1000)
+    port = free_port()
+    with tempfile.TemporaryDirectory() as root:
+        n_dirs = min(args.sessions, 16)
+        for i in range(n_dirs):
+            os.makedirs(os.path.join(root, f"session_{i}"))
+            with open(os.path.join(root, f"session_{i}", "main.py"), "w") as f:
+                f.write("print('hello')\n")
+        env = dict(os.environ, GEMINI_API_KEY=os.environ.get("GEMINI_API_KEY", "stub-key"))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "coding_agent", "serve", "--port", str(port), "--root", root,
+             "--base-url", base_url, "--max-sessions", str(args.concurrency)],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+        )
+        try:
+            asyncio.run(wait_for_port(port))
+            elapsed, turns, failures = asyncio.run(drive(port, args.sessions, args.concurrency, n_dirs))
+        finally:
+            server.terminate()
+            server.wait()
+    stub.shutdown()
+
+    turns.sort()
+    p95 = turns[int(len(turns) * 0.95) - 1] if turns else float("nan")
+    print(f"sessions: {args.sessions} (failed {failures}), concurrency: {args.concurrency}")
+    print(f"throughput: {args.sessions / elapsed:.1f} sessions/s over {elapsed:.2f}s")
+    print(f"turn latency: median {statistics.median(turns) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms "
+          f"(stub model latency {args.latency_ms:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+CLI startup cost: how long `coding-agent --help` takes and what the package imports to get there.
+
+Each run is a fresh interpreter. The time of a bare `python -c pass` is measured too and
+subtracted, since interpreter and site start-up (.pth files of the environment) are not ours.
+`-X importtime` then lists the slowest modules imported by coding_agent.cli, and the run fails
+if the SDK is among them or the CLI's own share is above --target-ms.
+
+    python benchmarks/bench_startup.py --repeat 20 --target-ms 50
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that must not be loaded just to parse arguments
+HEAVY = ["google.genai", "dotenv", "coding_agent.engine", "coding_agent.config"]
+
+
+def wall_ms(args, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def import_times(module):
+    """(module, self_us, cumulative_us) of every import made by `import module`, from -X importtime."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def loaded(module, names):
+    code = f"import sys, {module}; print(' '.join(n for n in {names!r} if n in sys.modules))"
+    return subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                          check=True).stdout.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10, help="runs per measurement (median is kept)")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--target-ms", type=float, default=50.0, help="allowed --help time on top of the interpreter")
+    args = parser.parse_args()
+
+    bare = wall_ms(["-c", "pass"], args.repeat)
+    help_ms = wall_ms(["-m", "coding_agent", "--help"], args.repeat)
+    rows = import_times("coding_agent.cli")
+    own = next((cumulative for name, _, cumulative in rows if name == "coding_agent.cli"), 0) / 1000
+    print(f"python -c pass                  {bare:>8.1f} ms")
+    print(f"python -m coding_agent --help   {help_ms:>8.1f} ms  ({help_ms - bare:+.1f} ms over the interpreter)")
+    print(f"import coding_agent.cli         {own:>8.1f} ms")
+    print("slowest imports under coding_agent.cli (self time):")
+    start = next((i for i, row in enumerate(rows) if row[0] == "coding_agent.cli"), len(rows))
+    # importtime prints a package after its submodules, so the CLI's imports are the rows before it
+    # that were not already part of site start-up
+    site = next((i for i, row in enumerate(rows) if row[0] == "site"), -1)
+    for name, self_us, _ in sorted(rows[site + 1:start + 1], key=lambda r: -r[1])[:args.top]:
+        print(f"  {self_us / 1000:>8.2f} ms  {name}")
+
+    heavy = loaded("coding_agent.cli", HEAVY)
+    failures = []
+    if heavy:
+        failures.append(f"importing coding_agent.cli loads {', '.join(heavy)}")
+    if help_ms - bare > args.target_ms:
+        failures.append(f"--help takes {help_ms - bare:.1f} ms over the interpreter (target {args.target_ms:g} ms)")
+    for line in failures:
+        print("FAIL", line)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+run_python_file latency: cold interpreter spawn vs. fork from a warm pool worker.
+
+    python benchmarks/bench_warm_pool.py --repeat 20
+
+The import-heavy script imports --heavy (default: google.genai, which the agent itself
+depends on); the warm pool preimports the same modules.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from coding_agent.functions.run_python_file import run_python_file
+from coding_agent.functions.warm_pool import WarmPool
+
+
+def measure(work_dir, script, repeat, pool=None):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = run_python_file(work_dir, script, pool=pool)
+        timings.append(time.perf_counter() - start)
+    assert "ok" in output, output
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--heavy", default="google.genai", help="comma-separated modules for the heavy script")
+    args = parser.parse_args()
+    heavy = [m for m in args.heavy.split(",") if m]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        with open(os.path.join(work_dir, "trivial.py"), "w") as f:
+            f.write("print('ok')\n")
+        with open(os.path.join(work_dir, "heavy.py"), "w") as f:
+            f.write("".join(f"import {m}\n" for m in heavy) + "print('ok')\n")
+
+        with WarmPool(size=1, preimport=heavy) as pool:
+            measure(work_dir, "trivial.py", 1, pool)
+            print(f"{'script':<10}{'cold ms':>10}{'warm ms':>10}{'speedup':>10}")
+            for script in ("trivial.py", "heavy.py"):
+                cold = measure(work_dir, script, args.repeat)
+                warm = measure(work_dir, script, args.repeat, pool)
+                print(f"{script:<10}{cold * 1000:>10.1f}{warm * 1000:>10.1f}{cold / warm:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Offline benchmark suite: end-to-end session latency, tool throughput and per-iteration overhead.
+
+Every model call is answered by the scripted stub model (coding_agent.replay), so the suite needs
+no network and no API key. All metrics are milliseconds per operation (lower is better).
+
+    python benchmarks/run_all.py --json results.json
+    python benchmarks/run_all.py --baseline results.json --tolerance 0.25   # exit 1 on regressions
+"""
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# keep the search indexes of the generated repos out of the user's cache (read at import time)
+os.environ["XDG_CACHE_HOME"] = tempfile.mkdtemp(prefix="coding-agent-bench-")
+atexit.register(shutil.rmtree, os.environ["XDG_CACHE_HOME"], True)
+
+from google.genai import types
+from coding_agent.cli import run_async
+from coding_agent.functions.call_function import call_function
+from coding_agent.replay import RecordingClient, ReplayClient, ScriptedClient
+
+
+def make_repo(root, n_files):
+    for i in range(n_files):
+        package = os.path.join(root, f"pkg_{i % 10}")
+        os.makedirs(package, exist_ok=True)
+        with open(os.path.join(package, f"module_{i}.py"), "w") as f:
+            f.write(f"def handler_{i}(value):\n    return value * {i}\n\n" + "x = 1\n" * 200)
+    with open(os.path.join(root, "main.py"), "w") as f:
+        f.write("print(sum(range(1000)))\n")
+
+
+def call(name, **args):
+    return types.Part(function_call=types.FunctionCall(name=name, args=args))
+
+
+SESSION = [
+    [call("get_files_info", max_depth=2), call("search_code", query="handler_7")],
+    [call("get_file_content", file_path="pkg_7/module_7.py"), call("get_file_content", file_path="main.py")],
+    [call("run_python_file", file_path="main.py")],
+    ["The script prints ", "499500."],
+]
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def session(client, work_dir):
+    result = asyncio.run(run_async("What does main.py print?", work_dir_path=work_dir, client=client))
+    assert result["status"] == "ok" and result["text"], result
+
+
+def bench_sessions(work_dir, repeat):
+    results = {"session_ms": timed(lambda: session(ScriptedClient(SESSION), work_dir), repeat)}
+    with tempfile.TemporaryDirectory() as tmp:
+        recording = os.path.join(tmp, "session.jsonl")
+        session(RecordingClient(ScriptedClient(SESSION), recording), work_dir)
+        results["replay_session_ms"] = timed(lambda: session(ReplayClient(recording), work_dir), repeat)
+    return results
+
+
+def bench_tools(work_dir, repeat):
+    calls = {
+        "get_files_info": {"max_depth": 2},
+        "get_file_content": {"file_path": "pkg_3/module_3.py"},
+        "search_code": {"query": "handler_42"},
+        "run_python_file": {"file_path": "main.py"},
+        "snapshot_repo": {},
+    }
+    results = {}
+    for name, args in calls.items():
+        call_function(name, args, work_dir)  # warm the page cache, the search index and the snapshot
+        results[f"tool_{name}_ms"] = timed(lambda: call_function(name, args, work_dir), repeat)
+    return results
+
+
+def bench_iteration_overhead(work_dir, iterations):
+    """Loop cost per iteration with an instant model and the cheapest tool call."""
+    turns = [[call("get_file_content", file_path="main.py")]] * (iterations - 1) + [["done"]]
+    started = time.perf_counter()
+    asyncio.run(run_async("loop", work_dir_path=work_dir, client=ScriptedClient(turns), max_iters=iterations))
+    elapsed = (time.perf_counter() - started) * 1000
+    tool = timed(lambda: call_function("get_file_content", {"file_path": "main.py"}, work_dir), 50)
+    return {"iteration_overhead_ms": elapsed / iterations - tool}
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, value in results.items():
+        before = baseline.get(name)
+        if before and value > before * (1 + tolerance):
+            regressions.append(f"{name}: {before:.2f} -> {value:.2f} ms (+{(value / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=500, help="files in the generated repo")
+    parser.add_argument("--repeat", type=int, default=10, help="runs per measurement (median is kept)")
+    parser.add_argument("--iterations", type=int, default=50, help="iterations for the overhead run")
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    parser.add_argument("--baseline", default=None, help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs. the baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        make_repo(work_dir, args.files)
+        results = {}
+        results.update(bench_sessions(work_dir, args.repeat))
+        results.update(bench_tools(work_dir, args.repeat))
+        results.update(bench_iteration_overhead(work_dir, args.iterations))
+
+    for name, value in results.items():
+        print(f"{name:<32}{value:>10.2f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
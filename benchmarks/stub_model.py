@@ -0,0 +1,75 @@
+"""
+Local stand-in for the Gemini streamGenerateContent endpoint.
+
+Each session gets a scripted two-turn exchange: the first request is answered with a
+get_files_info function call, the request carrying its result is answered with text.
+Point a client at it with `coding-agent serve --base-url http://127.0.0.1:<port>`.
+
+    python benchmarks/stub_model.py --port 8766 --latency-ms 50
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _chunk(parts, prompt_tokens, usage=True):
+    body = {"candidates": [{"content": {"role": "model", "parts": parts}}]}
+    if usage:
+        body["usageMetadata"] = {"promptTokenCount": prompt_tokens, "candidatesTokenCount": 8,
+                                 "totalTokenCount": prompt_tokens + 8}
+    return "data: " + json.dumps(body) + "\r\n\r\n"
+
+
+def make_handler(latency):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            contents = request.get("contents", [])
+            prompt_tokens = len(json.dumps(contents)) // 4
+            answered = any("functionResponse" in part for content in contents for part in content.get("parts", []))
+            time.sleep(latency)
+            if answered:
+                chunks = [_chunk([{"text": "The directory "}], prompt_tokens, usage=False),
+                          _chunk([{"text": "has been listed."}], prompt_tokens)]
+            else:
+                chunks = [_chunk([{"functionCall": {"name": "get_files_info", "args": {}}}], prompt_tokens)]
+            payload = "".join(chunks).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub(port=0, latency=0.0):
+    """Start the stub in a daemon thread and return (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay before each response")
+    args = parser.parse_args()
+    server, base_url = start_stub(args.port, args.latency_ms / 1000)
+    print(f"stub model listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
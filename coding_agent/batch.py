@@ -0,0 +1,200 @@
+# coding_agent/batch.py
+"""
+Batch mode: run many (prompt, work_dir) jobs from a JSON-lines manifest.
+
+Each manifest line is {"prompt": "...", "work_dir": "repo", "id": "optional", "max_iters": 20};
+work dirs are relative to the manifest. Jobs share one client and run with bounded concurrency;
+model calls go through a client-side rate limiter and are retried with backoff on 429/5xx.
+One result line per job is appended to the output file as soon as it finishes, and jobs already
+recorded as ok there are skipped, so an interrupted batch resumes where it stopped.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from types import SimpleNamespace
+
+from google.genai import errors
+
+from .cli import run_async
+from .engine import make_client
+from .functions.cache import ToolCache
+from .functions.warm_pool import WarmPool
+from .response_cache import CachingClient, ResponseCache
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Space out acquisitions so at most `per_minute` happen in any minute (0 disables)."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class ThrottledClient:
+    """Rate-limit model calls of client and retry them with exponential backoff on 429/5xx."""
+
+    def __init__(self, client, limiter: RateLimiter, max_retries: int = 5, backoff: float = 1.0):
+        self.client = client
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.retries = 0
+        self.aio = SimpleNamespace(models=self, caches=getattr(client.aio, "caches", None))
+
+    async def generate_content_stream(self, model, contents, config=None):
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire()
+            try:
+                stream = await self.client.aio.models.generate_content_stream(model=model, contents=contents,
+                                                                              config=config)
+                # the stream is lazy: the request is only sent, and a 429 only raised, when it is read
+                first = await anext(stream, None)
+            except errors.APIError as e:
+                if e.code not in RETRY_STATUS or attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.backoff * 2 ** attempt * (0.5 + random.random()))
+                continue
+            return _prepend(first, stream)
+
+
+async def _prepend(first, stream):
+    """The stream with its already read first chunk put back (None: the stream was empty)."""
+    if first is not None:
+        yield first
+    async for chunk in stream:
+        yield chunk
+
+
+def load_manifest(path: str):
+    """Read the manifest into job dicts with an id and an absolute work_dir."""
+    base = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            if "prompt" not in job:
+                raise ValueError(f"{path}:{number}: job has no prompt")
+            job["work_dir"] = os.path.join(base, job.get("work_dir") or ".")
+            if "id" not in job:
+                job["id"] = hashlib.sha1(f"{job['prompt']}\0{job['work_dir']}".encode()).hexdigest()[:12]
+            jobs.append(job)
+    return jobs
+
+
+def _finished_ids(output: str):
+    if not os.path.exists(output):
+        return set()
+    done = set()
+    with open(output) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # a line cut short by a crash; that job runs again
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+async def run_batch(jobs, output: str, client, concurrency: int = 4, max_iters: int = 20,
+                    tool_cache: ToolCache | None = None, python_pool: WarmPool | None = None, on_record=None):
+    """Run jobs not yet recorded as ok in output; return the summary dict."""
+    done = _finished_ids(output)
+    pending = [job for job in jobs if job["id"] not in done]
+    slots = asyncio.Semaphore(concurrency)
+    totals = {"ok": 0, "max_iters": 0, "error": 0, "prompt_tokens": 0, "response_tokens": 0}
+    started = time.perf_counter()
+
+    async def run_job(job, out):
+        usage = {"prompt_tokens": 0, "response_tokens": 0, "iterations": 0}
+
+        def on_event(event):
+            if event["type"] == "usage":
+                usage["prompt_tokens"] += event["prompt_tokens"] or 0
+                usage["response_tokens"] += event["response_tokens"] or 0
+            elif event["type"] == "iteration":
+                usage["iterations"] += 1
+
+        async with slots:
+            job_started = time.perf_counter()
+            try:
+                if not os.path.isdir(job["work_dir"]):
+                    raise ValueError(f"The work dir {job['work_dir']} is not a directory.")
+                result = await run_async(job["prompt"], work_dir_path=job["work_dir"], client=client,
+                                         max_iters=min(int(job.get("max_iters", max_iters)), max_iters),
+                                         on_event=on_event, tool_cache=tool_cache, python_pool=python_pool)
+                record = {"id": job["id"], "status": result["status"], "text": result.get("text", ""),
+                          "message": result.get("message")}
+            except Exception as e:
+                record = {"id": job["id"], "status": "error", "message": f"{type(e).__name__}: {e}"}
+        record.update(usage, seconds=round(time.perf_counter() - job_started, 3))
+        out.write(json.dumps(record) + "\n")
+        out.flush()
+        # only "ok" jobs are skipped on resume; a job stopped at its iteration cap runs again
+        totals[record["status"] if record["status"] in ("ok", "max_iters") else "error"] += 1
+        totals["prompt_tokens"] += usage["prompt_tokens"]
+        totals["response_tokens"] += usage["response_tokens"]
+        if on_record:
+            on_record(record)
+
+    with open(output, "a") as out:
+        await asyncio.gather(*(run_job(job, out) for job in pending))
+
+    seconds = time.perf_counter() - started
+    return {**totals, "skipped": len(jobs) - len(pending), "seconds": seconds,
+            "jobs_per_minute": len(pending) / seconds * 60 if seconds else 0.0,
+            "tokens_per_second": (totals["prompt_tokens"] + totals["response_tokens"]) / seconds if seconds else 0.0}
+
+
+def format_summary(summary) -> str:
+    return (f"{summary['ok']} ok, {summary['max_iters']} stopped at the iteration cap, {summary['error']} failed, "
+            f"{summary['skipped']} already done "
+            f"in {summary['seconds']:.1f}s ({summary['jobs_per_minute']:.1f} jobs/min); "
+            f"tokens: {summary['prompt_tokens']} prompt + {summary['response_tokens']} response "
+            f"({summary['tokens_per_second']:.0f}/s); {summary['retries']} model call retries")
+
+
+def batch(manifest: str, output: str, concurrency: int = 4, requests_per_minute: float = 0, max_retries: int = 5,
+          max_iters: int = 20, base_url: str | None = None, tool_cache: bool = False, warm_pool: int = 0,
+          preimport=(), client=None, response_cache: bool = False):
+    """Run a manifest to completion, printing one line per job and the summary."""
+    jobs = load_manifest(manifest)
+    throttled = ThrottledClient(client or make_client(base_url), RateLimiter(requests_per_minute), max_retries)
+    # the cache wraps the throttle: hits neither wait for the rate limiter nor count against it
+    client = CachingClient(throttled, ResponseCache()) if response_cache else throttled
+    python_pool = WarmPool(warm_pool, preimport) if warm_pool else None
+
+    def on_record(record):
+        print(f"[{record['id']}] {record['status']} in {record['seconds']}s "
+              f"({record['prompt_tokens']}+{record['response_tokens']} tokens)", flush=True)
+
+    try:
+        summary = asyncio.run(run_batch(jobs, output, client, concurrency=concurrency, max_iters=max_iters,
+                                        tool_cache=ToolCache() if tool_cache else None,
+                                        python_pool=python_pool, on_record=on_record))
+    finally:
+        if python_pool is not None:
+            python_pool.close()
+    summary["retries"] = throttled.retries
+    print(format_summary(summary))
+    return summary
@@ -0,0 +1,220 @@
+# coding_agent/changeset.py
+"""
+Session-scoped change tracking of the work dir, with diff and rollback.
+
+Nothing is copied when a session starts, so the cost does not depend on the size of the repo.
+Instead, the first time a session's write_file or edit_file touches a path, the original file is
+put in a content-addressed store by hardlinking it (falling back to a copy across filesystems).
+The tools replace files through os.replace rather than writing in place, so the linked inode keeps
+the original content. Every write is appended to the session's change log, which is enough to
+diff the session against its starting point or roll it back, also from a later process.
+
+Files changed by scripts run with run_python_file are not tracked.
+"""
+import difflib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from .constants import CHANGESETS_DIR
+
+
+def _hash(path):
+    """sha256 of a file, or None if it does not exist."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def _replace_with_copy(source, path):
+    """Give path the content of source through a temp file, keeping path's mode if it exists."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(source, tmp)
+        if os.path.exists(path):
+            shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class ChangeSet:
+    """The writes of one session to one work dir; see the module docstring."""
+
+    def __init__(self, work_dir_path: str, session_id: str | None = None, root: str = CHANGESETS_DIR):
+        self.work_dir_path = os.path.abspath(work_dir_path)
+        self.id = session_id or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        self.root = root
+        self.entries = []
+        self.rolled_back = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, session_id: str, root: str = CHANGESETS_DIR) -> "ChangeSet":
+        """
+        Read back a session's change log (FileNotFoundError if the session changed nothing,
+        ValueError if the log is empty or unreadable).
+        """
+        with open(os.path.join(root, f"{session_id}.jsonl")) as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if not lines or "work_dir" not in lines[0]:
+            raise ValueError(f"the change log of session {session_id} has no header")
+        changes = cls(lines[0]["work_dir"], session_id, root)
+        for line in lines[1:]:
+            if line.get("rolled_back"):
+                changes.rolled_back = True
+            else:
+                changes.entries.append(line)
+        return changes
+
+    def _log_path(self):
+        return os.path.join(self.root, f"{self.id}.jsonl")
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.root, "blobs", sha256[:2], sha256)
+
+    def _append(self, record):
+        path = self._log_path()
+        if not os.path.exists(path):
+            os.makedirs(self.root, exist_ok=True)
+            with open(path, "a") as f:
+                f.write(json.dumps({"session": self.id, "work_dir": self.work_dir_path, "started": time.time()}) + "\n")
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def _store(self, path):
+        """Put the current content of path in the store; returns its sha256, or None if path does not exist."""
+        sha256 = _hash(path)
+        if sha256 is None:
+            return None
+        blob = self._blob_path(sha256)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp = f"{blob}.{uuid.uuid4().hex}.tmp"
+            try:
+                os.link(path, tmp)
+            except OSError:
+                shutil.copyfile(path, tmp)
+            os.replace(tmp, blob)
+        return sha256
+
+    def _unlink_store(self, path, sha256):
+        """A write that did not happen leaves path sharing its inode with the blob: give the blob its own copy."""
+        blob = self._blob_path(sha256)
+        if os.path.exists(path) and os.path.samefile(path, blob):
+            _replace_with_copy(path, blob)
+
+    @contextmanager
+    def track(self, tool: str, absolute_path: str):
+        """Wrap one call of a tool that rewrites absolute_path; records it if the content changed."""
+        absolute_path = os.path.abspath(absolute_path)
+        if os.path.commonpath([absolute_path, self.work_dir_path]) != self.work_dir_path \
+                or absolute_path == self.work_dir_path or os.path.isdir(absolute_path):
+            yield
+            return
+        with self._lock:
+            rel_path = os.path.relpath(absolute_path, self.work_dir_path)
+            touched = any(e["path"] == rel_path for e in self.entries)
+            before = self._store(absolute_path) if not touched else _hash(absolute_path)
+            try:
+                yield
+            finally:
+                after = _hash(absolute_path)
+                if before is not None and not touched:
+                    self._unlink_store(absolute_path, before)
+                if after != before:
+                    entry = {"seq": len(self.entries) + 1, "tool": tool, "path": rel_path, "before": before,
+                             "after": after, "time": time.time()}
+                    self.entries.append(entry)
+                    self._append(entry)
+
+    def originals(self) -> dict:
+        """rel path -> sha256 at the start of the session (None: the file did not exist)."""
+        originals = {}
+        for entry in self.entries:
+            originals.setdefault(entry["path"], entry["before"])
+        return originals
+
+    def _last(self) -> dict:
+        return {entry["path"]: entry["after"] for entry in self.entries}
+
+    def summary(self) -> dict:
+        return {"session": self.id, "files": len(self.originals()), "changes": len(self.entries),
+                "rolled_back": self.rolled_back}
+
+    def _read(self, sha256):
+        if sha256 is None:
+            return None
+        with open(self._blob_path(sha256), "rb") as f:
+            return f.read()
+
+    def diff(self) -> str:
+        """Unified diff of every touched file, from the start of the session to its current content."""
+        out = []
+        for rel_path, before in self.originals().items():
+            path = os.path.join(self.work_dir_path, rel_path)
+            old = self._read(before)
+            try:
+                with open(path, "rb") as f:
+                    new = f.read()
+            except FileNotFoundError:
+                new = None
+            if old == new:
+                continue
+            try:
+                old_lines = (old or b"").decode("utf-8").splitlines(keepends=True)
+                new_lines = (new or b"").decode("utf-8").splitlines(keepends=True)
+            except UnicodeDecodeError:
+                out.append(f"Binary file {rel_path} changed\n")
+                continue
+            out.extend(difflib.unified_diff(old_lines, new_lines,
+                                            "/dev/null" if old is None else f"a/{rel_path}",
+                                            "/dev/null" if new is None else f"b/{rel_path}"))
+        return "".join(line if line.endswith("\n") else line + "\n\\ No newline at end of file\n" for line in out)
+
+    def rollback(self, force: bool = False) -> list:
+        """
+        Put every touched file back as it was at the start of the session (files the session
+        created are removed). A file changed since the session's last write is left alone unless
+        force. Returns one line per file saying what happened.
+        """
+        report = []
+        last = self._last()
+        with self._lock:
+            for rel_path, before in self.originals().items():
+                path = os.path.join(self.work_dir_path, rel_path)
+                current = _hash(path)
+                if current == before:
+                    report.append(f"{rel_path}: already as before")
+                    continue
+                if current != last[rel_path] and not force:
+                    report.append(f"{rel_path}: changed after the session's last write, left alone")
+                    continue
+                if before is None:
+                    os.remove(path)
+                    report.append(f"{rel_path}: removed (created by the session)")
+                    continue
+                blob = self._blob_path(before)
+                if _hash(blob) != before:
+                    report.append(f"{rel_path}: saved original is damaged, left alone")
+                    continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                _replace_with_copy(blob, path)
+                report.append(f"{rel_path}: restored")
+            self.rolled_back = True
+            self._append({"rolled_back": time.time()})
+        return report
@@ -1,85 +1,269 @@
 # coding_agent/cli.py
-from dotenv import load_dotenv
+# Only stdlib-backed modules are imported here; the genai SDK, the tool schemas and the engine are
+# imported when a session starts, so --help and argument errors return without loading them.
 import os
 import sys
-from google import genai
-from google.genai.types import Content, Part
-from .config import gemini_config
-from .functions.call_function import call_function
-
-def _extract_text(response) -> str:
-    """Return best-effort plain text from a response."""
-    if getattr(response, "text", None):
-        return response.text
-    pieces = []
-    for cand in (response.candidates or []):
-        if not cand or not cand.content:
-            continue
-        for part in (cand.content.parts or []):
-            if getattr(part, "text", None):
-                pieces.append(part.text)
-    return "\n".join(pieces).strip()
-
-
-def run(prompt: str, verbose: bool = False, work_dir_path: str | None = None):
-    """Run the agent given a prompt (core logic extracted for easier testing)."""
-    load_dotenv()
-    API_KEY = os.getenv("GEMINI_API_KEY")
-    if not API_KEY:
-        print("Missing GEMINI_API_KEY")
-        sys.exit(1)
-
-    if work_dir_path is None:
-        work_dir_path = os.getcwd()
-
-    client = genai.Client(api_key=API_KEY)
-    messages = [Content(parts=[Part(text=prompt)], role="user")]
-
-    max_iters = 20
-    for step in range(max_iters):
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-001",
-            contents=messages,
-            config=gemini_config,
-        )
-
-        if response is None:
-            print("Response is None")
-            break
-
-        if verbose and getattr(response, "usage_metadata", None):
-            print(f"[iter {step}] prompt_tokens={response.usage_metadata.prompt_token_count} "
-                  f"resp_tokens={response.usage_metadata.candidates_token_count}")
-
-        if response.candidates:
-            for cand in response.candidates:
-                if cand and cand.content:
-                    messages.append(cand.content)
-
-        if getattr(response, "function_calls", None):
-            tool_parts = []
-            for fc in response.function_calls:
-                part = call_function(fc.name, fc.args, work_dir_path, verbose)
-                tool_parts.append(part)
-
-            messages.append(Content(role="tool", parts=tool_parts))
-
-            # small debug
-            for p in tool_parts:
-                fr = getattr(p, "function_response", None)
-                if fr:
-                    resp = fr.response
-                    if isinstance(resp, dict) and "Result" in resp:
-                        print("Function Result:", resp["Result"])
-                    elif isinstance(resp, dict) and "error" in resp:
-                        print("Function Error:", resp["error"])
-            continue
-
-        final_text = _extract_text(response)
-        if final_text:
-            print("Response Text:", final_text)
-            messages.append(Content(parts=[Part(text=final_text)], role="assistant"))
-        break
+from typing import TYPE_CHECKING
+from .constants import (HISTORY_TOKEN_BUDGET, MODEL_NAME, RUN_CPU_SECONDS, RUN_MAX_PROCESSES, RUN_MEMORY_BYTES,
+                        SESSIONS_DIR, SNAPSHOT_TOKEN_BUDGET)
+from .functions.cache import ToolCache
+from .functions.warm_pool import WarmPool
+from .routing import RoutingPolicy
+from . import tracing
+from .tracing import JsonlExporter, Tracer
+
+if TYPE_CHECKING:
+    from .context_cache import ContextCache
+
+
+async def run_async(prompt: str, verbose: bool = False, work_dir_path: str | None = None, client=None,
+                    max_iters: int = 20, model: str = MODEL_NAME, on_event=None,
+                    history_budget: int = HISTORY_TOKEN_BUDGET, tool_cache: ToolCache | None = None,
+                    python_pool: WarmPool | None = None, tracer: Tracer | None = None,
+                    context_cache: "ContextCache | None" = None):
+    """
+    Run one session on a fresh AgentEngine; see AgentEngine.run_async.
+
+    A ToolCache passed as tool_cache serves repeated reads of unchanged files and can be shared across runs;
+    a WarmPool passed as python_pool runs scripts in children forked from pre-started interpreters.
+    With a tracer, the session, each iteration, model call and tool call are recorded as spans.
+    A ContextCache sends the stable prefix of each request as a server-side cache and can be shared too.
+    Returns {"status", "text", "conversation", "messages"}; status is "ok", "max_iters" (no final
+    answer within max_iters), "budget_exceeded" or "error", the last three with a "message".
+    """
+    from .engine import AgentEngine
+    engine = AgentEngine(client, model=model, max_iters=max_iters, history_budget=history_budget,
+                         tool_cache=tool_cache, python_pool=python_pool, tracer=tracer, context_cache=context_cache)
+    return await engine.run_async(prompt, work_dir_path, on_event, verbose)
+
+
+def print_event(verbose: bool):
+    """Build an on_event callback that streams the session to stdout."""
+    state = {"streaming": False}
+
+    def on_event(event):
+        kind = event["type"]
+        if kind == "text":
+            if not state["streaming"]:
+                print("Response Text: ", end="")
+                state["streaming"] = True
+            print(event["text"], end="", flush=True)
+            return
+        if state["streaming"]:
+            print()
+            state["streaming"] = False
+        if kind == "usage" and verbose:
+            compacted = f" (before compaction: {event['compacted_from']})" if event.get("compacted_from") else ""
+            cached = f" cached_tokens={event['cached_tokens']}" if event.get("cached_tokens") else ""
+            print(f"[iter {event['iteration']}] prompt_tokens={event['prompt_tokens']}{compacted}{cached} "
+                  f"resp_tokens={event['response_tokens']}")
+        elif kind == "compaction" and verbose:
+            print(f"[iter {event['iteration']}] history compacted: ~{event['estimated_before']} -> "
+                  f"~{event['estimated_after']} estimated tokens "
+                  f"(last prompt_tokens={event['prompt_tokens_before']})")
+        elif kind == "function_response":
+            resp = event["response"]
+            if isinstance(resp, dict) and "Result" in resp:
+                print("Function Result:", resp["Result"])
+            elif isinstance(resp, dict) and "error" in resp:
+                print("Function Error:", resp["error"])
+        elif kind == "tool_cache" and verbose:
+            print(f"tool cache: hits={event['hits']} misses={event['misses']} entries={event['entries']} "
+                  f"bytes={event['bytes']}")
+        elif kind == "route" and verbose:
+            print(f"[iter {event['iteration']}] model={event['model']} "
+                  f"max_output_tokens={event['max_output_tokens']} ({event['reason']})")
+        elif kind == "preload" and verbose:
+            print(f"preloaded a {event['bytes']}-byte repo snapshot in {event['seconds'] * 1000:.0f} ms")
+        elif kind == "changes" and event["files"]:
+            print(f"Session {event['session']} changed {event['files']} file(s); review with "
+                  f"`coding-agent changes {event['session']} --diff`, undo with `coding-agent rollback {event['session']}`")
+        elif kind == "session":
+            print(f"Session saved as {event['id']} ({event['messages']} messages); continue it with "
+                  f"`coding-agent --resume {event['id']} [PROMPT]`")
+        elif kind in ("budget", "max_iters"):
+            print(f"Stopped: {event['message']}")
+        elif kind == "error":
+            print(event["message"])
+
+    return on_event
+
+
+def run(prompt: str | None, verbose: bool = False, work_dir_path: str | None = None,
+        history_budget: int = HISTORY_TOKEN_BUDGET, tool_cache: bool = False, warm_pool: int = 0,
+        preimport=(), trace: str | None = None, profile: bool = False, record: str | None = None,
+        replay: str | None = None, response_cache: bool = False, route: bool = False,
+        token_budget: int | None = None, time_budget: float | None = None, context_cache: bool = False,
+        pin=(), preload: int | None = None, track_changes: bool = False, run_limits: dict | None = None,
+        save_session: bool = False, resume: str | None = None, max_iters: int = 20):
+    """
+    Run the agent given a prompt (core logic extracted for easier testing).
+    trace appends the session's spans to a JSON-lines file; profile prints a time breakdown at the end.
+    record appends every model response to a file; replay answers from such a file instead of the API.
+    response_cache serves model calls already answered for the same history from an on-disk cache.
+    route picks the model and output cap per call; token_budget and time_budget stop the session early.
+    context_cache keeps the system prompt, tool declarations and the files named by pin in a server-side cache.
+    preload starts the session with a repo snapshot of about that many tokens.
+    track_changes records the files the session writes; see `coding-agent changes` and `rollback`.
+    run_limits overrides entries of the script limits (see functions/sandbox.py).
+    save_session appends the history to a session log after every iteration; resume continues a saved session.
+    max_iters caps the model calls of the run (a resumed session gets that many more).
+    """
+    from .context_cache import ContextCache, pinned_text
+    from .engine import AgentEngine, make_client
+    from .functions.run_python_file import RUN_LIMITS
+    from .replay import RecordingClient, ReplayClient
+    from .response_cache import CachingClient, ResponseCache
+    RUN_LIMITS.update(run_limits or {})
+    client = None
+    if replay:
+        client = ReplayClient(replay)
+    elif record:
+        client = RecordingClient(make_client(), record)
+    if response_cache:
+        client = CachingClient(client or make_client(), ResponseCache())
+    cache = ContextCache(pinned_text(work_dir_path or os.getcwd(), pin) if pin else None) if context_cache else None
+    python_pool = WarmPool(warm_pool, preimport) if warm_pool else None
+    exporter = JsonlExporter(trace) if trace else None
+    tracer = Tracer([exporter] if exporter else []) if trace or profile else None
+    engine = AgentEngine(client, history_budget=history_budget, tool_cache=ToolCache() if tool_cache else None,
+                         python_pool=python_pool, tracer=tracer, router=RoutingPolicy() if route else None,
+                         token_budget=token_budget, time_budget=time_budget, context_cache=cache, preload=preload,
+                         track_changes=track_changes, save_session=save_session, max_iters=max_iters)
+    try:
+        return engine.run(prompt, work_dir_path, on_event=print_event(verbose), verbose=verbose, resume=resume)
+    finally:
+        if python_pool is not None:
+            python_pool.close()
+        if exporter is not None:
+            exporter.close()
+        if profile:
+            print(tracing.profile_summary(tracer.spans))
+        if response_cache and verbose:
+            stats = client.cache.stats()
+            print(f"response cache: hits={stats['hits']} misses={stats['misses']} bytes={stats['bytes']}")
+        if cache is not None and verbose:
+            print("context cache: " + " ".join(f"{k}={v}" for k, v in cache.stats().items()))
+
+
+def _add_limit_flags(parser):
+    parser.add_argument("--cpu-limit", type=int, default=None, metavar="SECONDS",
+                        help=f"CPU time each script may use (default {RUN_CPU_SECONDS}, 0: no limit)")
+    parser.add_argument("--memory-limit", type=int, default=None, metavar="MB",
+                        help=f"Address space of each script (default {RUN_MEMORY_BYTES // (1024 * 1024)}, 0: no limit)")
+    parser.add_argument("--max-processes", type=int, default=None, metavar="N",
+                        help=f"Processes each script may start (default {RUN_MAX_PROCESSES}, 0: no limit)")
+    parser.add_argument("--no-network", action="store_true",
+                        help="Run scripts without network access (needs Linux network namespaces)")
+
+
+def _run_limits(args) -> dict:
+    """The script limits given by _add_limit_flags flags, as overrides of RUN_LIMITS."""
+    limits = {}
+    if args.cpu_limit is not None:
+        limits["cpu_seconds"] = args.cpu_limit
+    if args.memory_limit is not None:
+        limits["memory_bytes"] = args.memory_limit * 1024 * 1024
+    if args.max_processes is not None:
+        limits["processes"] = args.max_processes
+    if args.no_network:
+        limits["network"] = False
+        # probed once at startup, so no tool call pays for it
+        from .functions.sandbox import network_isolation_available
+        network_isolation_available()
+    return limits
+
+
+def _serve_main(argv):
+    """`coding-agent serve`: run the multi-session agent server."""
+    import argparse
+    from .server import DEFAULT_HOST, DEFAULT_PORT, serve
+    parser = argparse.ArgumentParser(prog="coding-agent serve", description="Serve agent sessions over a local socket")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Interface to bind")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to bind")
+    parser.add_argument("--root", default=None, help="Directory that every session work dir must live under")
+    parser.add_argument("--max-iters", type=int, default=20, help="Upper bound on iterations per session")
+    parser.add_argument("--max-sessions", type=int, default=64, help="Sessions allowed to run at once")
+    parser.add_argument("--base-url", default=None, help="Override the model endpoint (e.g. a local stub)")
+    parser.add_argument("--context-cache", action="store_true",
+                        help="Share a server-side cache of the system prompt and tool declarations across sessions")
+    parser.add_argument("--warm-pool", type=int, default=0, metavar="N",
+                        help="Run scripts in children forked from N pre-started Python workers")
+    parser.add_argument("--preimport", default="", metavar="MODULES",
+                        help="Comma-separated modules the warm workers import up front")
+    _add_limit_flags(parser)
+    args = parser.parse_args(argv)
+    from .functions.run_python_file import RUN_LIMITS
+    RUN_LIMITS.update(_run_limits(args))
+    serve(args.host, args.port, root=args.root, max_iters=args.max_iters, max_sessions=args.max_sessions,
+          base_url=args.base_url, warm_pool=args.warm_pool, preimport=[m for m in args.preimport.split(",") if m],
+          context_cache=args.context_cache)
+
+
+def _batch_main(argv):
+    """`coding-agent batch`: run every job of a JSON-lines manifest."""
+    import argparse
+    from .batch import batch
+    parser = argparse.ArgumentParser(prog="coding-agent batch",
+                                     description="Run many prompts across many work dirs from a JSONL manifest")
+    parser.add_argument("manifest", help='JSON lines of {"prompt": ..., "work_dir": ..., "id": ...}')
+    parser.add_argument("--output", "-o", default="results.jsonl",
+                        help="Result file; jobs already recorded as ok there are skipped")
+    parser.add_argument("--concurrency", "-j", type=int, default=4, help="Jobs run at once")
+    parser.add_argument("--rpm", type=float, default=0, help="Model requests per minute across all jobs (0: no limit)")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries of a model call on 429/5xx")
+    parser.add_argument("--max-iters", type=int, default=20, help="Upper bound on iterations per job")
+    parser.add_argument("--base-url", default=None, help="Override the model endpoint (e.g. a local stub)")
+    parser.add_argument("--tool-cache", action="store_true", help="Share a tool result cache across jobs")
+    parser.add_argument("--response-cache", action="store_true",
+                        help="Reuse model responses for identical requests from the on-disk cache")
+    parser.add_argument("--warm-pool", type=int, default=0, metavar="N",
+                        help="Run scripts in children forked from N pre-started Python workers")
+    parser.add_argument("--preimport", default="", metavar="MODULES",
+                        help="Comma-separated modules the warm workers import up front")
+    _add_limit_flags(parser)
+    args = parser.parse_args(argv)
+    from .functions.run_python_file import RUN_LIMITS
+    RUN_LIMITS.update(_run_limits(args))
+    batch(args.manifest, args.output, concurrency=args.concurrency, requests_per_minute=args.rpm,
+          max_retries=args.max_retries, max_iters=args.max_iters, base_url=args.base_url,
+          tool_cache=args.tool_cache, warm_pool=args.warm_pool, preimport=[m for m in args.preimport.split(",") if m],
+          response_cache=args.response_cache)
+
+
+def _changes_main(argv, rollback=False):
+    """`coding-agent changes|rollback SESSION`: review or undo what a --track-changes session wrote."""
+    import argparse
+    from .changeset import ChangeSet
+    name = "rollback" if rollback else "changes"
+    parser = argparse.ArgumentParser(
+        prog=f"coding-agent {name}",
+        description="Undo the file changes of a session" if rollback else "Show the file changes of a session")
+    parser.add_argument("session", help="Session id printed at the end of a --track-changes run")
+    if rollback:
+        parser.add_argument("--force", action="store_true", help="Also restore files edited after the session")
+    else:
+        parser.add_argument("--diff", action="store_true", help="Print a unified diff against the session's start")
+    args = parser.parse_args(argv)
+    try:
+        changes = ChangeSet.load(args.session)
+    except FileNotFoundError:
+        print(f"No changes recorded for session {args.session}")
+        return 1
+    except ValueError as e:
+        print(f"Cannot read the changes of session {args.session}: {e}")
+        return 1
+    if rollback:
+        for line in changes.rollback(force=args.force):
+            print(line)
+    elif args.diff:
+        print(changes.diff(), end="")
+    else:
+        for entry in changes.entries:
+            print(f"{entry['seq']:>3} {entry['tool']:<12} {entry['path']}")
+        if changes.rolled_back:
+            print("(rolled back)")
+    return 0
 
 
 def main(argv=None):
@@ -87,9 +271,71 @@ def main(argv=None):
     import argparse
     if argv is None:
         argv = sys.argv[1:]
-    parser = argparse.ArgumentParser(prog="coding-agent", description="Run the Coding Agent")
-    parser.add_argument("prompt", help="Prompt to send to the model")
+    if argv and argv[0] == "serve":
+        return _serve_main(argv[1:])
+    if argv and argv[0] == "batch":
+        return _batch_main(argv[1:])
+    if argv and argv[0] in ("changes", "rollback"):
+        return _changes_main(argv[1:], rollback=argv[0] == "rollback")
+    parser = argparse.ArgumentParser(prog="coding-agent", description="Run the Coding Agent",
+                                     epilog="Use `coding-agent serve --help` for the multi-session server "
+                                            "and `coding-agent batch --help` to run a manifest of jobs; "
+                                            "`coding-agent changes|rollback SESSION` review or undo a "
+                                            "--track-changes session.")
+    parser.add_argument("prompt", nargs="?", default=None,
+                        help="Prompt to send to the model (optional with --resume: the session carries on)")
     parser.add_argument("--work-dir", "-w", default=None, help="Working directory for tools")
     parser.add_argument("--verbose", "-v", action="store_true", help="Verbose output")
+    parser.add_argument("--max-iters", type=int, default=20, help="Upper bound on iterations of the session")
+    parser.add_argument("--history-budget", type=int, default=HISTORY_TOKEN_BUDGET,
+                        help="Compact old tool results to keep the prompt under this many tokens (0 disables)")
+    parser.add_argument("--tool-cache", action="store_true",
+                        help="Reuse results of repeated reads of unchanged files within the run")
+    parser.add_argument("--warm-pool", type=int, default=0, metavar="N",
+                        help="Run scripts in children forked from N pre-started Python workers")
+    parser.add_argument("--preimport", default="", metavar="MODULES",
+                        help="Comma-separated modules the warm workers import up front (e.g. numpy,pandas)")
+    _add_limit_flags(parser)
+    parser.add_argument("--trace", default=None, metavar="FILE",
+                        help="Append a span per iteration, model call and tool call to FILE as JSON lines")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print where the session's time went (model, tools, subprocesses) when it ends")
+    parser.add_argument("--record", default=None, metavar="FILE",
+                        help="Append every model response to FILE so the session can be replayed offline")
+    parser.add_argument("--replay", default=None, metavar="FILE",
+                        help="Answer model calls from a --record file instead of the API (no key needed)")
+    parser.add_argument("--response-cache", action="store_true",
+                        help="Reuse model responses for identical requests (same model, config and history) from disk")
+    parser.add_argument("--context-cache", action="store_true",
+                        help="Send the system prompt, tool declarations and pinned files as a server-side cached prefix")
+    parser.add_argument("--pin", action="append", default=[], metavar="FILE",
+                        help="Add FILE (relative to the work dir) to the cached prefix; repeatable, needs --context-cache")
+    parser.add_argument("--preload", action="store_true",
+                        help="Start with a snapshot of the work dir (tree, Python outlines, key file heads)")
+    parser.add_argument("--preload-tokens", type=int, default=SNAPSHOT_TOKEN_BUDGET, metavar="N",
+                        help="Approximate size of the --preload snapshot in tokens")
+    parser.add_argument("--track-changes", action="store_true",
+                        help="Record every file the session writes so it can be diffed or rolled back")
+    parser.add_argument("--save-session", action="store_true",
+                        help="Save the session after every iteration so it can be continued with --resume")
+    parser.add_argument("--resume", default=None, metavar="SESSION",
+                        help="Continue a saved session where it stopped, without running its tool calls again")
+    parser.add_argument("--route", action="store_true",
+                        help="Use a lighter model and smaller output cap for exploring, the default model for edits")
+    parser.add_argument("--token-budget", type=int, default=None, metavar="N",
+                        help="Stop the session once N prompt + response tokens are spent")
+    parser.add_argument("--time-budget", type=float, default=None, metavar="SECONDS",
+                        help="Stop the session after SECONDS of wall-clock time")
     args = parser.parse_args(argv)
-    run(args.prompt, verbose=args.verbose, work_dir_path=args.work_dir)
+    if args.prompt is None and args.resume is None:
+        parser.error("a prompt is required unless --resume is given")
+    if args.resume is not None and not os.path.exists(os.path.join(SESSIONS_DIR, f"{args.resume}.jsonl")):
+        parser.error(f"no saved session {args.resume}")
+    run(args.prompt, verbose=args.verbose, work_dir_path=args.work_dir, history_budget=args.history_budget,
+        tool_cache=args.tool_cache, warm_pool=args.warm_pool,
+        preimport=[m for m in args.preimport.split(",") if m], trace=args.trace, profile=args.profile,
+        record=args.record, replay=args.replay, response_cache=args.response_cache, route=args.route,
+        token_budget=args.token_budget, time_budget=args.time_budget, context_cache=args.context_cache,
+        pin=args.pin, preload=args.preload_tokens if args.preload else None, track_changes=args.track_changes,
+        run_limits=_run_limits(args), save_session=args.save_session, resume=args.resume,
+        max_iters=args.max_iters)
@@ -1,8 +1,3 @@
-from google.genai.types import GenerateContentConfig, Tool
-from .functions.get_files_info import schema_get_files_info
-from .functions.get_file_content import schema_get_file_content
-from .functions.write_file import schema_write_file
-from .functions.run_python_file import schema_run_python_file
 
 
 system_prompt =  '''
@@ -10,29 +5,43 @@ You are a helpful ai coding assistant.
 
 When user asks a question or make a requst, do function calls to help the user.
 You have access to the following functions:
-1. get_files_info: Get information about files in a directory.
-2. get_file_content: Get the content of a file.
-3. write_file: Write content to a file.
-4. run_python_file: Run a python file and return the output.
+1. get_files_info: Get information about files in a directory. Use max_depth to list a whole tree in one call.
+2. get_file_content: Get the content of a file. Large files can be paged with offset or start_line/end_line.
+3. write_file: Write content to a file. Use it to create files or rewrite small ones.
+4. edit_file: Change part of an existing file with search/replace blocks or a unified diff. Prefer it to
+   write_file for changes to existing files: only the changed lines have to be sent.
+5. run_python_file: Run a python file and return the output.
+6. search_code: Search all files for a string or regex and get matching lines with context. Prefer it to
+   listing and reading files when looking for where something is defined or used.
+7. snapshot_repo: Get the file tree, an outline of every Python file and the first lines of key files in one
+   call. Use it first to learn an unfamiliar project, unless a snapshot is already in the conversation.
 
 All paths are relative to the working directory.
 You do not have to specify the working directory in the function calls as it will automatically be set due to security reasons.
 '''
 
 
-available_functions = Tool(
-    function_declarations=[
-        schema_get_files_info,
-        schema_get_file_content,
-        schema_write_file,
-        schema_run_python_file,
-    ]
-)
-
-
-gemini_config = GenerateContentConfig(
-    tools=[available_functions],
-    system_instruction=system_prompt,
-    max_output_tokens=1024,
-)
+def make_config(registry=None, system_instruction=system_prompt, max_output_tokens=1024):
+    """Generation config declaring the registry's tools (DEFAULT_REGISTRY when None)."""
+    from google.genai.types import GenerateContentConfig
+    if registry is None:
+        from .functions.registry import DEFAULT_REGISTRY as registry
+    return GenerateContentConfig(
+        tools=[registry.declarations()],
+        system_instruction=system_instruction,
+        max_output_tokens=max_output_tokens,
+    )
+
+
+def __getattr__(name):
+    # built on first use: declaring the tools imports the genai SDK and every tool module
+    if name == "available_functions":
+        from .functions.registry import DEFAULT_REGISTRY
+        value = DEFAULT_REGISTRY.declarations()
+    elif name == "gemini_config":
+        value = make_config()
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
 
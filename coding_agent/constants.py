@@ -1 +1,40 @@
+import os
+
 MAX_CHARS = 10000
+MAX_TOOL_WORKERS = 8
+MODEL_NAME = "gemini-2.0-flash-001"
+CHARS_PER_TOKEN = 4
+HISTORY_TOKEN_BUDGET = 32000
+TOOL_CACHE_MAX_ENTRIES = 512
+TOOL_CACHE_MAX_BYTES = 32 * 1024 * 1024
+MMAP_THRESHOLD = 1024 * 1024
+BINARY_SNIFF_BYTES = 8192
+MAX_LIST_ENTRIES = 1000
+RUN_TIMEOUT = 30
+RUN_OUTPUT_MAX_BYTES = 10000
+RUN_CPU_SECONDS = RUN_TIMEOUT
+RUN_MEMORY_BYTES = 4 * 1024 * 1024 * 1024
+RUN_MAX_OPEN_FILES = 1024
+RUN_MAX_PROCESSES = 64
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "coding-agent")
+SEARCH_MAX_FILE_BYTES = 1024 * 1024
+SEARCH_MAX_RESULTS = 100
+RESPONSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+LIGHT_MODEL_NAME = "gemini-2.0-flash-lite-001"
+ROUTE_READ_OUTPUT_TOKENS = 1024
+ROUTE_WRITE_OUTPUT_TOKENS = 4096
+ROUTE_MAX_OUTPUT_TOKENS = 8192
+LARGE_HISTORY_TOKENS = 24000
+CONTEXT_CACHE_TTL_SECONDS = 3600
+CONTEXT_CACHE_REFRESH_SECONDS = 300
+SNAPSHOT_TOKEN_BUDGET = 8000
+SNAPSHOT_HEAD_LINES = 20
+SNAPSHOT_MAX_PARSE_BYTES = 512 * 1024
+RUN_RETENTION_SECONDS = 3600
+WORKSPACES_DIR = os.path.join(CACHE_DIR, "workspaces")
+WORKSPACE_MAX_BYTES = 1024 * 1024 * 1024
+WORKSPACES_QUOTA_BYTES = 5 * 1024 * 1024 * 1024
+INGEST_CHUNK_BYTES = 1024 * 1024
+CHANGESETS_DIR = os.path.join(CACHE_DIR, "changesets")
+SESSIONS_DIR = os.path.join(CACHE_DIR, "sessions")
+SESSION_BLOB_MIN_BYTES = 2048
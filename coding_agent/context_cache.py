@@ -0,0 +1,142 @@
+# coding_agent/context_cache.py
+"""
+Server-side context caching of the stable request prefix.
+
+Every model call repeats the system instruction and the tool declarations, plus any files pinned
+for the session. ContextCache stores that prefix once with client.aio.caches and sends requests
+that refer to it by name, so the prefix is billed at the cached rate and not re-processed.
+
+Caches are keyed on a fingerprint of (model, prefix) and named after it, so other processes with
+the same prefix reuse a live cache instead of creating their own. A cache close to its expiry is
+extended by another ttl when used; one that has expired anyway is created again. Prefixes the API
+refuses to cache (below the model's minimum size) fall back to plain requests.
+"""
+import asyncio
+import hashlib
+import os
+import time
+
+from google.genai import errors, types
+
+from .constants import CONTEXT_CACHE_REFRESH_SECONDS, CONTEXT_CACHE_TTL_SECONDS
+
+_PREFIX = "coding-agent-"
+
+
+def pinned_text(work_dir_path: str, paths) -> str:
+    """The files under work_dir_path named by paths, as one block of text for the cached prefix."""
+    base = os.path.abspath(work_dir_path)
+    blocks = []
+    for path in paths:
+        absolute = os.path.abspath(os.path.join(base, path))
+        if not absolute.startswith(base):
+            raise ValueError(f"{path} is outside the working directory {base}")
+        with open(absolute, "r", errors="replace") as f:
+            blocks.append(f"--- {os.path.relpath(absolute, base)} ---\n{f.read()}")
+    return "Files pinned for this session (current as of its start):\n\n" + "\n\n".join(blocks)
+
+
+class _Entry:
+    def __init__(self, name: str, expires: float):
+        self.name = name
+        self.expires = expires
+
+
+class ContextCache:
+    """
+    Cached prefixes for any number of sessions and models.
+
+    pinned is text placed after the system instruction in every request (see pinned_text). ttl is
+    how long a cache lives after creation or its last refresh; refresh is how close to expiry a use
+    has to be to extend it.
+    """
+
+    def __init__(self, pinned: str | None = None, ttl: int = CONTEXT_CACHE_TTL_SECONDS,
+                 refresh: int = CONTEXT_CACHE_REFRESH_SECONDS):
+        self.pinned = [types.Content(role="user", parts=[types.Part(text=pinned)])] if pinned else []
+        self.ttl = ttl
+        self.refresh = refresh
+        self._entries = {}
+        self._pending = {}
+        # prefixes the API refused to cache
+        self._refused = set()
+        self.created = 0
+        self.reused = 0
+        self.refreshed = 0
+        self.hits = 0
+        self.fallbacks = 0
+
+    def _key(self, model, config) -> str:
+        payload = "".join([model, config.model_dump_json(exclude_none=True,
+                                                         include={"system_instruction", "tools", "tool_config"}),
+                           *(c.model_dump_json(exclude_none=True) for c in self.pinned)])
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    async def prepare(self, client, model: str, config: types.GenerateContentConfig):
+        """
+        (config, prefix) for one request: config refers to the cached prefix and prefix is empty,
+        or, without a usable cache, config is unchanged and prefix holds the pinned contents to
+        put before the messages.
+        """
+        caches = getattr(client.aio, "caches", None)
+        key = self._key(model, config)
+        if caches is None or key in self._refused:
+            self.fallbacks += 1
+            return config, self.pinned
+        try:
+            name = await self._name(caches, key, model, config)
+        except errors.APIError as e:
+            if e.code == 400:
+                self._refused.add(key)
+            self.fallbacks += 1
+            return config, self.pinned
+        self.hits += 1
+        return config.model_copy(update={"cached_content": name, "system_instruction": None, "tools": None,
+                                         "tool_config": None}), []
+
+    async def _name(self, caches, key, model, config) -> str:
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and entry.expires - now > self.refresh:
+            return entry.name
+        if entry is not None and entry.expires > now:
+            try:
+                await caches.update(name=entry.name, config=types.UpdateCachedContentConfig(ttl=f"{self.ttl}s"))
+                entry.expires = time.monotonic() + self.ttl
+                self.refreshed += 1
+                return entry.name
+            except errors.APIError as e:
+                if e.code != 404:
+                    raise
+        # concurrent sessions needing the same prefix wait for one creation
+        if key not in self._pending:
+            self._pending[key] = asyncio.ensure_future(self._create(caches, key, model, config))
+        try:
+            entry = await asyncio.shield(self._pending[key])
+        finally:
+            self._pending.pop(key, None)
+        self._entries[key] = entry
+        return entry.name
+
+    async def _create(self, caches, key, model, config) -> _Entry:
+        display_name = _PREFIX + key
+        async for cached in await caches.list():
+            if cached.display_name == display_name and cached.model and cached.model.endswith(model):
+                left = cached.expire_time.timestamp() - time.time() if cached.expire_time else 0
+                if left > self.refresh:
+                    self.reused += 1
+                    return _Entry(cached.name, time.monotonic() + left)
+        cached = await caches.create(model=model, config=types.CreateCachedContentConfig(
+            display_name=display_name,
+            ttl=f"{self.ttl}s",
+            system_instruction=config.system_instruction,
+            tools=config.tools,
+            tool_config=config.tool_config,
+            contents=self.pinned or None,
+        ))
+        self.created += 1
+        return _Entry(cached.name, time.monotonic() + self.ttl)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "created": self.created, "reused": self.reused, "refreshed": self.refreshed,
+                "fallbacks": self.fallbacks}
@@ -0,0 +1,343 @@
+# coding_agent/engine.py
+from dotenv import load_dotenv
+import asyncio
+import os
+import sys
+import time
+from google import genai
+from google.genai.types import Content, FinishReason, FunctionCall, HttpOptions, Part
+from .config import gemini_config, make_config
+from .constants import HISTORY_TOKEN_BUDGET, MAX_TOOL_WORKERS, MODEL_NAME
+from .functions.call_function import AsyncToolScheduler, call_function
+from .functions.cache import ToolCache
+from .functions.registry import DEFAULT_REGISTRY, ToolRegistry
+from .functions.warm_pool import WarmPool
+from .changeset import ChangeSet
+from .context_cache import ContextCache
+from .history import HistoryManager, estimate_tokens
+from .routing import RoutingPolicy, SessionBudget
+from .sessions import SessionLog
+from . import tracing
+from .tracing import Tracer
+
+CONTINUE_PROMPT = "Your last response was cut off. Continue exactly where it stopped, without repeating anything."
+RESUME_PROMPT = "Continue with the task."
+
+
+def make_client(base_url: str | None = None):
+    """Load .env and build a genai client, exiting if no API key is configured."""
+    load_dotenv()
+    API_KEY = os.getenv("GEMINI_API_KEY")
+    if not API_KEY:
+        print("Missing GEMINI_API_KEY")
+        sys.exit(1)
+    http_options = HttpOptions(base_url=base_url) if base_url else None
+    return genai.Client(api_key=API_KEY, http_options=http_options)
+
+
+def _merge_parts(parts):
+    """Join the text deltas of a streamed response back into whole text parts."""
+    merged = []
+    for part in parts:
+        is_text = part.text is not None and part.function_call is None and not part.thought
+        if is_text and merged and merged[-1].text is not None and merged[-1].function_call is None \
+                and not merged[-1].thought:
+            merged[-1] = Part(text=merged[-1].text + part.text)
+        else:
+            merged.append(part)
+    return merged
+
+
+class AgentEngine:
+    """
+    The agent loop shared by the CLI, main.py, the Streamlit app, the server and batch mode.
+
+    One engine holds everything that outlives a session, and each run_async call is one session.
+    Hook points:
+    - registry: the tools, their declarations and whether each is read-only, which decides what
+      may run concurrently (max_workers bounds it); config is built from it unless given.
+    - client: anything with aio.models.generate_content_stream, so response caching, recording,
+      replay and rate limiting wrap the client (see replay, response_cache, batch).
+    - tool_cache and python_pool: tool result caching and warm script runs, shared by sessions.
+    - tracer: records the session, iterations, model calls and tool calls as spans.
+    - router: picks the model and max_output_tokens of each call (without one, model and config
+      are used as given); token_budget and time_budget stop a session that spends too much.
+    - context_cache: sends the system instruction, tools and pinned files as a server-side cached prefix.
+    - preload: starts each session with a snapshot_repo of the work dir of about this many tokens,
+      saving the round-trips the model would spend listing and reading files to learn the project.
+    - track_changes: records every file the session rewrites in a ChangeSet, so it can be diffed or
+      rolled back; the result carries its summary under "changes".
+    - save_session: appends the history to a SessionLog after every iteration; run_async(resume=id)
+      continues a saved session (saved or not, a resumed session keeps being saved).
+    """
+
+    def __init__(self, client=None, model: str = MODEL_NAME, registry: ToolRegistry = DEFAULT_REGISTRY,
+                 config=None, max_iters: int = 20, history_budget: int = HISTORY_TOKEN_BUDGET,
+                 tool_cache: ToolCache | None = None, python_pool: WarmPool | None = None,
+                 tracer: Tracer | None = None, max_workers: int = MAX_TOOL_WORKERS,
+                 router: RoutingPolicy | None = None, token_budget: int | None = None,
+                 time_budget: float | None = None, context_cache: ContextCache | None = None,
+                 preload: int | None = None, track_changes: bool = False, save_session: bool = False):
+        self.client = client
+        self.model = model
+        self.registry = registry
+        if config is None:
+            # the shared default keeps response cache keys stable across engines
+            config = gemini_config if registry is DEFAULT_REGISTRY else make_config(registry)
+        self.config = config
+        self.max_iters = max_iters
+        self.history_budget = history_budget
+        self.tool_cache = tool_cache
+        self.python_pool = python_pool
+        self.tracer = tracer
+        self.max_workers = max_workers
+        self.router = router
+        self.token_budget = token_budget
+        self.time_budget = time_budget
+        self.context_cache = context_cache
+        self.preload = preload
+        self.track_changes = track_changes
+        self.save_session = save_session
+        self._configs = {}
+
+    async def run_async(self, prompt: str | None, work_dir_path: str | None = None, on_event=None,
+                        verbose: bool = False, max_iters: int | None = None, resume: str | None = None):
+        """
+        Run one session, streaming every model response.
+
+        Text deltas and function calls are reported through on_event(dict) as soon as they arrive,
+        and each function call is started before the rest of the response has streamed in.
+        Before each request the history is compacted to about history_budget tokens (0 disables).
+        resume continues the saved session with that id, in its own work dir unless one is given,
+        with max_iters more iterations; prompt may then be None to just carry on.
+        Returns {"status", "text", "conversation", "messages"}, plus "session" if it is saved.
+        """
+        if self.client is None:
+            self.client = make_client()
+        log = None
+        if resume is not None:
+            log = SessionLog.load(resume)
+            work_dir_path = work_dir_path or log.work_dir_path
+        if work_dir_path is None:
+            work_dir_path = os.getcwd()
+        if log is None and self.save_session:
+            log = SessionLog(work_dir_path)
+        if on_event is None:
+            on_event = lambda event: None
+        if max_iters is None:
+            max_iters = self.max_iters
+
+        if self.tracer is not None:
+            session = self.tracer.span("session", model=self.model)
+        else:
+            session = tracing.span("session", model=self.model)
+        changes = None
+        if self.track_changes:
+            changes = _changes_of(log, work_dir_path)
+        with session:
+            result = await self._loop(prompt, work_dir_path, on_event, verbose, max_iters, changes, log)
+        if log is not None:
+            log.save(result["messages"])
+            result["session"] = log.id
+            on_event({"type": "session", "id": log.id, "messages": log.saved})
+        if changes is not None:
+            result["changes"] = changes.summary()
+            on_event({"type": "changes", **result["changes"]})
+        return result
+
+    def run(self, prompt: str | None, work_dir_path: str | None = None, on_event=None, verbose: bool = False,
+            max_iters: int | None = None, resume: str | None = None):
+        """Blocking run_async, for front ends without an event loop."""
+        return asyncio.run(self.run_async(prompt, work_dir_path, on_event, verbose, max_iters, resume))
+
+    def _config_for(self, max_output_tokens):
+        if max_output_tokens not in self._configs:
+            self._configs[max_output_tokens] = self.config.model_copy(update={"max_output_tokens": max_output_tokens})
+        return self._configs[max_output_tokens]
+
+    async def _preload(self, work_dir_path, on_event):
+        """The snapshot_repo call and its result, as if the model had asked for it first."""
+        args = {"max_tokens": self.preload}
+        started = time.perf_counter()
+        with tracing.span("preload"):
+            part = await asyncio.to_thread(call_function, "snapshot_repo", args, work_dir_path,
+                                           registry=DEFAULT_REGISTRY)
+        result = part.function_response.response
+        on_event({"type": "preload", "bytes": len(str(result.get("Result", result))),
+                  "seconds": time.perf_counter() - started})
+        return [Content(role="model", parts=[Part(function_call=FunctionCall(name="snapshot_repo", args=args))]),
+                Content(role="tool", parts=[part])]
+
+    async def _loop(self, prompt, work_dir_path, on_event, verbose, max_iters, changes, log):
+        messages = list(log.messages) if log is not None else []
+        if not prompt and messages and messages[-1].role == "model":
+            # a resumed session that stopped on a model turn needs a user turn to go on; one that
+            # stopped on a user or tool turn is answered as it is
+            prompt = RESUME_PROMPT
+        conversation = []
+        if prompt:
+            messages.append(Content(parts=[Part(text=prompt)], role="user"))
+            conversation.append({"role": "user", "text": prompt})
+        if self.preload and len(messages) == 1:
+            messages += await self._preload(work_dir_path, on_event)
+        if log is not None:
+            # the router classifies the task the session was started with
+            prompt = log.prompt or prompt
+        history = HistoryManager(self.history_budget) if self.history_budget else None
+        budget = SessionBudget(self.token_budget, self.time_budget)
+        last_prompt_tokens = None
+        route = None
+        last_calls = []
+        truncated = False
+        # text of responses cut off at their cap, continued by the next call
+        carried = ""
+
+        for step in range(max_iters):
+            if log is not None:
+                # each iteration ends with whole turns: a model turn's calls always come with their results
+                log.save(messages)
+            stop = budget.exceeded()
+            if stop:
+                on_event({"type": "budget", "iteration": step, "message": stop})
+                return _finish({"status": "budget_exceeded", "message": stop, "text": carried.strip(),
+                                "conversation": conversation, "messages": messages}, self.tool_cache, on_event)
+            with tracing.span("iteration", iteration=step) as iteration:
+                started = time.perf_counter()
+                compacted_from = None
+                if history is not None:
+                    messages, before, after = history.compact(messages)
+                    if after < before:
+                        compacted_from = last_prompt_tokens
+                        iteration.set(compacted_from_tokens=before, compacted_to_tokens=after)
+                        on_event({"type": "compaction", "iteration": step, "estimated_before": before,
+                                  "estimated_after": after, "prompt_tokens_before": last_prompt_tokens})
+                model, config = self.model, self.config
+                if self.router is not None or iteration.recording:
+                    tokens = after if history is not None else estimate_tokens(messages)
+                    iteration.set(history_messages=len(messages), history_tokens_estimate=tokens)
+                if self.router is not None:
+                    route = self.router.route(prompt, step, tokens, last_calls, route, truncated)
+                    model, config = route.model, self._config_for(route.max_output_tokens)
+                    iteration.set(model=model, max_output_tokens=route.max_output_tokens, route_reason=route.reason)
+                    on_event({"type": "route", "iteration": step, "model": model,
+                              "max_output_tokens": route.max_output_tokens, "reason": route.reason})
+                scheduler = AsyncToolScheduler(work_dir_path, verbose, max_workers=self.max_workers,
+                                               cache=self.tool_cache, pool=self.python_pool, registry=self.registry,
+                                               changes=changes)
+                function_calls = []
+                parts = []
+                usage = None
+                contents = messages
+                if self.context_cache is not None:
+                    with tracing.span("context_cache") as cache_span:
+                        config, prefix = await self.context_cache.prepare(self.client, model, config)
+                        cache_span.set(cached=config.cached_content is not None)
+                    contents = prefix + messages if prefix else messages
+
+                # not made current: tool calls start while the response streams and belong to the iteration
+                generate = tracing.start("generate_content", model=model)
+                requested = time.perf_counter()
+                finish_reason = None
+                try:
+                    stream = await self.client.aio.models.generate_content_stream(
+                        model=model,
+                        contents=contents,
+                        config=config,
+                    )
+                    async for chunk in stream:
+                        if not parts and generate.recording:
+                            generate.set(first_chunk_ms=(time.perf_counter() - requested) * 1000)
+                        if getattr(chunk, "usage_metadata", None):
+                            usage = chunk.usage_metadata
+                        if chunk.candidates and chunk.candidates[0].finish_reason:
+                            finish_reason = chunk.candidates[0].finish_reason
+                        if not chunk.candidates or not chunk.candidates[0].content:
+                            continue
+                        for part in (chunk.candidates[0].content.parts or []):
+                            parts.append(part)
+                            if part.function_call:
+                                function_calls.append(part.function_call)
+                                scheduler.submit(part.function_call)
+                                on_event({"type": "function_call", "name": part.function_call.name,
+                                          "args": part.function_call.args})
+                            elif part.text and not part.thought:
+                                on_event({"type": "text", "text": part.text})
+                except BaseException as e:
+                    # the calls already started must not keep running (or writing) after the session
+                    generate.set(error=repr(e))
+                    await scheduler.cancel()
+                    raise
+                finally:
+                    if usage is not None:
+                        generate.set(prompt_tokens=usage.prompt_token_count,
+                                     response_tokens=usage.candidates_token_count,
+                                     cached_tokens=usage.cached_content_token_count)
+                    generate.set(function_calls=len(function_calls),
+                                 response_text_bytes=sum(len(p.text) for p in parts if p.text))
+                    generate.end()
+
+                if not parts:
+                    iteration.set(error="Response is None")
+                    on_event({"type": "error", "message": "Response is None"})
+                    return _finish({"status": "error", "message": "Response is None", "text": carried.strip(),
+                                    "conversation": conversation, "messages": messages}, self.tool_cache, on_event)
+
+                if usage is not None:
+                    on_event({"type": "usage", "iteration": step, "prompt_tokens": usage.prompt_token_count,
+                              "response_tokens": usage.candidates_token_count, "compacted_from": compacted_from,
+                              "cached_tokens": usage.cached_content_token_count})
+                    last_prompt_tokens = usage.prompt_token_count
+                    budget.spend(usage.prompt_token_count, usage.candidates_token_count)
+
+                messages.append(Content(role="model", parts=_merge_parts(parts)))
+                last_calls = [fc.name for fc in function_calls]
+                truncated = finish_reason == FinishReason.MAX_TOKENS
+
+                if function_calls:
+                    try:
+                        tool_parts = await scheduler.results(budget.seconds_left())
+                    except TimeoutError:
+                        # out of time mid-batch: calls not started yet are dropped; the loop head stops
+                        tool_parts = await scheduler.cancel(f"Not run: {budget.exceeded()}.")
+                    messages.append(Content(role="tool", parts=tool_parts))
+                    for fc, part in zip(function_calls, tool_parts):
+                        result = part.function_response.response
+                        conversation.append({"role": "tool", "name": fc.name, "args": fc.args, "result": result})
+                        on_event({"type": "function_response", "name": fc.name, "response": result})
+                    on_event({"type": "iteration", "iteration": step, "seconds": time.perf_counter() - started})
+                    continue
+
+                on_event({"type": "iteration", "iteration": step, "seconds": time.perf_counter() - started})
+                if truncated and self.router is not None:
+                    # cut off mid-answer: ask for the rest, with the router raising the cap
+                    carried += "".join(p.text for p in parts if p.text and not p.thought)
+                    messages.append(Content(role="user", parts=[Part(text=CONTINUE_PROMPT)]))
+                    continue
+            final_text = (carried + "".join(p.text for p in parts if p.text and not p.thought)).strip()
+            if final_text:
+                conversation.append({"role": "assistant", "text": final_text})
+            return _finish({"status": "ok", "text": final_text, "conversation": conversation, "messages": messages},
+                           self.tool_cache, on_event)
+
+        stop = f"stopped after {max_iters} iterations without a final answer"
+        on_event({"type": "max_iters", "iteration": max_iters, "message": stop})
+        return _finish({"status": "max_iters", "message": stop, "text": carried.strip(), "conversation": conversation,
+                        "messages": messages}, self.tool_cache, on_event)
+
+
+def _changes_of(log, work_dir_path):
+    """The ChangeSet of a session: named after its log when saved, continued when resumed."""
+    if log is None:
+        return ChangeSet(work_dir_path)
+    try:
+        return ChangeSet.load(log.id)
+    except FileNotFoundError:
+        return ChangeSet(work_dir_path, log.id)
+
+
+def _finish(result, tool_cache, on_event):
+    if tool_cache is not None:
+        result["tool_cache"] = tool_cache.stats()
+        on_event({"type": "tool_cache", **result["tool_cache"]})
+    on_event({"type": "final", "text": result["text"]})
+    return result
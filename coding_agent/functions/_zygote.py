@@ -0,0 +1,112 @@
+"""
+Warm fork server used by WarmPool; run as `python _zygote.py [module ...]`.
+
+The listed modules are imported once, then every request read from stdin (one JSON line:
+file, args, cwd, timeout, max_bytes, limits) is executed in a child forked from this warm
+process, so each script still gets a fresh process but skips interpreter startup and imports.
+The child's output is read through bounded buffers while it runs, and one JSON line with the
+output and run stats is written back per request.
+"""
+import atexit
+import importlib
+import json
+import os
+import runpy
+import signal
+import sys
+import time
+
+# sys.path[0] is this directory, so the stdlib-only capture helpers import without the package;
+# then they leave sys.modules and this directory leaves the path, so a preimport's or a script's
+# own `import sandbox` gets its module, not ours (each child puts its script's directory there)
+from output_capture import KILL_GRACE, BoundedOutput, pump, pump_until_exit, stats_from
+from sandbox import apply_limits
+del sys.modules["output_capture"], sys.modules["sandbox"]
+sys.path[0] = os.getcwd()
+
+
+def _run_child(request, out, err):
+    os.setsid()
+    os.chdir(request["cwd"])
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(out, 1)
+    os.dup2(err, 2)
+    try:
+        apply_limits(request.get("limits") or {})
+    except OSError as e:
+        print(f"Could not apply the run limits: {e}", file=sys.stderr)
+        os._exit(1)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    sys.argv = [request["file"]] + list(request["args"])
+    sys.path[0] = os.path.dirname(request["file"])
+    code = 0
+    try:
+        runpy.run_path(request["file"], run_name="__main__")
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException as e:
+        import traceback
+        # hide the fork-server frames so the traceback reads like a plain `python script.py` run
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != request["file"]:
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb or e.__traceback__)
+        code = 1
+    finally:
+        try:
+            atexit._run_exitfuncs()
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def main():
+    for name in sys.argv[1:]:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"warm pool: could not preimport {name}: {e}", file=sys.stderr)
+    for line in sys.stdin:
+        request = json.loads(line)
+        sys.stdout.flush()
+        out_r, out_w = os.pipe()
+        err_r, err_w = os.pipe()
+        started = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            os.close(out_r)
+            os.close(err_r)
+            _run_child(request, out_w, err_w)
+        os.close(out_w)
+        os.close(err_w)
+        out, err = BoundedOutput(request["max_bytes"]), BoundedOutput(request["max_bytes"])
+        streams = {out_r: out, err_r: err}
+        deadline = started + request["timeout"]
+        # the run ends when the child exits, even if something it started still holds the pipes
+        status, rusage = pump_until_exit(streams, pid, deadline)
+        timed_out = status is None
+        # on timeout the whole group goes; after an exit, whatever the script left running in it
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+        pump(streams, time.monotonic() + KILL_GRACE)
+        if timed_out:
+            _, status, rusage = os.wait4(pid, 0)
+        os.close(out_r)
+        os.close(err_r)
+        result = stats_from(status, rusage, started, timed_out)
+        result.update(stdout=out.text(), stderr=err.text(), stdout_bytes=out.total, stderr_bytes=err.total)
+        sys.stdout.write(json.dumps(result) + "\n")
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from coding_agent.constants import TOOL_CACHE_MAX_BYTES, TOOL_CACHE_MAX_ENTRIES
+
+# argument that names the path each cacheable tool reads; when omitted it is the work dir itself
+CACHEABLE_PATH_ARGS = {
+    "get_file_content": "file_path",
+    "get_files_info": "directory",
+}
+
+
+class ToolCache:
+    """
+    Bounded LRU cache of read-only tool results.
+
+    Entries are keyed on the tool name, its arguments, the resolved path and that path's
+    (st_mtime_ns, st_size), so a file changed behind the agent's back simply misses. A listing
+    is keyed on its directory's mtime (entries added, removed or renamed) and its .gitignore;
+    a file growing inside it does not change either, so writes go through invalidate(), which
+    drops the path's own entries and the listings of its parents. Recursive listings
+    (max_depth > 1) depend on every directory below and are not cached.
+    Safe to share between threads and between sessions.
+    """
+
+    def __init__(self, max_entries: int = TOOL_CACHE_MAX_ENTRIES, max_bytes: int = TOOL_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._paths = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def key(self, function_name, working_directory, arguments):
+        """Build the cache key for a call, or None when the call cannot be cached."""
+        if function_name not in CACHEABLE_PATH_ARGS:
+            return None
+        arguments = dict(arguments or {})
+        if function_name == "get_files_info":
+            try:
+                if int(arguments.get("max_depth") or 1) > 1:
+                    return None
+            except (TypeError, ValueError):
+                return None
+        absolute_working_dir = os.path.abspath(working_directory)
+        target = arguments.get(CACHEABLE_PATH_ARGS[function_name]) or "."
+        absolute_path = os.path.abspath(os.path.join(working_directory, target))
+        if os.path.commonpath([absolute_working_dir, absolute_path]) != absolute_working_dir:
+            return None
+        try:
+            st = os.stat(absolute_path)
+        except OSError:
+            return None
+        ignore = None
+        if function_name == "get_files_info":
+            try:
+                ignore_st = os.stat(os.path.join(absolute_path, ".gitignore"))
+                ignore = (ignore_st.st_mtime_ns, ignore_st.st_size)
+            except OSError:
+                pass
+        return (function_name, absolute_path, st.st_mtime_ns, st.st_size,
+                json.dumps(arguments, sort_keys=True, default=str), ignore)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key][0]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, result):
+        size = len(result) if isinstance(result, str) else len(json.dumps(result, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (result, size)
+            self._paths.setdefault(key[1], set()).add(key)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        _, size = self._entries.pop(key)
+        self._bytes -= size
+        keys = self._paths.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._paths[key[1]]
+
+    def invalidate(self, absolute_path: str):
+        """Forget a path and every listing of a directory that contains it."""
+        absolute_path = os.path.abspath(absolute_path)
+        with self._lock:
+            for path in list(self._paths):
+                is_ancestor = os.path.commonpath([path, absolute_path]) == path
+                if path == absolute_path or is_ancestor:
+                    for key in list(self._paths.get(path, ())):
+                        if path == absolute_path or key[0] == "get_files_info":
+                            self._drop(key)
+
+    def invalidate_listings(self, absolute_directory: str):
+        """Forget every listing at or below a directory (after a script ran there)."""
+        absolute_directory = os.path.abspath(absolute_directory)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == "get_files_info"]:
+                if os.path.commonpath([key[1], absolute_directory]) == absolute_directory:
+                    self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._bytes}
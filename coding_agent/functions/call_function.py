@@ -1,37 +1,80 @@
-from typing import Any, Dict
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Any, Dict, List
 from google.genai import types
+import json
 import os
 
-from .get_file_content import get_file_content
-from .write_file import write_file
-from .get_files_info import get_files_info
-from .run_python_file import run_python_file
+from coding_agent import tracing
+from coding_agent.changeset import ChangeSet
+from coding_agent.constants import MAX_TOOL_WORKERS
 
+from .cache import ToolCache
+from .registry import DEFAULT_REGISTRY, ToolRegistry
+from .warm_pool import WarmPool
 
-def call_function(function_name: str, arguments: Dict[str, Any], work_dir_path: str ,verbose: bool = False) -> types.Part:
+
+def call_function(function_name: str, arguments: Dict[str, Any], work_dir_path: str ,verbose: bool = False,
+                  cache: ToolCache | None = None, pool: WarmPool | None = None,
+                  registry: ToolRegistry = DEFAULT_REGISTRY, changes: ChangeSet | None = None) -> types.Part:
     """
-    Dispatch Gemini function calls and return a single Part(function_response=...).
+    Dispatch Gemini function calls to the registry's tools and return a single Part(function_response=...).
     The main loop is responsible for wrapping multiple Parts into one Content(role="tool").
+    With a cache, read-only results are reused while their file is unchanged and writes invalidate them.
+    With a pool, run_python_file forks its script from a warm worker instead of starting a new interpreter.
+    With a ChangeSet, every file a tool rewrites is recorded so the session can be diffed or rolled back.
+    When the session is traced, each dispatch is recorded as a tool.<name> span.
     """
+    with tracing.span(f"tool.{function_name}") as span:
+        part = _dispatch(registry.get(function_name), function_name, arguments, work_dir_path, verbose, cache, pool,
+                         changes)
+        if span.recording:
+            response = part.function_response.response
+            span.set(args_bytes=len(json.dumps(arguments or {}, default=str)),
+                     result_bytes=len(str(response.get("Result", response.get("error", "")))),
+                     error="error" in response)
+        return part
+
+
+def _dispatch(tool, function_name, arguments, work_dir_path, verbose, cache, pool, changes):
     if verbose:
         print(f"Calling function: {function_name} with arguments: {arguments}")
+    if tool is None:
+        return types.Part(
+            function_response=types.FunctionResponse(
+                name=function_name,
+                response={"error": f"Function {function_name} not recognized."},
+            )
+        )
 
     try:
-        if function_name == "get_file_content":
-            result = get_file_content(work_dir_path, **arguments)
-        elif function_name == "write_file":
-            result = write_file(work_dir_path, **arguments)
-        elif function_name == "get_files_info":
-            result = get_files_info(work_dir_path, **arguments)
-        elif function_name == "run_python_file":
-            result = run_python_file(work_dir_path, **arguments)
-        else:
-            return types.Part(
-                function_response=types.FunctionResponse(
-                    name=function_name,
-                    response={"error": f"Function {function_name} not recognized."},
+        cacheable = cache is not None and tool.read_only
+        cache_key = cache.key(function_name, work_dir_path, arguments) if cacheable else None
+        if cache_key is not None:
+            hit, result = cache.get(cache_key)
+            tracing.current_span().set(cache_hit=hit)
+            if hit:
+                return types.Part(
+                    function_response=types.FunctionResponse(name=function_name, response={"Result": result})
                 )
-            )
+
+        tracked = nullcontext()
+        if changes is not None and tool.invalidates == "path":
+            tracked = changes.track(function_name, os.path.join(work_dir_path, arguments.get("file_path", "")))
+        with tracked:
+            if tool.uses_pool:
+                result = tool.function(work_dir_path, **arguments, pool=pool)
+            else:
+                result = tool.function(work_dir_path, **arguments)
+
+        if cache is not None:
+            if cache_key is not None:
+                cache.put(cache_key, result)
+            elif tool.invalidates == "path":
+                cache.invalidate(os.path.join(work_dir_path, arguments.get("file_path", "")))
+            elif tool.invalidates == "listings":
+                cache.invalidate_listings(work_dir_path)
 
         # Always wrap under "Result" for consistency
         if not isinstance(result, dict):
@@ -53,3 +96,115 @@ def call_function(function_name: str, arguments: Dict[str, Any], work_dir_path:
                 response={"error": str(e)},
             )
         )
+
+
+def call_functions(function_calls: List[types.FunctionCall], work_dir_path: str, verbose: bool = False,
+                   max_workers: int = MAX_TOOL_WORKERS, cache: ToolCache | None = None,
+                   pool: WarmPool | None = None, registry: ToolRegistry = DEFAULT_REGISTRY,
+                   changes: ChangeSet | None = None) -> List[types.Part]:
+    """
+    Dispatch all function calls of one model turn and return their Parts in the order they were issued.
+    Consecutive read-only calls run on a bounded thread pool; mutating calls (write_file, edit_file,
+    run_python_file) act as barriers and run alone, after everything before them and before anything after them.
+    """
+    if len(function_calls) <= 1 or max_workers <= 1:
+        return [call_function(fc.name, fc.args, work_dir_path, verbose, cache, pool, registry, changes)
+                for fc in function_calls]
+
+    parts: List[types.Part] = [None] * len(function_calls)
+    pending = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for i, fc in enumerate(function_calls):
+            if registry.read_only(fc.name):
+                pending.append((i, executor.submit(call_function, fc.name, fc.args, work_dir_path, verbose, cache,
+                                                   pool, registry)))
+                continue
+            for j, future in pending:
+                parts[j] = future.result()
+            pending.clear()
+            parts[i] = call_function(fc.name, fc.args, work_dir_path, verbose, cache, pool, registry, changes)
+        for j, future in pending:
+            parts[j] = future.result()
+    return parts
+
+
+class AsyncToolScheduler:
+    """
+    Start function calls as they stream in, with the same ordering rules as call_functions:
+    read-only calls wait only for the last mutating call, mutating calls wait for everything before them.
+    """
+
+    def __init__(self, work_dir_path: str, verbose: bool = False, max_workers: int = MAX_TOOL_WORKERS,
+                 cache: ToolCache | None = None, pool: WarmPool | None = None,
+                 registry: ToolRegistry = DEFAULT_REGISTRY, changes: ChangeSet | None = None):
+        self.work_dir_path = work_dir_path
+        self.verbose = verbose
+        self.cache = cache
+        self.pool = pool
+        self.registry = registry
+        self.changes = changes
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self._tasks: List[asyncio.Task] = []
+        self._calls: List[types.FunctionCall] = []
+        self._running = set()
+        self._barrier = None
+
+    def submit(self, function_call: types.FunctionCall) -> asyncio.Task:
+        if self.registry.read_only(function_call.name):
+            waits_for = [self._barrier] if self._barrier else []
+            task = asyncio.create_task(self._run(function_call, waits_for))
+        else:
+            task = asyncio.create_task(self._run(function_call, list(self._tasks)))
+            self._barrier = task
+        self._tasks.append(task)
+        self._calls.append(function_call)
+        return task
+
+    async def _run(self, function_call: types.FunctionCall, waits_for: List[asyncio.Task]) -> types.Part:
+        if waits_for:
+            await asyncio.wait(waits_for)
+        async with self._semaphore:
+            self._running.add(asyncio.current_task())
+            return await asyncio.to_thread(
+                call_function, function_call.name, function_call.args, self.work_dir_path, self.verbose, self.cache,
+                self.pool, self.registry, self.changes,
+            )
+
+    async def results(self, timeout: float | None = None) -> List[types.Part]:
+        """
+        Wait for every submitted call and return the Parts in submission order. Raises TimeoutError
+        if they are not all done within timeout seconds; they keep running (see cancel).
+        """
+        if timeout is not None and self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=max(timeout, 0))
+            if pending:
+                raise TimeoutError(f"{len(pending)} of {len(self._tasks)} function calls still running")
+        parts = await asyncio.gather(*self._tasks)
+        self._reset()
+        return list(parts)
+
+    async def cancel(self, reason: str = "Cancelled.") -> List[types.Part]:
+        """
+        Drop the submitted calls: the ones not started yet are cancelled, the ones already running
+        in a thread (which cannot be interrupted) are waited for, so none outlives the turn.
+        Returns a Part per call in submission order, with reason as the error of those that did not run.
+        """
+        for task in self._tasks:
+            if task not in self._running:
+                task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        parts = []
+        for task, function_call in zip(self._tasks, self._calls):
+            if not task.cancelled() and task.exception() is None:
+                parts.append(task.result())
+            else:
+                parts.append(types.Part(function_response=types.FunctionResponse(
+                    name=function_call.name, response={"error": reason})))
+        self._reset()
+        return parts
+
+    def _reset(self):
+        self._tasks.clear()
+        self._calls.clear()
+        self._running.clear()
+        self._barrier = None
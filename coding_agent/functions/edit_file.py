@@ -0,0 +1,172 @@
+import difflib
+import os
+import re
+from google.genai import types
+from .write_file import atomic_write
+
+# "@@ -12,5 +12,6 @@"; the numbers are optional hints, hunks are located by their content
+_HUNK = re.compile(r"^@@\s*(?:-(\d+)(?:,\d+)?\s+\+\d+(?:,\d+)?)?\s*@@")
+
+# diff lines shown in the summary
+_SUMMARY_LINES = 40
+
+
+def _parse_patch(patch):
+    """Split a unified diff into hunks of (start_hint, old_lines, new_lines)."""
+    hunks = []
+    current = None
+    for line in patch.splitlines():
+        match = _HUNK.match(line)
+        if match:
+            current = (int(match.group(1)) - 1 if match.group(1) else None, [], [])
+            hunks.append(current)
+        elif current is None or line.startswith("\\"):
+            # file headers before the first hunk, "\ No newline at end of file"
+            continue
+        elif line.startswith("-"):
+            current[1].append(line[1:])
+        elif line.startswith("+"):
+            current[2].append(line[1:])
+        else:
+            # context; an empty line is a context line whose leading space was stripped
+            current[1].append(line[1:])
+            current[2].append(line[1:])
+    return hunks
+
+
+def _find(lines, block, hint):
+    """Index where block occurs in lines, the occurrence nearest hint when there are several."""
+    width = len(block)
+    found = [i for i in range(len(lines) - width + 1) if lines[i:i + width] == block]
+    if not found:
+        return None
+    return min(found, key=lambda i: abs(i - hint)) if hint is not None else found[0]
+
+
+def _apply_patch(lines, patch):
+    hunks = _parse_patch(patch)
+    if not hunks:
+        raise ValueError("the patch has no @@ hunks")
+    shift = 0
+    for number, (hint, old, new) in enumerate(hunks, 1):
+        if not old:
+            # pure insertion: no context to match, so trust the line number
+            at = len(lines) if hint is None else min(max(hint + 1 + shift, 0), len(lines))
+        else:
+            at = _find(lines, old, None if hint is None else hint + shift)
+            if at is None:
+                raise ValueError(f"hunk {number} does not match the file; its context/removed lines starting "
+                                 f"with {old[0]!r} were not found; re-read the file and regenerate the patch")
+        lines[at:at + len(old)] = new
+        if hint is not None:
+            shift = at - hint + len(new) - len(old)
+    return lines, len(hunks)
+
+
+def _with_eol(block, eol):
+    """block with its line breaks written as eol, whichever the model used."""
+    return block.replace("\r\n", "\n").replace("\n", eol) if eol != "\n" else block
+
+
+def _apply_edits(text, edits, eol="\n"):
+    for number, edit in enumerate(edits, 1):
+        search = _with_eol(edit.get("search", ""), eol)
+        if not search:
+            raise ValueError(f"edit {number} has an empty search block")
+        count = text.count(search)
+        if count == 0:
+            raise ValueError(f"edit {number}: search block not found; it must match the file exactly, "
+                             "including indentation")
+        if count > 1:
+            raise ValueError(f"edit {number}: search block matches {count} times; include more surrounding lines")
+        text = text.replace(search, _with_eol(edit.get("replace", ""), eol), 1)
+    return text, len(edits)
+
+
+def _summary(file_path, old_lines, new_lines, changes):
+    diff = list(difflib.unified_diff(old_lines, new_lines, n=1, lineterm=""))[2:]
+    added = sum(1 for line in diff if line.startswith("+"))
+    removed = sum(1 for line in diff if line.startswith("-"))
+    shown = diff[:_SUMMARY_LINES]
+    if len(diff) > _SUMMARY_LINES:
+        shown.append(f"...[{len(diff) - _SUMMARY_LINES} more diff lines]")
+    return "\n".join([f"Edited {file_path}: {changes} change(s), +{added} -{removed} lines."] + shown)
+
+
+def edit_file(working_directory, file_path, edits=None, patch=None):
+    absolute_working_dir = os.path.abspath(working_directory)
+    absolute_file_path = os.path.abspath(os.path.join(working_directory, file_path))
+    if not absolute_file_path.startswith(absolute_working_dir):
+        return f"Error: The file {absolute_file_path} is outside the working directory {absolute_working_dir}."
+    if not os.path.isfile(absolute_file_path):
+        return f"Error: The file {file_path} does not exist; use write_file to create it."
+    if not edits and not patch:
+        return "Error: pass either edits (search/replace blocks) or patch (a unified diff)."
+
+    try:
+        with open(absolute_file_path, "r", encoding="utf-8", newline="") as f:
+            text = f.read()
+    except UnicodeDecodeError:
+        return f"Error: {file_path} is not a UTF-8 text file."
+    except Exception as e:
+        return f"Error reading file {file_path}: {str(e)}"
+
+    eol = "\r\n" if "\r\n" in text else "\n"
+    old_lines = text.split(eol)
+    try:
+        if edits:
+            new_text, changes = _apply_edits(text, edits, eol)
+            new_lines = new_text.split(eol)
+        else:
+            new_lines, changes = _apply_patch(list(old_lines), patch)
+            new_text = eol.join(new_lines)
+    except ValueError as e:
+        return f"Error: {e}. {file_path} was not changed."
+
+    if new_text == text:
+        return f"No changes: the edits leave {file_path} as it is."
+    try:
+        atomic_write(absolute_file_path, new_text, newline="")
+    except Exception as e:
+        return f"Error writing to file {file_path}: {str(e)}"
+    return _summary(file_path, old_lines, new_lines, changes)
+
+
+schema_edit_file = types.FunctionDeclaration(
+    name="edit_file",
+    description="Change part of an existing file without resending all of it, either with search/replace "
+                "blocks or with a unified diff. All changes are checked against the current content first and "
+                "the file is only written if every one applies. Returns a short diff of what changed.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "file_path": types.Schema(
+                type= types.Type.STRING,
+                description= "The path to the file, relative to the working directory.",
+            ),
+            "edits": types.Schema(
+                type= types.Type.ARRAY,
+                items=types.Schema(
+                    type=types.Type.OBJECT,
+                    properties={
+                        "search": types.Schema(
+                            type=types.Type.STRING,
+                            description="Exact text to find; must occur exactly once in the file.",
+                        ),
+                        "replace": types.Schema(
+                            type=types.Type.STRING,
+                            description="Text to put in its place.",
+                        ),
+                    },
+                    required=["search", "replace"],
+                ),
+                description= "Search/replace blocks, applied in order.",
+            ),
+            "patch": types.Schema(
+                type= types.Type.STRING,
+                description= "A unified diff for this file (@@ hunks with ' ', '-' and '+' lines).",
+            ),
+        },
+        required=["file_path"]
+    )
+)
@@ -1,31 +1,149 @@
+import codecs
+import mimetypes
+import mmap
 import os
-from coding_agent.constants import MAX_CHARS
+from coding_agent.constants import BINARY_SNIFF_BYTES, MAX_CHARS, MMAP_THRESHOLD
 from google.genai import types
 
-def get_file_content(working_directory, file_path):
+
+# UTF-32 first: its little-endian BOM starts with the UTF-16 one
+_BOMS = ((codecs.BOM_UTF32_LE, "utf-32"), (codecs.BOM_UTF32_BE, "utf-32"), (codecs.BOM_UTF8, "utf-8-sig"),
+         (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+
+# control bytes other than backspace, tab, newline, form feed, carriage return and escape
+_CONTROL = bytes(sorted(set(range(32)) - {8, 9, 10, 12, 13, 27}))
+
+
+def sniff_encoding(head: bytes) -> str | None:
+    """Encoding of a file from its first bytes, or None for binary data."""
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    if b"\0" in head:
+        return None
+    try:
+        head.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # a multi-byte character cut at the end of the sniffed block is still text
+        if e.start >= len(head) - 3:
+            return "utf-8"
+    # not UTF-8: a legacy 8-bit encoding, unless it is full of control bytes
+    if len(head) - len(head.translate(None, _CONTROL)) > len(head) // 10:
+        return None
+    try:
+        head.decode("cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+def _decode(chunk: bytes) -> str:
+    # drop continuation bytes of a character that started before the requested offset
+    start = 0
+    while start < min(len(chunk), 3) and chunk[start] & 0xC0 == 0x80:
+        start += 1
+    return chunk[start:].decode("utf-8", errors="replace")
+
+
+def _char_boundary(data, offset, end, size):
+    """Move a cut point back so it does not split a UTF-8 character."""
+    if end >= size:
+        return size
+    cut = end
+    while cut > offset and cut > end - 3 and data[cut] & 0xC0 == 0x80:
+        cut -= 1
+    return cut if cut > offset else end
+
+
+def _line_offset(data, size, line):
+    """Byte offset where 1-based `line` starts, or size if the file is shorter."""
+    pos = 0
+    for _ in range(line - 1):
+        pos = data.find(b"\n", pos)
+        if pos == -1:
+            return size
+        pos += 1
+    return pos
+
+
+def _read_lines(data, size, file_path, start_line, end_line, limit):
+    start = _line_offset(data, size, start_line)
+    if start >= size:
+        return f"Error: {file_path} has fewer than {start_line} lines."
+    if end_line is not None and end_line < start_line:
+        return f"Error: end_line {end_line} is before start_line {start_line}."
+    end = size if end_line is None else _line_offset(data, size, end_line + 1)
+    cut = _char_boundary(data, start, min(end, start + limit), size)
+    chunk = data[start:cut]
+    text = _decode(chunk)
+    if cut < end:
+        shown = start_line + chunk.count(b"\n")
+        # a line longer than limit: restarting at its start would show the same page again
+        resume = f"offset={cut} and no start_line" if shown == start_line else f"start_line={shown}"
+        text += f"\n...FILE {file_path} TRUNCATED after {limit} bytes (line {shown}); " \
+                f"call again with {resume} to continue..."
+    return text
+
+
+def _read_bytes(data, size, file_path, offset, limit):
+    if offset >= size and size:
+        return f"Error: offset {offset} is past the end of {file_path} ({size} bytes)."
+    end = _char_boundary(data, offset, min(size, offset + limit), size)
+    text = _decode(data[offset:end])
+    if end < size:
+        text += f"\n...FILE {file_path} TRUNCATED: showing bytes {offset}-{end} of {size}; " \
+                f"call again with offset={end} to continue..."
+    return text
+
+
+def get_file_content(working_directory, file_path, offset=None, limit=None, start_line=None, end_line=None):
     absolute_working_dir = os.path.abspath(working_directory)
     absolute_file_path = os.path.abspath(os.path.join(working_directory, file_path))
     if not absolute_file_path.startswith(absolute_working_dir):
         return f"Error: The file {absolute_file_path} is outside the working directory {absolute_working_dir}."
-    
+
     if not os.path.isfile(absolute_file_path):
         return f"Error: The path {absolute_file_path} is not a valid file."
-    
-    file_content_string = ""
+
+    offset = max(int(offset or 0), 0)
+    limit = min(max(int(limit or MAX_CHARS), 1), MAX_CHARS)
     try:
-        with open(absolute_file_path, 'r') as file:
-            file_content_string += file.read(MAX_CHARS) 
-            truncate_value = MAX_CHARS - 20
-            if len(file_content_string) >= truncate_value:
-                file_content_string+=f"\n...FILE {file_path} TRUNCATED after {truncate_value} characters..."
-        return file_content_string
-    
+        with open(absolute_file_path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            head = file.read(BINARY_SNIFF_BYTES)
+            encoding = sniff_encoding(head)
+            if encoding is None:
+                kind = mimetypes.guess_type(absolute_file_path)[0] or "unknown type"
+                return f"Binary file {file_path}: {size} bytes, {kind}; first bytes: {head[:16].hex(' ')}"
+
+            if encoding != "utf-8":
+                # other encodings are converted to UTF-8 first; offsets and limits count bytes of that
+                file.seek(0)
+                data = file.read().decode(encoding, errors="replace").encode("utf-8")
+                size = len(data)
+            # large files are paged through an mmap so only the requested range is touched
+            elif size >= MMAP_THRESHOLD:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                file.seek(0)
+                data = file.read()
+            try:
+                if start_line is not None or end_line is not None:
+                    return _read_lines(data, size, file_path, max(int(start_line or 1), 1),
+                                       None if end_line is None else int(end_line), limit)
+                return _read_bytes(data, size, file_path, offset, limit)
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+
     except Exception as e:
         return f"Error reading file {absolute_file_path}: {str(e)}"
-    
+
 schema_get_file_content = types.FunctionDeclaration(
     name="get_file_content",
-    description="Get the content of a file.",
+    description=f"Get the content of a text file, at most {MAX_CHARS} bytes per call. "
+                "Page through larger files with offset or start_line/end_line. Binary files return a short summary.",
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -33,8 +151,23 @@ schema_get_file_content = types.FunctionDeclaration(
                 type= types.Type.STRING,
                 description= "The path to the file, relative to the working directory.",
             ),
+            "offset": types.Schema(
+                type= types.Type.INTEGER,
+                description= "Byte offset to start reading from. Defaults to 0.",
+            ),
+            "limit": types.Schema(
+                type= types.Type.INTEGER,
+                description= f"Maximum number of bytes to return. Defaults to (and is capped at) {MAX_CHARS}.",
+            ),
+            "start_line": types.Schema(
+                type= types.Type.INTEGER,
+                description= "First line to return (1-based). Takes precedence over offset.",
+            ),
+            "end_line": types.Schema(
+                type= types.Type.INTEGER,
+                description= "Last line to return (inclusive). Defaults to the end of the file.",
+            ),
         },
         required=["file_path"]
     )
 )
-    
\ No newline at end of file
@@ -1,7 +1,97 @@
+import fnmatch
 import os
+from coding_agent.constants import MAX_LIST_ENTRIES
 from google.genai import types
 
-def get_files_info(working_directory, directory=None):
+# tool and VCS directories skipped along with .gitignore'd entries
+ALWAYS_IGNORED = {".git", "__pycache__", ".mypy_cache", ".pytest_cache", ".ruff_cache"}
+
+
+def _read_gitignore(directory, rel_dir):
+    """Parse directory/.gitignore into (pattern, negated, dir_only, anchored_base) rules."""
+    rules = []
+    try:
+        with open(os.path.join(directory, ".gitignore"), "r", errors="replace") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return rules
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.strip("/") if dir_only else line
+        # a slash anywhere but the end anchors the pattern to the .gitignore's directory
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if line.startswith("**/"):
+            line, anchored = line[3:], False
+        rules.append((line, negated, dir_only, rel_dir if anchored else None))
+    return rules
+
+
+def _ignored(rules, rel_path, name, is_dir):
+    ignored = False
+    for pattern, negated, dir_only, base in rules:
+        if dir_only and not is_dir:
+            continue
+        if base is None:
+            matched = fnmatch.fnmatch(name, pattern)
+        else:
+            matched = fnmatch.fnmatch(rel_path, os.path.join(base, pattern) if base else pattern)
+        if matched:
+            ignored = not negated
+    return ignored
+
+
+def _matches(patterns, rel_path, name):
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def _walk(root, rel_dir, depth, max_depth, include, exclude, rules, respect_gitignore, strip=0):
+    """Depth-first scandir walk of root/rel_dir yielding (path minus `strip` chars, stat, is_dir); one stat per entry."""
+    directory = os.path.join(root, rel_dir) if rel_dir else root
+    if respect_gitignore:
+        rules = rules + _read_gitignore(directory, rel_dir)
+    try:
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError:
+        return
+    for entry in entries:
+        rel_path = rel_dir + os.sep + entry.name if rel_dir else entry.name
+        # globs are matched against the path relative to the listed directory
+        shown = rel_path[strip:]
+        is_dir = entry.is_dir()
+        if respect_gitignore and is_dir and entry.name in ALWAYS_IGNORED:
+            continue
+        if rules and _ignored(rules, rel_path, entry.name, is_dir):
+            continue
+        if exclude and _matches(exclude, shown, entry.name):
+            continue
+        if not include or is_dir or _matches(include, shown, entry.name):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            yield shown, st, is_dir
+        if is_dir and depth < max_depth and not entry.is_symlink():
+            yield from _walk(root, rel_path, depth + 1, max_depth, include, exclude, rules, respect_gitignore, strip)
+
+
+def walk_files(root, max_depth=64, include=None, exclude=None, respect_gitignore=True):
+    """Yield (relative path, stat) for every file under root, honouring the same filters as get_files_info."""
+    for rel_path, st, is_dir in _walk(root, "", 1, max_depth, include or [], exclude or [], [],
+                                      respect_gitignore):
+        if not is_dir:
+            yield rel_path, st
+
+
+def get_files_info(working_directory, directory=None, max_depth=1, include=None, exclude=None,
+                   respect_gitignore=True, max_entries=MAX_LIST_ENTRIES, cursor=None):
     absolute_working_dir = os.path.abspath(working_directory)
     if directory is None:
         absolute_directory = absolute_working_dir
@@ -9,20 +99,39 @@ def get_files_info(working_directory, directory=None):
         absolute_directory = os.path.abspath(os.path.join(working_directory, directory))
     if not absolute_directory.startswith(absolute_working_dir):
         return f"Error: The directory {absolute_directory} is outside the working directory {absolute_working_dir}."
+    if not os.path.isdir(absolute_directory):
+        return f"Error: The path {absolute_directory} is not a directory."
 
-    final_response = ""
-    contents = os.listdir(absolute_directory)
-    for content in contents:
-        content_path = os.path.join(absolute_directory, content)
-        is_dir = os.path.isdir(content_path)
-        size = os.path.getsize(content_path)
+    max_depth = max(int(max_depth or 1), 1)
+    max_entries = min(max(int(max_entries or MAX_LIST_ENTRIES), 1), MAX_LIST_ENTRIES)
+    start = int(cursor or 0)
+    # walk relative to the work dir so anchored .gitignore patterns of parent directories still apply
+    base = os.path.relpath(absolute_directory, absolute_working_dir)
+    base = "" if base == "." else base
+    rules = []
+    if respect_gitignore and base:
+        parent = ""
+        for part in base.split(os.sep):
+            rules += _read_gitignore(os.path.join(absolute_working_dir, parent), parent)
+            parent = os.path.join(parent, part)
 
-        final_response += f"- {content}: file size {size} bytes, is_directory: {is_dir}\n"
-    return final_response
+    lines = []
+    walker = _walk(absolute_working_dir, base, 1, max_depth, include or [], exclude or [], rules,
+                   bool(respect_gitignore), len(base) + 1 if base else 0)
+    for index, (name, st, is_dir) in enumerate(walker):
+        if index < start:
+            continue
+        if len(lines) == max_entries:
+            lines.append(f"...listing truncated after {max_entries} entries; "
+                         f"call again with cursor=\"{index}\" to continue.\n")
+            break
+        lines.append(f"- {name}: file size {st.st_size} bytes, is_directory: {is_dir}\n")
+    return "".join(lines)
 
 schema_get_files_info = types.FunctionDeclaration(
     name="get_files_info",
-    description="Get information about files in a directory.",
+    description="Get information about files in a directory, optionally recursively. "
+                "Entries ignored by .gitignore are skipped.",
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -30,7 +139,33 @@ schema_get_files_info = types.FunctionDeclaration(
                 type= types.Type.STRING,
                 description= "The directory to list files from, relative to the working directory. If not provided, lists files in the working directory.",
             ),
+            "max_depth": types.Schema(
+                type= types.Type.INTEGER,
+                description= "How many directory levels to descend. 1 (the default) lists only the directory itself; "
+                             "use a larger value to see a whole project tree in one call.",
+            ),
+            "include": types.Schema(
+                type= types.Type.ARRAY,
+                items=types.Schema(type=types.Type.STRING),
+                description= "Glob patterns (e.g. '*.py', 'src/*'); only matching files are listed.",
+            ),
+            "exclude": types.Schema(
+                type= types.Type.ARRAY,
+                items=types.Schema(type=types.Type.STRING),
+                description= "Glob patterns of files or directories to skip.",
+            ),
+            "respect_gitignore": types.Schema(
+                type= types.Type.BOOLEAN,
+                description= "Skip entries ignored by .gitignore files. Defaults to true.",
+            ),
+            "max_entries": types.Schema(
+                type= types.Type.INTEGER,
+                description= f"Maximum number of entries to return (at most {MAX_LIST_ENTRIES}).",
+            ),
+            "cursor": types.Schema(
+                type= types.Type.STRING,
+                description= "Continuation token from a previous truncated listing.",
+            ),
         }
     )
 )
-
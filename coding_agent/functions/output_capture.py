@@ -0,0 +1,152 @@
+"""
+Bounded, incremental capture of a child process's stdout/stderr.
+
+Stdlib only: the warm pool's fork server imports this file directly.
+"""
+import os
+import selectors
+import subprocess
+import time
+
+KILL_GRACE = 0.5
+
+
+class BoundedOutput:
+    """Keep the first and last max_bytes/2 bytes of a stream and count everything in between."""
+
+    def __init__(self, max_bytes: int):
+        self.head_limit = max_bytes // 2
+        self.tail_limit = max_bytes - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data: bytes):
+        self.total += len(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            if len(self.tail) > self.tail_limit:
+                del self.tail[:len(self.tail) - self.tail_limit]
+
+    def text(self) -> str:
+        omitted = self.total - len(self.head) - len(self.tail)
+        if omitted <= 0:
+            return (bytes(self.head) + bytes(self.tail)).decode("utf-8", errors="replace")
+        return (self.head.decode("utf-8", errors="replace")
+                + f"\n...[{omitted} bytes of output omitted]...\n"
+                + self.tail.decode("utf-8", errors="replace"))
+
+
+def pump(streams, deadline):
+    """
+    Read {fd: BoundedOutput} until every fd hits EOF or the monotonic deadline passes.
+    Returns the fds still open (empty when all reached EOF). Never holds more than the buffers' caps.
+    """
+    selector = selectors.DefaultSelector()
+    for fd in streams:
+        selector.register(fd, selectors.EVENT_READ)
+    open_fds = set(streams)
+    try:
+        while open_fds:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for key, _ in selector.select(remaining):
+                chunk = os.read(key.fd, 65536)
+                if chunk:
+                    streams[key.fd].write(chunk)
+                else:
+                    selector.unregister(key.fd)
+                    open_fds.discard(key.fd)
+    finally:
+        selector.close()
+    return open_fds
+
+
+def pump_until_exit(streams, pid, deadline):
+    """
+    Read {fd: BoundedOutput} until the child pid exits or the monotonic deadline passes; returns
+    (wait status, rusage) of the reaped child, or (None, None) on timeout. A process the child
+    started can keep the pipes open after it exits, so the end of the run is the child's exit,
+    not EOF; the caller drains what is left with pump().
+    """
+    selector = selectors.DefaultSelector()
+    for fd in streams:
+        selector.register(fd, selectors.EVENT_READ)
+    try:
+        # a pidfd becomes readable when the child exits; without one the exit is polled for
+        pidfd = os.pidfd_open(pid)
+        selector.register(pidfd, selectors.EVENT_READ)
+    except (AttributeError, OSError):
+        pidfd = None
+    try:
+        while True:
+            done, status, rusage = os.wait4(pid, os.WNOHANG)
+            if done:
+                return status, rusage
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None, None
+            for key, _ in selector.select(remaining if pidfd is not None else min(remaining, 0.01)):
+                if key.fd == pidfd:
+                    continue
+                chunk = os.read(key.fd, 65536)
+                if chunk:
+                    streams[key.fd].write(chunk)
+                else:
+                    selector.unregister(key.fd)
+    finally:
+        selector.close()
+        if pidfd is not None:
+            os.close(pidfd)
+
+
+def stats_from(status, rusage, started, timed_out):
+    return {
+        "returncode": os.waitstatus_to_exitcode(status),
+        "timed_out": timed_out,
+        "wall_time": time.monotonic() - started,
+        "cpu_time": rusage.ru_utime + rusage.ru_stime,
+        "max_rss_kb": rusage.ru_maxrss,
+    }
+
+
+def run_captured(args, cwd, timeout, max_bytes, kill=None, **popen_kwargs):
+    """
+    Run args with stdout/stderr read incrementally into BoundedOutput buffers.
+
+    On timeout the child is killed (via kill(process) if given) and whatever it printed so far is kept.
+    The run ends when the child exits; a given kill is then also called, for what it may have
+    left running, and the pipes are drained for at most KILL_GRACE seconds.
+    Returns a dict with stdout, stderr, their total byte counts, returncode, timed_out,
+    wall_time, cpu_time and max_rss_kb.
+    """
+    started = time.monotonic()
+    process = subprocess.Popen(args, cwd=cwd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, **popen_kwargs)
+    out, err = BoundedOutput(max_bytes), BoundedOutput(max_bytes)
+    streams = {process.stdout.fileno(): out, process.stderr.fileno(): err}
+    try:
+        status, rusage = pump_until_exit(streams, process.pid, started + timeout)
+        timed_out = status is None
+        if timed_out:
+            (kill or (lambda p: p.kill()))(process)
+            pump(streams, time.monotonic() + KILL_GRACE)
+            _, status, rusage = os.wait4(process.pid, 0)
+        else:
+            if kill is not None:
+                # the child is gone; kill is how anything it left behind (its process group) goes too
+                kill(process)
+            pump(streams, time.monotonic() + KILL_GRACE)
+        # wait4 reaped the child; tell Popen so it does not try again
+        process.returncode = os.waitstatus_to_exitcode(status)
+    finally:
+        process.stdout.close()
+        process.stderr.close()
+    result = stats_from(status, rusage, started, timed_out)
+    result.update(stdout=out.text(), stderr=err.text(), stdout_bytes=out.total, stderr_bytes=err.total)
+    return result
@@ -0,0 +1,63 @@
+from google.genai import types
+
+from .edit_file import edit_file, schema_edit_file
+from .get_file_content import get_file_content, schema_get_file_content
+from .get_files_info import get_files_info, schema_get_files_info
+from .run_python_file import run_python_file, schema_run_python_file
+from .search_code import search_code, schema_search_code
+from .snapshot_repo import schema_snapshot_repo, snapshot_repo
+from .write_file import schema_write_file, write_file
+
+
+class Tool:
+    """
+    A function the model can call: function(working_directory, **arguments) -> str, plus its declaration.
+
+    read_only tools never change the work dir, so calls to them may run side by side; the others
+    are barriers. invalidates says what a mutating call makes stale in the tool cache: "path" (the
+    file named by its file_path argument) or "listings" (every directory listing of the work dir).
+    uses_pool tools also receive the session's WarmPool as pool=.
+    """
+
+    def __init__(self, function, schema: types.FunctionDeclaration, read_only: bool = False,
+                 invalidates: str | None = None, uses_pool: bool = False):
+        self.name = schema.name
+        self.function = function
+        self.schema = schema
+        self.read_only = read_only
+        self.invalidates = invalidates
+        self.uses_pool = uses_pool
+
+
+class ToolRegistry:
+    """Tools by name; dispatch is a dict lookup."""
+
+    def __init__(self, tools=()):
+        self.tools = {}
+        for tool in tools:
+            self.register(tool)
+
+    def register(self, tool: Tool):
+        self.tools[tool.name] = tool
+        return tool
+
+    def get(self, name: str) -> Tool | None:
+        return self.tools.get(name)
+
+    def read_only(self, name: str) -> bool:
+        tool = self.tools.get(name)
+        return tool is not None and tool.read_only
+
+    def declarations(self) -> types.Tool:
+        return types.Tool(function_declarations=[tool.schema for tool in self.tools.values()])
+
+
+DEFAULT_REGISTRY = ToolRegistry([
+    Tool(get_files_info, schema_get_files_info, read_only=True),
+    Tool(get_file_content, schema_get_file_content, read_only=True),
+    Tool(write_file, schema_write_file, invalidates="path"),
+    Tool(edit_file, schema_edit_file, invalidates="path"),
+    Tool(run_python_file, schema_run_python_file, invalidates="listings", uses_pool=True),
+    Tool(search_code, schema_search_code, read_only=True),
+    Tool(snapshot_repo, schema_snapshot_repo, read_only=True),
+])
@@ -1,8 +1,56 @@
 import os
-import subprocess
+import re
+import signal
+import sys
+from coding_agent import tracing
+from coding_agent.constants import (RUN_CPU_SECONDS, RUN_MAX_OPEN_FILES, RUN_MAX_PROCESSES, RUN_MEMORY_BYTES,
+                                    RUN_OUTPUT_MAX_BYTES, RUN_TIMEOUT)
 from google.genai import types
+from .output_capture import run_captured
+from .sandbox import clean_env, kill_group, network_isolation_available, wrap
 
-def run_python_file(working_directory, file_path : str, args = []):
+# limits of every script run (see sandbox.py); a host-wide policy the CLI and server flags adjust
+RUN_LIMITS = {
+    "cpu_seconds": RUN_CPU_SECONDS,
+    "memory_bytes": RUN_MEMORY_BYTES,
+    "open_files": RUN_MAX_OPEN_FILES,
+    "processes": RUN_MAX_PROCESSES,
+    "network": True,
+}
+
+# the resource-usage suffix of format_run_result; it differs between otherwise identical runs
+RUN_STATS_PATTERN = re.compile(r"\(wall [\d.]+s, cpu [\d.]+s, max RSS [\d.]+ MB, output \d+ \+ \d+ bytes\)")
+
+
+def _limit_note(result, limits):
+    """Which limit most likely ended the run, if any."""
+    cpu_seconds = limits.get("cpu_seconds")
+    if result["returncode"] == -signal.SIGXCPU or (
+            cpu_seconds and result["returncode"] == -signal.SIGKILL and result["cpu_time"] >= cpu_seconds):
+        return f"The process used up its CPU time limit of {cpu_seconds}s."
+    if limits.get("memory_bytes") and "MemoryError" in result["stderr"]:
+        return f"The process may have hit its memory limit of {limits['memory_bytes'] // (1024 * 1024)} MB."
+    return None
+
+
+def format_run_result(result, timeout=RUN_TIMEOUT, limits=None):
+    """Render captured output plus exit status and resource usage for the model."""
+    final_string = f'''STDOUT:\n{result["stdout"]}STDERR:\n{result["stderr"]}'''
+    if result["stdout_bytes"] == 0 and result["stderr_bytes"] == 0:
+        final_string = "\nNote: The script produced no output."
+    if result["timed_out"]:
+        status = f"Process timed out after {timeout} seconds and was killed; output above is partial."
+    else:
+        status = f"Process exited with return code {result['returncode']}."
+    stats = f"wall {result['wall_time']:.2f}s, cpu {result['cpu_time']:.2f}s, " \
+            f"max RSS {result['max_rss_kb'] / 1024:.1f} MB, " \
+            f"output {result['stdout_bytes']} + {result['stderr_bytes']} bytes"
+    note = _limit_note(result, limits or {})
+    return f"{final_string}\n{status} ({stats})" + (f"\n{note}" if note else "")
+
+
+def run_python_file(working_directory, file_path : str, args = [], pool=None, max_output_bytes=RUN_OUTPUT_MAX_BYTES,
+                    limits=None):
     absolute_working_dir = os.path.abspath(working_directory)
     absolute_file_path = os.path.abspath(os.path.join(working_directory, file_path))
     if not absolute_file_path.startswith(absolute_working_dir):
@@ -13,34 +61,35 @@ def run_python_file(working_directory, file_path : str, args = []):
         
     if not absolute_file_path.endswith('.py'):
         return f"Error: The file {absolute_file_path} is not a Python (.py) file."
-    import sys
+
+    limits = RUN_LIMITS if limits is None else limits
+    if limits.get("network") is False and not network_isolation_available():
+        return "Error: Scripts must run without network access, but this system cannot isolate them from it."
     try:
-        final_args = [sys.executable, absolute_file_path]
-        final_args.extend(args)
-        result = subprocess.run(
-            final_args, 
-            timeout=30, 
-            capture_output=True, 
-            text=True,
-            cwd=working_directory,  
-            # env=os.environ.copy(),  
-        )
-        final_string = f'''STDOUT:\n{result.stdout}STDERR:\n{result.stderr}'''
-        # if result.returncode != 0:
-        #     final_string += f"\nProcess exited with non-zero return code: {result.returncode}"
-        
-        if result.stdout == "" and result.stderr == "":
-            final_string = "\nNote: The script produced no output."
-        
-        return final_string
-    
+        with tracing.span("subprocess", warm_pool=pool is not None) as span:
+            if pool is not None:
+                # warm pool: fork a fresh child from a pre-started interpreter
+                result = pool.run(absolute_file_path, args, working_directory, timeout=RUN_TIMEOUT,
+                                  max_bytes=max_output_bytes, limits=limits)
+            else:
+                final_args = [sys.executable, absolute_file_path]
+                final_args.extend(args)
+                # output is read incrementally and capped at max_output_bytes per stream (head + tail);
+                # the script leads its own process group, so a timeout kills everything it started;
+                # the limits are applied by an exec'd wrapper, not a preexec_fn in this threaded process
+                result = run_captured(wrap(final_args, limits), working_directory, RUN_TIMEOUT, max_output_bytes,
+                                      kill=kill_group, start_new_session=True, env=clean_env())
+            span.set(returncode=result["returncode"], timed_out=result["timed_out"], cpu_time=result["cpu_time"],
+                     max_rss_kb=result["max_rss_kb"], output_bytes=result["stdout_bytes"] + result["stderr_bytes"])
+        return format_run_result(result, RUN_TIMEOUT, limits)
     
     except Exception as e:
         return f"Error running file {file_path}: {str(e)}"
     
 schema_run_python_file = types.FunctionDeclaration(
     name="run_python_file",
-    description="Run a Python (.py) file accepting a list of args from the cli argument and return its output.",
+    description="Run a Python (.py) file accepting a list of args from the cli argument and return its output. "
+                "Runs are limited in wall time, CPU time, memory, open files and processes.",
     parameters=types.Schema(
         type=types.Type.OBJECT,
         properties={
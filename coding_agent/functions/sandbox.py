@@ -0,0 +1,138 @@
+"""
+Resource limits and isolation for the scripts run_python_file runs.
+
+Limits are a plain dict so they can travel in a warm pool request:
+cpu_seconds (RLIMIT_CPU), memory_bytes (RLIMIT_AS), open_files (RLIMIT_NOFILE), processes (how many
+more processes the user may start, RLIMIT_NPROC) and network (False: the script gets a network
+namespace of its own with nothing but a downed loopback). A missing or None entry is not limited.
+
+Stdlib only: the warm pool's fork server imports this file directly, and cold runs execute it
+as `python -S sandbox.py PROCESS_COUNT NAME=VALUE... -- COMMAND...`, which applies the limits to
+itself and then execs COMMAND, so nothing runs between fork and exec in the (threaded) agent
+process. That costs an interpreter start per run, hence the few, light imports.
+"""
+import os
+import resource
+import sys
+
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWNET = 0x40000000
+
+# environment variables with these words in their name are not passed to scripts
+SECRET_WORDS = ("KEY", "TOKEN", "SECRET", "PASSWORD", "CREDENTIAL")
+
+_libc = None
+_network_isolation = None
+
+
+def clean_env(env=None):
+    """The environment minus anything that looks like a credential (the API key above all)."""
+    env = os.environ if env is None else env
+    return {k: v for k, v in env.items() if not any(word in k.upper() for word in SECRET_WORDS)}
+
+
+def _process_count():
+    """Processes on the host, an upper bound of the user's own (what RLIMIT_NPROC counts)."""
+    try:
+        return sum(1 for name in os.listdir("/proc") if name.isdigit())
+    except OSError:
+        return 0
+
+
+def _limit(which, soft, hard=None):
+    _, current_hard = resource.getrlimit(which)
+    hard = soft if hard is None else hard
+    if current_hard != resource.RLIM_INFINITY:
+        soft, hard = min(soft, current_hard), min(hard, current_hard)
+    resource.setrlimit(which, (soft, hard))
+
+
+def _load_libc():
+    """libc through ctypes, loaded on first use (in the parent where possible) to keep imports light."""
+    global _libc
+    if _libc is None and sys.platform.startswith("linux"):
+        import ctypes
+        _libc = ctypes.CDLL(None, use_errno=True)
+    return _libc
+
+
+def _unshare_network():
+    libc = _load_libc()
+    if libc is None:
+        raise OSError("network isolation needs Linux namespaces")
+    if os.geteuid() == 0 and libc.unshare(CLONE_NEWNET) == 0:
+        return
+    # unprivileged: a user namespace of our own first, mapping our ids onto themselves
+    uid, gid = os.geteuid(), os.getegid()
+    if libc.unshare(CLONE_NEWUSER | CLONE_NEWNET) != 0:
+        import ctypes
+        error = ctypes.get_errno()
+        raise OSError(error, f"unshare(CLONE_NEWNET) failed: {os.strerror(error)}")
+    for path, content in (("/proc/self/setgroups", "deny"), ("/proc/self/uid_map", f"{uid} {uid} 1"),
+                          ("/proc/self/gid_map", f"{gid} {gid} 1")):
+        with open(path, "w") as f:
+            f.write(content)
+
+
+def apply_limits(limits, process_count=None):
+    """Apply limits to the calling process; call it in the child, after fork and before the script."""
+    if limits.get("cpu_seconds"):
+        # SIGXCPU at the soft limit, SIGKILL a second later if the script catches it
+        _limit(resource.RLIMIT_CPU, int(limits["cpu_seconds"]), int(limits["cpu_seconds"]) + 1)
+    if limits.get("memory_bytes"):
+        _limit(resource.RLIMIT_AS, int(limits["memory_bytes"]))
+    if limits.get("open_files"):
+        _limit(resource.RLIMIT_NOFILE, int(limits["open_files"]))
+    if limits.get("processes") and hasattr(resource, "RLIMIT_NPROC"):
+        count = _process_count() if process_count is None else process_count
+        _limit(resource.RLIMIT_NPROC, count + int(limits["processes"]))
+    if limits.get("network") is False:
+        _unshare_network()
+
+
+def wrap(args, limits):
+    """The command running args under limits. The process count is taken here, in the parent."""
+    count = _process_count() if limits.get("processes") else 0
+    settings = [f"{name}={int(value)}" for name, value in limits.items() if value is not None]
+    return [sys.executable, "-S", os.path.abspath(__file__), str(count), *settings, "--", *args]
+
+
+def network_isolation_available():
+    """Whether this kernel lets the current user give a child its own network namespace (probed once)."""
+    global _network_isolation
+    if _network_isolation is None:
+        import subprocess
+        probe = subprocess.run(wrap([], {"network": False}), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+        _network_isolation = probe.returncode == 0
+    return _network_isolation
+
+
+def kill_group(process):
+    """Kill a child started with start_new_session=True together with everything it started."""
+    import signal
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        process.kill()
+
+
+
+def main(argv):
+    split = argv.index("--")
+    limits = {name: int(value) for name, value in (item.split("=") for item in argv[1:split])}
+    if "network" in limits:
+        limits["network"] = bool(limits["network"])
+    count, args = int(argv[0]), argv[split + 1:]
+    try:
+        apply_limits(limits, count)
+    except OSError as e:
+        print(f"Could not apply the run limits: {e}", file=sys.stderr)
+        return 1
+    if args:
+        os.execv(args[0], args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,247 @@
+import fnmatch
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from coding_agent.constants import BINARY_SNIFF_BYTES, CACHE_DIR, SEARCH_MAX_FILE_BYTES, SEARCH_MAX_RESULTS
+from google.genai import types
+from .get_files_info import walk_files
+
+_WORD = re.compile(rb"\w+")
+
+# query words shorter than this match too many tokens to narrow anything down
+_MIN_WORD = 3
+
+# index path -> (tokens, ids) kept in memory; substring-matching the vocabulary in Python is
+# much faster than a LIKE '%word%' table scan. Tokens are only ever added, so the highest id
+# loaded tells which rows another process (or this one) added since
+_vocab = {}
+_vocab_lock = threading.Lock()
+
+# index path -> lock; search_code is read-only, so one turn can run several updates of an index at once
+_update_locks = {}
+_update_locks_guard = threading.Lock()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE, mtime_ns INTEGER, size INTEGER);
+CREATE TABLE IF NOT EXISTS tokens (id INTEGER PRIMARY KEY, token TEXT UNIQUE);
+CREATE TABLE IF NOT EXISTS postings (token_id INTEGER, file_id INTEGER, PRIMARY KEY (token_id, file_id))
+    WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_file ON postings (file_id);
+"""
+
+
+def index_path(working_directory):
+    """On-disk location of the search index for a work dir."""
+    digest = hashlib.sha1(os.path.abspath(working_directory).encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, "search", f"{digest}.sqlite")
+
+
+def _connect(working_directory):
+    path = index_path(working_directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, timeout=30)
+    db.executescript(_SCHEMA)
+    return db
+
+
+def _file_tokens(absolute_path):
+    """Lower-cased identifier tokens of a text file, or None for binary/oversized files."""
+    with open(absolute_path, "rb") as f:
+        data = f.read(SEARCH_MAX_FILE_BYTES + 1)
+    if len(data) > SEARCH_MAX_FILE_BYTES or b"\0" in data[:BINARY_SNIFF_BYTES]:
+        return None
+    return {t.decode("utf-8", errors="ignore").lower() for t in _WORD.findall(data)}
+
+
+def _update_lock(path):
+    with _update_locks_guard:
+        return _update_locks.setdefault(path, threading.Lock())
+
+
+def update_index(working_directory):
+    """
+    Bring the index up to date with the work dir: only files whose (mtime_ns, size) changed are
+    re-tokenized, removed files are dropped. Returns (indexed, removed) counts.
+
+    Updates of one index are serialized: by a lock within the process and by a write transaction
+    taken before reading the file table across processes.
+    """
+    absolute_working_dir = os.path.abspath(working_directory)
+    with _update_lock(index_path(absolute_working_dir)):
+        return _update_index(absolute_working_dir)
+
+
+def _update_index(absolute_working_dir):
+    db = _connect(absolute_working_dir)
+    try:
+        token_ids = {}
+        indexed = 0
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            known = {path: (file_id, mtime_ns, size)
+                     for file_id, path, mtime_ns, size in db.execute("SELECT id, path, mtime_ns, size FROM files")}
+            for rel_path, st in walk_files(absolute_working_dir):
+                entry = known.pop(rel_path, None)
+                if entry and entry[1:] == (st.st_mtime_ns, st.st_size):
+                    continue
+                try:
+                    tokens = _file_tokens(os.path.join(absolute_working_dir, rel_path))
+                except OSError:
+                    continue
+                if entry:
+                    file_id = entry[0]
+                    db.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+                    db.execute("UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?",
+                               (st.st_mtime_ns, st.st_size, file_id))
+                else:
+                    file_id = db.execute("INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?) "
+                                         "ON CONFLICT (path) DO UPDATE SET mtime_ns = excluded.mtime_ns, "
+                                         "size = excluded.size RETURNING id",
+                                         (rel_path, st.st_mtime_ns, st.st_size)).fetchone()[0]
+                    db.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+                for token in (tokens or ()):
+                    if token not in token_ids:
+                        db.execute("INSERT OR IGNORE INTO tokens (token) VALUES (?)", (token,))
+                        token_ids[token] = db.execute("SELECT id FROM tokens WHERE token = ?",
+                                                      (token,)).fetchone()[0]
+                db.executemany("INSERT OR IGNORE INTO postings (token_id, file_id) VALUES (?, ?)",
+                               ((token_ids[t], file_id) for t in (tokens or ())))
+                indexed += 1
+            for file_id, _, _ in known.values():
+                db.execute("DELETE FROM postings WHERE file_id = ?", (file_id,))
+                db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        return indexed, len(known)
+    finally:
+        db.close()
+
+
+def _vocabulary(db, path):
+    with _vocab_lock:
+        top = db.execute("SELECT MAX(id) FROM tokens").fetchone()[0] or 0
+        tokens, ids = _vocab.get(path, ([], []))
+        if ids and ids[-1] > top:
+            # the index was deleted and rebuilt; its ids mean something else now
+            tokens, ids = [], []
+        if not ids or ids[-1] < top:
+            rows = db.execute("SELECT token, id FROM tokens WHERE id > ? ORDER BY id",
+                              (ids[-1] if ids else 0,)).fetchall()
+            tokens = tokens + [r[0] for r in rows]
+            ids = ids + [r[1] for r in rows]
+            _vocab[path] = (tokens, ids)
+        return tokens, ids
+
+
+def _candidates(db, path, query):
+    """
+    Files that can contain the literal query: every word of the query must be a substring
+    of some indexed token of the file. None means "no usable words, scan everything".
+    """
+    words = {w.decode().lower() for w in _WORD.findall(query.encode())}
+    words = {w for w in words if len(w) >= _MIN_WORD}
+    if not words:
+        return None
+    tokens, ids = _vocabulary(db, path)
+    candidates = None
+    for word in sorted(words, key=len, reverse=True):
+        token_ids = [ids[i] for i, token in enumerate(tokens) if word in token]
+        files = set()
+        for start in range(0, len(token_ids), 500):
+            chunk = token_ids[start:start + 500]
+            files.update(row[0] for row in db.execute(
+                f"SELECT file_id FROM postings WHERE token_id IN ({','.join('?' * len(chunk))})", chunk))
+        candidates = files if candidates is None else candidates & files
+        if not candidates:
+            break
+    return candidates
+
+
+def search_code(working_directory, query, regex=False, case_sensitive=False, path_glob=None, context_lines=2,
+                max_results=SEARCH_MAX_RESULTS):
+    absolute_working_dir = os.path.abspath(working_directory)
+    if not query:
+        return "Error: query must not be empty."
+    try:
+        pattern = re.compile(query if regex else re.escape(query), 0 if case_sensitive else re.IGNORECASE)
+    except re.error as e:
+        return f"Error: invalid regular expression {query!r}: {e}"
+    context_lines = min(max(int(context_lines or 0), 0), 10)
+    max_results = min(max(int(max_results or SEARCH_MAX_RESULTS), 1), SEARCH_MAX_RESULTS)
+
+    update_index(absolute_working_dir)
+    db = _connect(absolute_working_dir)
+    try:
+        # regexes have no literal words we can trust, so they scan every indexed file
+        candidates = None if regex else _candidates(db, index_path(absolute_working_dir), query)
+        rows = db.execute("SELECT id, path FROM files ORDER BY path").fetchall()
+    finally:
+        db.close()
+
+    blocks = []
+    matches = 0
+    for file_id, rel_path in rows:
+        if candidates is not None and file_id not in candidates:
+            continue
+        if path_glob and not fnmatch.fnmatch(rel_path, path_glob):
+            continue
+        try:
+            with open(os.path.join(absolute_working_dir, rel_path), "r", errors="replace") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            continue
+        shown_until = -1
+        for number, line in enumerate(lines):
+            if not pattern.search(line):
+                continue
+            matches += 1
+            start = max(number - context_lines, shown_until + 1)
+            if blocks and (start > shown_until + 1 or shown_until < 0):
+                blocks.append("--")
+            for n in range(start, min(number + context_lines + 1, len(lines))):
+                sep = ":" if pattern.search(lines[n]) else "-"
+                blocks.append(f"{rel_path}{sep}{n + 1}{sep} {lines[n][:300]}")
+                shown_until = n
+            if matches >= max_results:
+                blocks.append(f"...stopped after {max_results} matches; narrow the query or use path_glob.")
+                return "\n".join(blocks)
+    if not matches:
+        return f"No matches for {query!r}."
+    return "\n".join(blocks)
+
+
+schema_search_code = types.FunctionDeclaration(
+    name="search_code",
+    description="Search the files of the working directory for a string (or regex) and return matching "
+                "lines with context, as path:line: text. Much cheaper than listing and reading files to find code.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "query": types.Schema(
+                type= types.Type.STRING,
+                description= "Text to search for, e.g. a function or class name.",
+            ),
+            "regex": types.Schema(
+                type= types.Type.BOOLEAN,
+                description= "Treat query as a Python regular expression. Slower than a plain string search.",
+            ),
+            "case_sensitive": types.Schema(
+                type= types.Type.BOOLEAN,
+                description= "Match case exactly. Defaults to false.",
+            ),
+            "path_glob": types.Schema(
+                type= types.Type.STRING,
+                description= "Only search files whose relative path matches this glob, e.g. 'src/*.py'.",
+            ),
+            "context_lines": types.Schema(
+                type= types.Type.INTEGER,
+                description= "Lines of context before and after each match (default 2).",
+            ),
+            "max_results": types.Schema(
+                type= types.Type.INTEGER,
+                description= f"Maximum number of matching lines to return (at most {SEARCH_MAX_RESULTS}).",
+            ),
+        },
+        required=["query"]
+    )
+)
@@ -0,0 +1,236 @@
+import ast
+import fnmatch
+import hashlib
+import json
+import os
+import threading
+from coding_agent.constants import (BINARY_SNIFF_BYTES, CACHE_DIR, CHARS_PER_TOKEN, SNAPSHOT_HEAD_LINES,
+                                    SNAPSHOT_MAX_PARSE_BYTES, SNAPSHOT_TOKEN_BUDGET)
+from google.genai import types
+from .get_file_content import sniff_encoding
+from .get_files_info import walk_files
+from .write_file import atomic_write
+
+# files whose first lines say what a project is and how it is built, shown before any other heads
+KEY_FILES = ["README*", "pyproject.toml", "setup.py", "setup.cfg", "requirements*.txt", "package.json",
+             "Cargo.toml", "go.mod", "Makefile", "Dockerfile", "main.py", "__main__.py", "app.py", "manage.py"]
+
+# generated files whose first lines say nothing useful
+NO_HEAD_FILES = ["*.lock", "*-lock.json", "*.lock.json", "*.min.js", "*.min.css", "*.map", "*.svg"]
+
+# longest signature kept in an outline line
+_SIGNATURE_CHARS = 80
+
+_lock = threading.Lock()
+
+
+# bumped when what _scan stores changes, so stale per-file data is not reused
+_FORMAT = 2
+
+
+def snapshot_path(working_directory):
+    """On-disk location of the per-file snapshot data for a work dir."""
+    digest = hashlib.sha1(os.path.abspath(working_directory).encode()).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, "snapshot", f"{digest}.v{_FORMAT}.json")
+
+
+def _signature(node):
+    args = ast.unparse(node.args)
+    if len(args) > _SIGNATURE_CHARS:
+        args = args[:_SIGNATURE_CHARS - 3] + "..."
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    return f"{prefix} {node.name}({args})"
+
+
+def _outline(source):
+    """Top-level classes (with their methods), functions and constants of a Python module."""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError) as e:
+        return [f"(does not parse: {getattr(e, 'msg', e)} at line {getattr(e, 'lineno', '?')})"]
+    lines = []
+    constants = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            lines.append(f"{node.lineno} {_signature(node)}")
+        elif isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(b) for b in node.bases)
+            methods = [n.name for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            line = f"{node.lineno} class {node.name}({bases})" if bases else f"{node.lineno} class {node.name}"
+            lines.append(line + (": " + ", ".join(methods) if methods else ""))
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            constants += [t.id for t in targets if isinstance(t, ast.Name) and t.id.isupper()]
+    if constants:
+        lines.append("constants: " + ", ".join(constants))
+    return lines
+
+
+def _scan(absolute_path, rel_path, size):
+    """[outline lines or None, head text or None] of one file; both None for binary files."""
+    with open(absolute_path, "rb") as f:
+        data = f.read(min(size, SNAPSHOT_MAX_PARSE_BYTES) if rel_path.endswith(".py") else BINARY_SNIFF_BYTES)
+    encoding = sniff_encoding(data[:BINARY_SNIFF_BYTES])
+    if encoding is None:
+        return [None, None]
+    text = data.decode(encoding, errors="replace")
+    outline = _outline(text) if rel_path.endswith(".py") and size <= SNAPSHOT_MAX_PARSE_BYTES else None
+    head = "\n".join(text.splitlines()[:SNAPSHOT_HEAD_LINES])
+    return [outline, head]
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}}
+
+
+def _update(absolute_working_dir):
+    """
+    Bring the stored per-file data up to date: only files whose (mtime_ns, size) changed are
+    read and parsed again. Returns (data, fingerprint of the tree).
+    """
+    path = snapshot_path(absolute_working_dir)
+    data = _load(path)
+    old = data["files"]
+    files = {}
+    digest = hashlib.sha1()
+    changed = False
+    for rel_path, st in walk_files(absolute_working_dir):
+        digest.update(f"{rel_path}\0{st.st_mtime_ns}\0{st.st_size}\n".encode())
+        entry = old.get(rel_path)
+        if entry is None or entry[:2] != [st.st_mtime_ns, st.st_size]:
+            try:
+                entry = [st.st_mtime_ns, st.st_size] + _scan(os.path.join(absolute_working_dir, rel_path),
+                                                             rel_path, st.st_size)
+            except OSError:
+                continue
+            changed = True
+        files[rel_path] = entry
+    fingerprint = digest.hexdigest()
+    if changed or len(files) != len(old):
+        data = {"files": files, "rendered": {}}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, json.dumps(data))
+    return data, fingerprint
+
+
+def _size(n):
+    for unit in ("B", "K", "M"):
+        if n < 1024 or unit == "M":
+            return f"{n}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+
+
+def _tree(paths, files):
+    lines = []
+    shown_dirs = set()
+    for rel_path in paths:
+        parts = rel_path.split(os.sep)
+        for depth in range(len(parts) - 1):
+            directory = os.sep.join(parts[:depth + 1])
+            if directory not in shown_dirs:
+                shown_dirs.add(directory)
+                lines.append("  " * depth + parts[depth] + "/")
+        lines.append("  " * (len(parts) - 1) + f"{parts[-1]}  {_size(files[rel_path][1])}")
+    return lines
+
+
+def _head_order(paths, files):
+    """Key files first, then other text files without an outline, shallow and small ones first."""
+    def rank(rel_path):
+        name = os.path.basename(rel_path)
+        key = next((i for i, p in enumerate(KEY_FILES) if fnmatch.fnmatch(name, p)), len(KEY_FILES))
+        return key, rel_path.count(os.sep), files[rel_path][1], rel_path
+    candidates = [p for p in paths if files[p][3] and not files[p][2]
+                  and not any(fnmatch.fnmatch(os.path.basename(p), n) for n in NO_HEAD_FILES)]
+    return sorted(candidates, key=rank)
+
+
+def _render(directory, paths, files, max_tokens):
+    budget = max_tokens * CHARS_PER_TOKEN
+    out = [f"Snapshot of {directory or '.'}: {len(paths)} files, {_size(sum(files[p][1] for p in paths))}."]
+    used = len(out[0])
+    omitted = []
+
+    def add(section, lines, limit, what):
+        nonlocal used
+        if not lines:
+            return
+        out.append(section)
+        used += len(section) + 1
+        for index, line in enumerate(lines):
+            if used + len(line) + 1 > limit:
+                omitted.append(f"{len(lines) - index} {what}")
+                return
+            out.append(line)
+            used += len(line) + 1
+
+    # the tree may take up to 40% of the budget, outlines up to 75% including the tree, heads the rest
+    add("\n## Tree", _tree(paths, files), budget * 0.4, "tree entries")
+    outlines = []
+    for rel_path in paths:
+        if files[rel_path][2]:
+            outlines.append(rel_path)
+            outlines += ["  " + line for line in files[rel_path][2]]
+    add("\n## Python outline (line, top-level definitions)", outlines, budget * 0.75, "outline lines")
+    heads = []
+    for rel_path in _head_order(paths, files):
+        head = files[rel_path][3]
+        heads.append(f"--- {rel_path} (first {head.count(chr(10)) + 1} lines) ---\n{head}")
+    add("\n## File heads", heads, budget, "file heads")
+    if omitted:
+        out.append(f"\n(omitted to fit ~{max_tokens} tokens: {', '.join(omitted)}; "
+                   "use get_files_info and get_file_content for the rest)")
+    return "\n".join(out)
+
+
+def snapshot_repo(working_directory, directory=None, max_tokens=SNAPSHOT_TOKEN_BUDGET):
+    absolute_working_dir = os.path.abspath(working_directory)
+    absolute_directory = os.path.abspath(os.path.join(working_directory, directory or "."))
+    if not absolute_directory.startswith(absolute_working_dir):
+        return f"Error: The directory {absolute_directory} is outside the working directory {absolute_working_dir}."
+    if not os.path.isdir(absolute_directory):
+        return f"Error: The path {absolute_directory} is not a directory."
+    max_tokens = max(int(max_tokens or SNAPSHOT_TOKEN_BUDGET), 500)
+
+    try:
+        with _lock:
+            data, fingerprint = _update(absolute_working_dir)
+            prefix = os.path.relpath(absolute_directory, absolute_working_dir)
+            prefix = "" if prefix == "." else prefix + os.sep
+            key = f"{fingerprint}:{prefix}:{max_tokens}"
+            rendered = data.setdefault("rendered", {})
+            if key not in rendered:
+                files = data["files"]
+                paths = [p for p in files if p.startswith(prefix)]
+                rendered.clear()
+                rendered[key] = _render(prefix.rstrip(os.sep), [p[len(prefix):] for p in paths],
+                                        {p[len(prefix):]: files[p] for p in paths}, max_tokens)
+                atomic_write(snapshot_path(absolute_working_dir), json.dumps(data))
+            return rendered[key]
+    except Exception as e:
+        return f"Error building snapshot: {str(e)}"
+
+
+schema_snapshot_repo = types.FunctionDeclaration(
+    name="snapshot_repo",
+    description="Get an overview of the project in one call: the file tree with sizes, the top-level classes, "
+                "functions and constants of every Python file, and the first lines of key files (README, "
+                "build and config files). Call it first instead of listing and reading files one at a time.",
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "directory": types.Schema(
+                type= types.Type.STRING,
+                description= "Only snapshot this directory, relative to the working directory. Defaults to all of it.",
+            ),
+            "max_tokens": types.Schema(
+                type= types.Type.INTEGER,
+                description= f"Approximate size limit of the snapshot in tokens (default {SNAPSHOT_TOKEN_BUDGET}).",
+            ),
+        }
+    )
+)
@@ -0,0 +1,117 @@
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+from coding_agent.constants import RUN_OUTPUT_MAX_BYTES, RUN_TIMEOUT
+from .sandbox import clean_env
+
+_ZYGOTE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_zygote.py")
+
+
+class _Zygote:
+    """One warm fork-server process; serves one request at a time."""
+
+    def __init__(self, preimport):
+        self.process = subprocess.Popen(
+            [sys.executable, _ZYGOTE, *preimport],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            # scripts inherit the worker's environment, so credentials are left out here already
+            env=clean_env(),
+        )
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def run(self, request):
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError("warm pool worker exited unexpectedly")
+        return json.loads(line)
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+
+
+class WarmPool:
+    """
+    Pool of pre-started Python processes that fork a fresh child per run_python_file call.
+
+    Each worker imports `preimport` once; the script then runs in a child forked from that warm
+    parent, so it gets a clean process without paying interpreter startup and import time.
+    POSIX only (needs os.fork).
+    """
+
+    def __init__(self, size: int = 2, preimport=()):
+        if not hasattr(os, "fork"):
+            raise RuntimeError("WarmPool needs os.fork, which this platform does not provide")
+        self.size = size
+        self.preimport = list(preimport)
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        zygote = _Zygote(self.preimport)
+        with self._lock:
+            self._all.append(zygote)
+        return zygote
+
+    def _replace(self, zygote):
+        """A new worker in place of a dead or broken one, which is closed and forgotten."""
+        zygote.close()
+        with self._lock:
+            if zygote in self._all:
+                self._all.remove(zygote)
+        return self._spawn()
+
+    def run(self, file_path: str, args, cwd: str, timeout: float = RUN_TIMEOUT,
+            max_bytes: int = RUN_OUTPUT_MAX_BYTES, limits=None):
+        """
+        Run a script in a forked child, in its own process group and under limits (see sandbox.py);
+        return the same dict as output_capture.run_captured.
+        """
+        zygote = self._idle.get()
+        if not zygote.alive():
+            zygote = self._replace(zygote)
+        request = {
+            "file": file_path,
+            "args": [str(a) for a in (args or [])],
+            "cwd": os.path.abspath(cwd),
+            "timeout": timeout,
+            "max_bytes": max_bytes,
+            "limits": limits or {},
+        }
+        try:
+            result = zygote.run(request)
+        except Exception:
+            # a worker that broke mid-request cannot be trusted with the next one
+            self._idle.put(self._replace(zygote))
+            raise
+        self._idle.put(zygote)
+        return result
+
+    def close(self):
+        with self._lock:
+            zygotes, self._all = self._all, []
+        for zygote in zygotes:
+            zygote.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,6 +1,52 @@
 import os
+import stat
+import tempfile
+import threading
 from google.genai import types
 
+_umask = None
+_umask_lock = threading.Lock()
+
+
+def new_file_mode():
+    """Mode of a file created by open() in this process: 0o666 minus the umask (read once)."""
+    global _umask
+    if _umask is None:
+        try:
+            # Linux reports the umask without changing it
+            with open("/proc/self/status") as f:
+                _umask = next(int(line.split()[1], 8) for line in f if line.startswith("Umask:"))
+        except (OSError, StopIteration, ValueError):
+            with _umask_lock:
+                # elsewhere it can only be read by setting it; a strict one meanwhile fails safe
+                _umask = os.umask(0o077)
+                os.umask(_umask)
+    return 0o666 & ~_umask
+
+
+def atomic_write(path, content, newline=None):
+    """
+    Write content as UTF-8 through a temp file in the same directory and os.replace it over path,
+    so readers see either the old or the new file, never a half-written one. Keeps path's mode.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline=newline) as f:
+            f.write(content)
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = new_file_mode()
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
 def write_file(working_directory, file_path, content):
 
     absolute_working_dir = os.path.abspath(working_directory)
@@ -16,8 +62,7 @@ def write_file(working_directory, file_path, content):
             return f"Error creating directories for {absolute_file_path}: {str(e)}"
             
     try:
-        with open(absolute_file_path, 'w') as file:
-            file.write(content)
+        atomic_write(absolute_file_path, content)
         return f"Successfully wrote to file {file_path} {len(content)} characters."
     
     except Exception as e:
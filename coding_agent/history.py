@@ -0,0 +1,120 @@
+# coding_agent/history.py
+import json
+
+from google.genai.types import Content, FunctionResponse, Part
+
+from .constants import CHARS_PER_TOKEN, HISTORY_TOKEN_BUDGET
+
+# tools whose results are fully replaced by a later call with the same arguments
+IDEMPOTENT_READS = {"get_file_content", "get_files_info"}
+
+_MARKER = "[compacted]"
+
+
+def _content_chars(content) -> int:
+    chars = 0
+    for part in (content.parts or []):
+        if part.text:
+            chars += len(part.text)
+        if part.function_call:
+            chars += len(part.function_call.name or "") + len(json.dumps(part.function_call.args or {}, default=str))
+        if part.function_response:
+            chars += len(json.dumps(part.function_response.response or {}, default=str))
+    return chars
+
+
+def estimate_tokens(messages) -> int:
+    """Cheap prompt-size estimate (characters / CHARS_PER_TOKEN) used to decide when to compact."""
+    return sum(_content_chars(content) for content in messages) // CHARS_PER_TOKEN
+
+
+def _tool_results(messages):
+    """
+    Yield (message_index, part_index, function_call) for every function_response part.
+    A tool Content answers the function_call parts of the model Content before it, in order.
+    """
+    calls = []
+    for i, content in enumerate(messages):
+        parts = content.parts or []
+        if content.role == "model":
+            calls = [p.function_call for p in parts if p.function_call]
+            continue
+        responses = [j for j, p in enumerate(parts) if p.function_response]
+        for j, call in zip(responses, calls):
+            yield i, j, call
+        calls = []
+
+
+def _replace_response(messages, i, j, response):
+    content = messages[i]
+    parts = list(content.parts)
+    old = parts[j].function_response
+    parts[j] = Part(function_response=FunctionResponse(id=old.id, name=old.name, response=response))
+    messages[i] = Content(role=content.role, parts=parts)
+
+
+class HistoryManager:
+    """
+    Keep the prompt under a token budget by shrinking old tool results in place.
+
+    Parts are never dropped, so every function_call keeps its function_response.
+    Repeated reads of the same path keep only the newest result, and results older
+    than the last `keep_recent` tool turns are cut to their first `stale_chars` characters.
+    """
+
+    def __init__(self, budget_tokens: int = HISTORY_TOKEN_BUDGET, keep_recent: int = 2, stale_chars: int = 400):
+        self.budget_tokens = budget_tokens
+        self.keep_recent = keep_recent
+        self.stale_chars = stale_chars
+        # id(content) -> (content, chars); Contents are replaced, never mutated, so sizes stay valid
+        self._chars = {}
+
+    def estimate(self, messages) -> int:
+        """estimate_tokens, measuring only the Contents not seen by the previous call."""
+        sizes = {}
+        total = 0
+        for content in messages:
+            entry = self._chars.get(id(content))
+            if entry is None or entry[0] is not content:
+                entry = (content, _content_chars(content))
+            sizes[id(content)] = entry
+            total += entry[1]
+        self._chars = sizes
+        return total // CHARS_PER_TOKEN
+
+    def compact(self, messages):
+        """Return (messages, tokens_before, tokens_after); the input list is left untouched."""
+        before = self.estimate(messages)
+        if before <= self.budget_tokens:
+            return messages, before, before
+
+        messages = list(messages)
+        results = list(_tool_results(messages))
+
+        latest = {}
+        for i, j, call in results:
+            if call.name in IDEMPOTENT_READS:
+                latest[(call.name, json.dumps(call.args or {}, sort_keys=True, default=str))] = (i, j)
+        for i, j, call in results:
+            key = (call.name, json.dumps(call.args or {}, sort_keys=True, default=str))
+            if call.name in IDEMPOTENT_READS and latest[key] != (i, j):
+                _replace_response(messages, i, j, {"Result": f"{_MARKER} superseded by a later {call.name} "
+                                                             f"call with the same arguments."})
+
+        tool_turns = sorted({i for i, _, _ in results})
+        recent = set(tool_turns[-self.keep_recent:]) if self.keep_recent else set()
+        after = self.estimate(messages)
+        for i, j, call in results:
+            if after <= self.budget_tokens:
+                break
+            if i in recent:
+                continue
+            response = messages[i].parts[j].function_response.response or {}
+            text = json.dumps(response, default=str) if "Result" not in response else str(response["Result"])
+            if text.startswith(_MARKER) or len(text) <= self.stale_chars:
+                continue
+            compacted = {"Result": f"{_MARKER} {text[:self.stale_chars]}\n...{len(text) - self.stale_chars} "
+                                   f"more characters dropped; call {call.name} again if needed."}
+            after -= (len(json.dumps(response, default=str)) - len(json.dumps(compacted))) // CHARS_PER_TOKEN
+            _replace_response(messages, i, j, compacted)
+        return messages, before, self.estimate(messages)
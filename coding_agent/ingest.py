@@ -0,0 +1,232 @@
+# coding_agent/ingest.py
+"""
+Upload ingestion into persistent per-user workspaces.
+
+Uploads are plain files or zip/tar archives, extracted with their directory tree. Every member
+is streamed to a temp file next to its destination in INGEST_CHUNK_BYTES chunks while it is
+hashed, so memory use does not grow with the upload. A manifest beside each workspace records the
+sha256 of every file as extracted; a member whose hash matches a file that has not changed since
+is dropped instead of replacing it, so uploading a new version of a project rewrites only what
+changed. Workspaces over WORKSPACES_QUOTA_BYTES in total are removed, least recently used first;
+their sizes come from the manifests, so cleanup does not walk every workspace tree.
+"""
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tarfile
+import tempfile
+import zipfile
+
+from .constants import INGEST_CHUNK_BYTES, WORKSPACE_MAX_BYTES, WORKSPACES_DIR, WORKSPACES_QUOTA_BYTES
+from .functions.write_file import atomic_write, new_file_mode
+
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+class IngestError(Exception):
+    pass
+
+
+def workspace_path(user_key: str, root: str = WORKSPACES_DIR) -> str:
+    """The workspace directory of a user (created on first use)."""
+    digest = hashlib.sha1(user_key.encode()).hexdigest()[:16]
+    path = os.path.join(root, digest)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _manifest_path(workspace: str) -> str:
+    return workspace.rstrip(os.sep) + ".manifest.json"
+
+
+def _load_manifest(workspace):
+    try:
+        with open(_manifest_path(workspace)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _safe_path(workspace, name):
+    """Destination of an archive member, or None for names that would land outside the workspace."""
+    name = name.replace("\\", "/").strip("/")
+    parts = [p for p in name.split("/") if p not in ("", ".")]
+    if not parts or ".." in parts or ":" in parts[0]:
+        return None, None
+    rel_path = os.path.join(*parts)
+    return rel_path, os.path.join(workspace, rel_path)
+
+
+def _zip_members(fileobj):
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            mode = info.external_attr >> 16
+            if info.is_dir() or stat.S_ISLNK(mode):
+                continue
+            with archive.open(info) as member:
+                yield info.filename, member
+
+
+def _tar_members(fileobj):
+    # "r|*" reads the archive as a stream: members are visited once, in order, without seeking
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for info in archive:
+            if not info.isfile():
+                continue
+            member = archive.extractfile(info)
+            if member is not None:
+                yield info.name, member
+
+
+def _members(name, fileobj):
+    """(member name, readable) pairs of one upload: the archive's files, or the upload itself."""
+    lower = name.lower()
+    if lower.endswith(".zip"):
+        return _zip_members(fileobj)
+    if lower.endswith(TAR_SUFFIXES):
+        return _tar_members(fileobj)
+    return iter([(name, fileobj)])
+
+
+class _Ingestion:
+    def __init__(self, workspace, max_bytes):
+        self.workspace = workspace
+        self.max_bytes = max_bytes
+        self.real_workspace = os.path.realpath(workspace)
+        self.manifest = _load_manifest(workspace)
+        self.stats = {"written": 0, "unchanged": 0, "skipped": 0, "bytes_written": 0, "bytes_read": 0}
+
+    def add(self, name, stream):
+        rel_path, destination = _safe_path(self.workspace, name)
+        if rel_path is None or os.path.isdir(destination):
+            self.stats["skipped"] += 1
+            return
+        # a symlinked folder inside the workspace must not lead the write outside of it
+        if not os.path.realpath(os.path.dirname(destination)).startswith(self.real_workspace):
+            self.stats["skipped"] += 1
+            return
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(destination), prefix=".ingest.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = stream.read(INGEST_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    self.stats["bytes_read"] += len(chunk)
+                    if self.stats["bytes_read"] > self.max_bytes:
+                        raise IngestError(f"upload exceeds the workspace limit of {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    out.write(chunk)
+            sha256 = digest.hexdigest()
+            if self._unchanged(rel_path, destination, sha256):
+                os.remove(tmp)
+                self.stats["unchanged"] += 1
+                return
+            os.chmod(tmp, new_file_mode())
+            os.replace(tmp, destination)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        st = os.stat(destination)
+        self.manifest[rel_path] = [sha256, st.st_size, st.st_mtime_ns]
+        self.stats["written"] += 1
+        self.stats["bytes_written"] += size
+
+    def _unchanged(self, rel_path, destination, sha256):
+        """Whether destination already holds this content: same hash as extracted and untouched since."""
+        entry = self.manifest.get(rel_path)
+        if entry is None or entry[0] != sha256:
+            return False
+        try:
+            st = os.stat(destination)
+        except OSError:
+            return False
+        return [st.st_size, st.st_mtime_ns] == entry[1:]
+
+    def save(self):
+        atomic_write(_manifest_path(self.workspace), json.dumps(self.manifest))
+
+
+def ingest(uploads, workspace: str, max_bytes: int = WORKSPACE_MAX_BYTES) -> dict:
+    """
+    Extract uploads, an iterable of (name, binary file object), into workspace. Archives (zip and
+    tar, compressed or not) are unpacked with their folders; other files land at their name.
+    Returns counts of files written, unchanged and skipped (unsafe names) and the bytes moved.
+    Raises IngestError if the uploads hold more than max_bytes; files written so far are kept.
+    """
+    ingestion = _Ingestion(os.path.abspath(workspace), max_bytes)
+    try:
+        for name, fileobj in uploads:
+            try:
+                for member_name, stream in _members(name, fileobj):
+                    ingestion.add(member_name, stream)
+            except (zipfile.BadZipFile, tarfile.TarError) as e:
+                raise IngestError(f"{name} is not a readable archive: {e}")
+    finally:
+        # rewritten even when nothing changed: its mtime is the workspace's last use for cleanup
+        ingestion.save()
+    return ingestion.stats
+
+
+def clear_workspace(workspace: str):
+    """Delete a workspace and its manifest."""
+    shutil.rmtree(workspace, ignore_errors=True)
+    try:
+        os.remove(_manifest_path(workspace))
+    except OSError:
+        pass
+
+
+def _workspace_bytes(path):
+    """Bytes a workspace holds: the uploaded files its manifest records, or a walk without one."""
+    manifest = _load_manifest(path)
+    if manifest:
+        return sum(entry[1] for entry in manifest.values())
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(directory, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def cleanup_workspaces(root: str = WORKSPACES_DIR, quota_bytes: int = WORKSPACES_QUOTA_BYTES, keep=()) -> list:
+    """
+    Remove the least recently ingested workspaces under root until the rest fit in quota_bytes.
+    Workspaces in keep (paths), such as those a run is using, are never removed. Files written
+    by the agent rather than uploaded are not counted. Returns the removed paths.
+    """
+    keep = {os.path.abspath(p) for p in keep}
+    workspaces = []
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.is_dir():
+            continue
+        try:
+            used = os.stat(_manifest_path(entry.path)).st_mtime
+        except OSError:
+            used = entry.stat().st_mtime
+        workspaces.append((used, _workspace_bytes(entry.path), os.path.abspath(entry.path)))
+    total = sum(size for _, size, _ in workspaces)
+    removed = []
+    for _, size, path in sorted(workspaces):
+        if total <= quota_bytes:
+            break
+        if path in keep:
+            continue
+        clear_workspace(path)
+        total -= size
+        removed.append(path)
+    return removed
@@ -0,0 +1,199 @@
+# coding_agent/replay.py
+"""
+Offline stand-ins for the genai client, for benchmarks and reproducible runs.
+
+All three expose the only call the agent loop makes, client.aio.models.generate_content_stream:
+
+- RecordingClient wraps a real client and appends every streamed response to a JSON-lines file.
+- ReplayClient serves a recorded file back in order, with no network or API key.
+- ScriptedClient answers from a list of turns (or a function of the request), as a stub model.
+
+The two offline clients also carry StubCaches as client.aio.caches, a local stand-in for the
+context caching endpoint.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from google.genai import errors, types
+
+from .constants import CHARS_PER_TOKEN
+
+
+def request_hash(model, contents) -> str:
+    """Stable digest of a model request, stored with each recording."""
+    payload = [model, [c.model_dump(mode="json", exclude_none=True) for c in contents]]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def to_chunk(chunk) -> types.GenerateContentResponse:
+    """Accept a response object, a dict in the REST/SDK shape, a Part or a plain string."""
+    if isinstance(chunk, types.GenerateContentResponse):
+        return chunk
+    if isinstance(chunk, str):
+        chunk = types.Part(text=chunk)
+    if isinstance(chunk, types.Part):
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=[chunk]))])
+    return types.GenerateContentResponse.model_validate(chunk)
+
+
+async def _stream(chunks, latency):
+    if latency:
+        await asyncio.sleep(latency)
+    for chunk in chunks:
+        yield chunk
+
+
+class StubCaches:
+    """
+    In-memory stand-in for client.aio.caches (create, get, list, update, delete).
+
+    Entries expire after their ttl like server-side ones, and unknown or expired names raise a 404
+    ClientError. Caches estimated below min_tokens are refused with a 400, as the API does for
+    contents too small to cache.
+    """
+
+    def __init__(self, min_tokens: int = 0):
+        self.min_tokens = min_tokens
+        self.entries = {}
+        self.created = 0
+        self.updated = 0
+
+    def _live(self, name):
+        entry = self.entries.get(name)
+        if entry is None or entry[1] <= time.time():
+            self.entries.pop(name, None)
+            raise errors.ClientError(404, {"error": {"code": 404, "message": f"{name} not found",
+                                                     "status": "NOT_FOUND"}})
+        return entry
+
+    def _view(self, name):
+        cached, expires = self._live(name)
+        return cached.model_copy(update={"expire_time": datetime.fromtimestamp(expires, timezone.utc)})
+
+    async def create(self, *, model, config=None):
+        config = types.CreateCachedContentConfig.model_validate(config or {})
+        payload = config.model_dump_json(exclude_none=True, include={"contents", "system_instruction", "tools"})
+        tokens = len(payload) // CHARS_PER_TOKEN
+        if tokens < self.min_tokens:
+            raise errors.ClientError(400, {"error": {"code": 400, "status": "INVALID_ARGUMENT",
+                                                     "message": f"Cached content is too small. total_token_count="
+                                                                f"{tokens}, min_total_token_count={self.min_tokens}"}})
+        self.created += 1
+        name = f"cachedContents/stub-{self.created}"
+        cached = types.CachedContent(name=name, model=model, display_name=config.display_name,
+                                     usage_metadata=types.CachedContentUsageMetadata(total_token_count=tokens))
+        self.entries[name] = (cached, time.time() + _seconds(config.ttl))
+        return self._view(name)
+
+    async def get(self, *, name, config=None):
+        return self._view(name)
+
+    async def list(self, *, config=None):
+        async def pages():
+            for name in list(self.entries):
+                try:
+                    yield self._view(name)
+                except errors.ClientError:
+                    continue
+        return pages()
+
+    async def update(self, *, name, config=None):
+        config = types.UpdateCachedContentConfig.model_validate(config or {})
+        cached, _ = self._live(name)
+        self.updated += 1
+        self.entries[name] = (cached, time.time() + _seconds(config.ttl))
+        return self._view(name)
+
+    async def delete(self, *, name, config=None):
+        self._live(name)
+        del self.entries[name]
+        return types.DeleteCachedContentResponse()
+
+
+def _seconds(ttl) -> float:
+    """"3600s" -> 3600.0; the API's default ttl is one hour."""
+    return float(ttl.rstrip("s")) if ttl else 3600.0
+
+
+class _OfflineClient:
+    def __init__(self):
+        self.aio = SimpleNamespace(models=self, caches=StubCaches())
+        self.calls = 0
+
+
+class ScriptedClient(_OfflineClient):
+    """
+    Stub model. turns is a list with one entry per model call, each a list of chunks (see to_chunk),
+    or a callable(contents) -> chunks for answers that depend on the request. latency is slept
+    before each response to stand in for model time.
+    """
+
+    def __init__(self, turns, latency: float = 0.0):
+        super().__init__()
+        self.turns = turns
+        self.latency = latency
+
+    async def generate_content_stream(self, model, contents, config=None):
+        if callable(self.turns):
+            chunks = self.turns(contents)
+        else:
+            if self.calls >= len(self.turns):
+                raise RuntimeError(f"scripted model has no turn {self.calls + 1}")
+            chunks = self.turns[self.calls]
+        self.calls += 1
+        return _stream([to_chunk(c) for c in chunks], self.latency)
+
+
+class ReplayClient(_OfflineClient):
+    """
+    Serve the responses of a recording in order. Requests are not required to match the recorded
+    ones (tool output such as run times differs between runs); mismatches are counted in .diverged.
+    realtime replays the recorded model latency instead of answering immediately.
+    """
+
+    def __init__(self, path: str, realtime: bool = False):
+        super().__init__()
+        with open(path) as f:
+            self.records = [json.loads(line) for line in f if line.strip()]
+        self.realtime = realtime
+        self.diverged = 0
+
+    async def generate_content_stream(self, model, contents, config=None):
+        if self.calls >= len(self.records):
+            raise RuntimeError(f"recording has only {len(self.records)} responses")
+        record = self.records[self.calls]
+        self.calls += 1
+        if record.get("request") != request_hash(model, contents):
+            self.diverged += 1
+        chunks = [types.GenerateContentResponse.model_validate(c) for c in record["chunks"]]
+        return _stream(chunks, record.get("seconds", 0) if self.realtime else 0)
+
+
+class RecordingClient:
+    """Pass requests to client and append each streamed response to path as one JSON line."""
+
+    def __init__(self, client, path: str):
+        self.client = client
+        self.path = path
+        self.aio = SimpleNamespace(models=self, caches=getattr(client.aio, "caches", None))
+
+    async def generate_content_stream(self, model, contents, config=None):
+        started = time.perf_counter()
+        key = request_hash(model, contents)
+        stream = await self.client.aio.models.generate_content_stream(model=model, contents=contents, config=config)
+
+        async def recorded():
+            chunks = []
+            async for chunk in stream:
+                chunks.append(chunk.model_dump(mode="json", exclude_none=True, exclude={"sdk_http_response"}))
+                yield chunk
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"model": model, "request": key, "seconds": time.perf_counter() - started,
+                                    "chunks": chunks}) + "\n")
+
+        return recorded()
@@ -0,0 +1,136 @@
+# coding_agent/response_cache.py
+"""
+On-disk cache of model responses, for deterministic re-runs.
+
+A request is keyed on a hash of (model, generation config, messages). The messages carry every
+tool result the request depends on, so the key doubles as a fingerprint of the tool outputs: if a
+file read, listing or script output changed, the key changes and the model is asked again.
+Run statistics that vary between identical script runs (wall time, RSS) are left out of the key.
+"""
+import hashlib
+import json
+import os
+import threading
+from types import SimpleNamespace
+
+from google.genai import types
+
+from .constants import CACHE_DIR, RESPONSE_CACHE_MAX_BYTES
+from .functions.run_python_file import RUN_STATS_PATTERN
+from .replay import _stream
+
+
+def request_key(model, config, contents) -> str:
+    config_json = config.model_dump(mode="json", exclude_none=True) if config is not None else None
+    messages = json.dumps([c.model_dump(mode="json", exclude_none=True) for c in contents], sort_keys=True)
+    payload = json.dumps([model, config_json], sort_keys=True) + RUN_STATS_PATTERN.sub("", messages)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Directory of <key>.json files, each holding the chunks of one streamed response.
+    Reads refresh a file's mtime; when the directory grows past max_bytes the least recently
+    used files are removed.
+    """
+
+    def __init__(self, directory: str = os.path.join(CACHE_DIR, "responses"),
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(".json"))
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        """Return the cached chunks for key, or None."""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                chunks = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            chunks = None
+        with self._lock:
+            # an empty response stored by an older version is not worth replaying
+            if chunks:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return chunks or None
+
+    def put(self, key, chunks):
+        path = self._path(key)
+        data = json.dumps(chunks)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                st = entry.stat()
+                entries.append((st.st_mtime_ns, st.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        # evict down to 90% so a full cache does not rescan the directory on every put
+        for _, size, path in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        self._bytes = total
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "bytes": self._bytes}
+
+
+class CachingClient:
+    """
+    Serve model calls of client from a ResponseCache. Hits are replayed without usage metadata,
+    since no tokens were spent; misses stream from the client and are stored once complete, if
+    they hold any content.
+    """
+
+    def __init__(self, client, cache: ResponseCache):
+        self.client = client
+        self.cache = cache
+        self.aio = SimpleNamespace(models=self, caches=getattr(client.aio, "caches", None))
+
+    async def generate_content_stream(self, model, contents, config=None):
+        key = request_key(model, config, contents)
+        chunks = self.cache.get(key)
+        if chunks is not None:
+            return _stream([types.GenerateContentResponse.model_validate(c) for c in chunks], 0)
+        stream = await self.client.aio.models.generate_content_stream(model=model, contents=contents, config=config)
+
+        async def cached():
+            chunks = []
+            answered = False
+            async for chunk in stream:
+                chunks.append(chunk.model_dump(mode="json", exclude_none=True,
+                                               exclude={"sdk_http_response", "usage_metadata"}))
+                answered = answered or bool(chunk.candidates and chunk.candidates[0].content
+                                            and chunk.candidates[0].content.parts)
+                yield chunk
+            # only whole responses with content: an error ends the loop above, and an empty
+            # response replayed would fail every later run instead of asking the model again
+            if answered:
+                self.cache.put(key, chunks)
+
+        return cached()
@@ -0,0 +1,91 @@
+# coding_agent/routing.py
+"""
+Per-iteration choice of model and output-token limit, and per-session budgets.
+
+The engine asks its router before every model call. RoutingPolicy looks at what is pending:
+exploring (listing, reading, searching) gets the light model and a small output cap, writing code
+gets the default model and room for a full file or diff, and a response cut off at its cap is
+retried with twice the room instead of costing a round-trip per fragment. A large history always
+goes to the default model.
+"""
+import re
+import time
+
+from .constants import (LARGE_HISTORY_TOKENS, LIGHT_MODEL_NAME, MODEL_NAME, ROUTE_MAX_OUTPUT_TOKENS,
+                        ROUTE_READ_OUTPUT_TOKENS, ROUTE_WRITE_OUTPUT_TOKENS)
+
+_WRITE_WORDS = re.compile(r"\b(write|create|implement|add|fix|refactor|edit|change|update|rename|remove|delete|"
+                          r"generate|build|make)\b", re.IGNORECASE)
+
+MUTATING_CALLS = {"write_file", "edit_file"}
+
+
+class Route:
+    def __init__(self, model: str, max_output_tokens: int, reason: str):
+        self.model = model
+        self.max_output_tokens = max_output_tokens
+        self.reason = reason
+
+
+class RoutingPolicy:
+    """Pick (model, max_output_tokens) for the next model call."""
+
+    def __init__(self, light_model: str = LIGHT_MODEL_NAME, default_model: str = MODEL_NAME,
+                 read_tokens: int = ROUTE_READ_OUTPUT_TOKENS, write_tokens: int = ROUTE_WRITE_OUTPUT_TOKENS,
+                 max_tokens: int = ROUTE_MAX_OUTPUT_TOKENS, large_history_tokens: int = LARGE_HISTORY_TOKENS):
+        self.light_model = light_model
+        self.default_model = default_model
+        self.read_tokens = read_tokens
+        self.write_tokens = write_tokens
+        self.max_tokens = max_tokens
+        self.large_history_tokens = large_history_tokens
+
+    def route(self, prompt: str, step: int, history_tokens: int, last_calls, last_route: Route | None,
+              truncated: bool) -> Route:
+        """
+        last_calls are the function names the previous response called; truncated says whether
+        that response stopped at its max_output_tokens.
+        """
+        if truncated and last_route is not None:
+            tokens = min(last_route.max_output_tokens * 2, self.max_tokens)
+            return Route(last_route.model, tokens, f"last response hit its {last_route.max_output_tokens}-token cap")
+        writing = bool(_WRITE_WORDS.search(prompt))
+        if MUTATING_CALLS & set(last_calls):
+            return Route(self.default_model, self.write_tokens, "editing files")
+        if history_tokens >= self.large_history_tokens:
+            tokens = self.write_tokens if writing else self.read_tokens
+            return Route(self.default_model, tokens, f"large history (~{history_tokens} tokens)")
+        if writing and step > 0 and last_calls:
+            # the files have been looked at; the next answer is likely the code itself
+            return Route(self.default_model, self.write_tokens, "task writes code")
+        if writing:
+            return Route(self.light_model, self.read_tokens, "exploring before writing")
+        return Route(self.light_model, self.read_tokens, "read-only task")
+
+
+class SessionBudget:
+    """Token and wall-clock limits for one session (None means unlimited)."""
+
+    def __init__(self, max_tokens: int | None = None, max_seconds: float | None = None):
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.tokens = 0
+        self.started = time.monotonic()
+
+    def spend(self, prompt_tokens, response_tokens):
+        self.tokens += (prompt_tokens or 0) + (response_tokens or 0)
+
+    def seconds_left(self) -> float | None:
+        """Wall-clock time left, or None without a time limit."""
+        if self.max_seconds is None:
+            return None
+        return self.max_seconds - (time.monotonic() - self.started)
+
+    def exceeded(self) -> str | None:
+        """Why the session must stop, or None."""
+        if self.max_tokens is not None and self.tokens >= self.max_tokens:
+            return f"token budget of {self.max_tokens} spent ({self.tokens} tokens used)"
+        elapsed = time.monotonic() - self.started
+        if self.max_seconds is not None and elapsed >= self.max_seconds:
+            return f"time budget of {self.max_seconds:g}s used ({elapsed:.1f}s elapsed)"
+        return None
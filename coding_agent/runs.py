@@ -0,0 +1,136 @@
+# coding_agent/runs.py
+"""
+Agent sessions running in the background, for front ends that must not block (the Streamlit app).
+
+RunManager owns one event loop on a daemon thread and every submitted session is a task on it,
+so runs of many users proceed at once as in the server, at most max_runs of them at a time. A Run
+turns events into log lines as they arrive; a reader asks new_lines(cursor) for the lines it has
+not shown yet instead of re-reading the whole log, and cancel() stops the session at its next await.
+"""
+import asyncio
+import itertools
+import threading
+import time
+
+from .constants import RUN_RETENTION_SECONDS
+
+
+def format_event(event, verbose: bool = False) -> str | None:
+    """One log line for an engine event, or None for events not worth a line."""
+    kind = event["type"]
+    if kind == "usage" and verbose:
+        return (f"[iter {event['iteration']}] prompt_tokens={event['prompt_tokens']} "
+                f"resp_tokens={event['response_tokens']}")
+    if kind == "function_call":
+        return f"Calling {event['name']}({event['args']})"
+    if kind == "function_response":
+        return f"Function call: {event['name']} -> {event['response']}"
+    if kind == "final" and event["text"]:
+        return "Assistant: " + event["text"]
+    if kind in ("error", "budget", "max_iters"):
+        return event["message"]
+    return None
+
+
+class Run:
+    """
+    One background session. status is "queued", "running", "cancelled" or the engine's final
+    status ("ok", "max_iters", "budget_exceeded", "error"); partial is the text of the response streaming now.
+    """
+
+    def __init__(self, run_id: int, prompt: str, work_dir_path: str, verbose: bool = False,
+                 resume: str | None = None):
+        self.id = run_id
+        self.prompt = prompt
+        self.work_dir_path = work_dir_path
+        self.verbose = verbose
+        self.resume = resume
+        self.status = "queued"
+        self.lines = []
+        self.partial = ""
+        self.result = None
+        self.submitted = time.time()
+        self.finished = None
+        self._future = None
+
+    @property
+    def done(self) -> bool:
+        return self.finished is not None
+
+    def new_lines(self, cursor: int):
+        """(lines after cursor, new cursor); the log only ever grows, so this is cheap to poll."""
+        end = len(self.lines)
+        return self.lines[cursor:end], end
+
+    def on_event(self, event):
+        if event["type"] == "text":
+            self.partial += event["text"]
+            return
+        if event["type"] in ("function_call", "iteration"):
+            self.partial = ""
+        line = format_event(event, self.verbose)
+        if line is not None:
+            self.lines.append(line)
+
+    def cancel(self):
+        if self._future is not None:
+            self._future.cancel()
+
+    def _settle(self, future):
+        if future.cancelled():
+            self.status = "cancelled"
+            self.lines.append("Cancelled.")
+        self.finished = time.time()
+
+
+class RunManager:
+    """Runs sessions on a background event loop; share one per process."""
+
+    def __init__(self, max_runs: int = 8):
+        self.max_runs = max_runs
+        self.runs = {}
+        self._ids = itertools.count(1)
+        self._slots = None
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="agent-runs", daemon=True).start()
+
+    def submit(self, engine, prompt: str, work_dir_path: str, verbose: bool = False,
+               resume: str | None = None) -> Run:
+        """
+        Start engine.run_async(prompt) in the background and return its Run right away; resume
+        names a saved session to continue.
+        """
+        self._prune()
+        run = Run(next(self._ids), prompt, work_dir_path, verbose, resume)
+        self.runs[run.id] = run
+        run._future = asyncio.run_coroutine_threadsafe(self._run(run, engine), self._loop)
+        run._future.add_done_callback(run._settle)
+        return run
+
+    def get(self, run_id) -> Run | None:
+        return self.runs.get(run_id)
+
+    def active_work_dirs(self) -> list:
+        """Work dirs of the runs not finished yet, which must not be deleted under them."""
+        return [run.work_dir_path for run in list(self.runs.values()) if not run.done]
+
+    async def _run(self, run, engine):
+        if self._slots is None:
+            # created on the loop's own thread
+            self._slots = asyncio.Semaphore(self.max_runs)
+        async with self._slots:
+            run.status = "running"
+            try:
+                run.result = await engine.run_async(run.prompt, run.work_dir_path, on_event=run.on_event,
+                                                    resume=run.resume)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                run.result = {"status": "error", "message": str(e), "conversation": []}
+                run.lines.append(f"Error: {e}")
+            run.status = run.result["status"]
+
+    def _prune(self):
+        cutoff = time.time() - RUN_RETENTION_SECONDS
+        for run_id in [i for i, r in self.runs.items() if r.done and r.finished < cutoff]:
+            del self.runs[run_id]
@@ -0,0 +1,131 @@
+# coding_agent/server.py
+"""
+Long-running local agent server.
+
+One process holds a single genai client (one pooled HTTP connection set, one load_dotenv) and
+serves many concurrent sessions over a local TCP socket. The protocol is JSON lines: a client
+sends one request line
+
+    {"prompt": "...", "work_dir": "project", "max_iters": 10, "verbose": false, "tool_cache": true}
+
+and receives every run_async event as a JSON line tagged with its session id, ending with a
+{"type": "result", "status": ..., "text": ..., "message": ...} line, after which the connection
+is closed. status is "ok" only for a finished task; "max_iters" means the session hit its
+iteration cap without a final answer.
+"""
+import asyncio
+import itertools
+import json
+import os
+
+from .cli import run_async
+from .engine import make_client
+from .context_cache import ContextCache
+from .functions.cache import ToolCache
+from .functions.warm_pool import WarmPool
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+def _resolve_work_dir(root: str, work_dir: str | None) -> str:
+    """Resolve a session's work dir against the server root, refusing anything outside of it."""
+    absolute_root = os.path.abspath(root)
+    absolute_work_dir = os.path.abspath(os.path.join(absolute_root, work_dir or "."))
+    if os.path.commonpath([absolute_root, absolute_work_dir]) != absolute_root:
+        raise ValueError(f"The work dir {absolute_work_dir} is outside the server root {absolute_root}.")
+    if not os.path.isdir(absolute_work_dir):
+        raise ValueError(f"The work dir {absolute_work_dir} is not a directory.")
+    return absolute_work_dir
+
+
+class AgentServer:
+    """Serve agent sessions that share one client and one event loop."""
+
+    def __init__(self, client, root: str, max_iters: int = 20, max_sessions: int = 64,
+                 python_pool: WarmPool | None = None, context_cache: ContextCache | None = None):
+        self.client = client
+        self.python_pool = python_pool
+        self.root = root
+        self.max_iters = max_iters
+        self._sessions = asyncio.Semaphore(max_sessions)
+        self._ids = itertools.count(1)
+        # one cache for all sessions, so a file read by one session is served to the next
+        self.tool_cache = ToolCache()
+        self.context_cache = context_cache
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = next(self._ids)
+
+        def send(event):
+            writer.write((json.dumps({"session": session, **event}, default=str) + "\n").encode())
+
+        try:
+            request = json.loads(await reader.readline())
+            work_dir = _resolve_work_dir(self.root, request.get("work_dir"))
+            max_iters = min(int(request.get("max_iters", self.max_iters)), self.max_iters)
+            async with self._sessions:
+                result = await run_async(
+                    request["prompt"],
+                    verbose=bool(request.get("verbose", False)),
+                    work_dir_path=work_dir,
+                    client=self.client,
+                    max_iters=max_iters,
+                    on_event=send,
+                    tool_cache=self.tool_cache if request.get("tool_cache", True) else None,
+                    python_pool=self.python_pool,
+                    context_cache=self.context_cache,
+                )
+            send({"type": "result", "status": result["status"], "text": result.get("text", ""),
+                  "message": result.get("message")})
+        except Exception as e:
+            send({"type": "result", "status": "error", "message": str(e)})
+        finally:
+            try:
+                await writer.drain()
+            finally:
+                writer.close()
+
+    async def serve_forever(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle, host, port, limit=2 ** 24)
+        print(f"coding-agent serving on {host}:{port} (root {os.path.abspath(self.root)})", flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+async def request_session(prompt: str, work_dir: str | None = None, host: str = DEFAULT_HOST,
+                          port: int = DEFAULT_PORT, max_iters: int | None = None, on_event=None):
+    """Run one session against a running server and return its final result line."""
+    reader, writer = await asyncio.open_connection(host, port, limit=2 ** 24)
+    request = {"prompt": prompt, "work_dir": work_dir}
+    if max_iters is not None:
+        request["max_iters"] = max_iters
+    writer.write((json.dumps(request) + "\n").encode())
+    await writer.drain()
+    result = None
+    async for line in reader:
+        event = json.loads(line)
+        if on_event:
+            on_event(event)
+        if event["type"] == "result":
+            result = event
+    writer.close()
+    await writer.wait_closed()
+    return result
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, root: str | None = None, max_iters: int = 20,
+          max_sessions: int = 64, base_url: str | None = None, warm_pool: int = 0, preimport=(),
+          context_cache: bool = False):
+    """Start the server with one shared client; blocks until interrupted."""
+    python_pool = WarmPool(warm_pool, preimport) if warm_pool else None
+    server = AgentServer(make_client(base_url), root or os.getcwd(), max_iters=max_iters,
+                         max_sessions=max_sessions, python_pool=python_pool,
+                         context_cache=ContextCache() if context_cache else None)
+    try:
+        asyncio.run(server.serve_forever(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if python_pool is not None:
+            python_pool.close()
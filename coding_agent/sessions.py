@@ -0,0 +1,164 @@
+# coding_agent/sessions.py
+"""
+Sessions saved as an append-only log, so they can be resumed after the process is gone.
+
+The log of a session is one JSON line per Content of its history, appended after every
+iteration, so a crash loses at most the iteration in flight. Tool results, function call
+arguments and texts of SESSION_BLOB_MIN_BYTES or more are not written inline: they are stored
+once, zlib-compressed, under their sha256 in a blob store shared by all sessions (the same file
+read three times in a session costs one blob). Lines hold the original Contents, not the
+compacted history the engine sends, and resuming a session loads them back as they were: no
+tool call is run again.
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+import zlib
+
+from google.genai.types import Content
+
+from .constants import SESSION_BLOB_MIN_BYTES, SESSIONS_DIR
+
+BLOB_KEY = "$blob"
+# values of a part that can be large, as (field, key) in its model_dump; key None is the field itself
+_LARGE_VALUES = (("function_response", "response"), ("function_call", "args"), ("text", None))
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":"), sort_keys=True)
+
+
+class SessionLog:
+    """The saved history of one session; see the module docstring."""
+
+    def __init__(self, work_dir_path: str, session_id: str | None = None, root: str = SESSIONS_DIR,
+                 blob_min_bytes: int = SESSION_BLOB_MIN_BYTES):
+        self.work_dir_path = os.path.abspath(work_dir_path)
+        self.id = session_id or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        self.root = root
+        self.blob_min_bytes = blob_min_bytes
+        # the history read by load()
+        self.messages = []
+        # how many Contents of the session are in the log
+        self.saved = 0
+
+    @classmethod
+    def load(cls, session_id: str, root: str = SESSIONS_DIR) -> "SessionLog":
+        """
+        Read a session back (FileNotFoundError if there is no such session). What a crash left
+        behind past the last whole turn (a cut-off line, model calls without their results) is
+        cut from the file too, so the lines the resumed session appends are read back as well.
+        """
+        path = os.path.join(root, f"{session_id}.jsonl")
+        with open(path, "rb") as f:
+            data = f.read()
+        offset = data.index(b"\n") + 1
+        header = json.loads(data[:offset])
+        log = cls(header["work_dir"], session_id, root)
+        ends = [offset]
+        while offset < len(data):
+            newline = data.find(b"\n", offset)
+            if newline == -1:
+                break
+            try:
+                record = json.loads(data[offset:newline])
+            except ValueError:
+                break
+            log.messages.append(Content.model_validate(log._unpack_content(record)))
+            offset = newline + 1
+            ends.append(offset)
+        last = log.messages[-1] if log.messages else None
+        if last is not None and last.role == "model" and any(p.function_call for p in last.parts or []):
+            log.messages.pop()
+            ends.pop()
+        if ends[-1] < len(data):
+            with open(path, "r+b") as f:
+                f.truncate(ends[-1])
+        log.saved = len(log.messages)
+        return log
+
+    @property
+    def prompt(self) -> str:
+        """Text of the first user message (the task the session was started with)."""
+        for content in self.messages:
+            if content.role == "user":
+                return "".join(p.text or "" for p in content.parts or [])
+        return ""
+
+    def conversation(self) -> list:
+        """The loaded history as the flat dicts of a run result's "conversation"."""
+        conversation = []
+        calls = []
+        for content in self.messages:
+            parts = content.parts or []
+            if content.role == "user":
+                conversation.append({"role": "user", "text": "".join(p.text or "" for p in parts)})
+            elif content.role == "model":
+                calls = [p.function_call for p in parts if p.function_call]
+                text = "".join(p.text for p in parts if p.text and not p.thought).strip()
+                if text and not calls:
+                    conversation.append({"role": "assistant", "text": text})
+            elif content.role == "tool":
+                responses = [p.function_response for p in parts if p.function_response]
+                for call, response in zip(calls, responses):
+                    conversation.append({"role": "tool", "name": call.name, "args": call.args,
+                                         "result": response.response})
+        return conversation
+
+    def _log_path(self):
+        return os.path.join(self.root, f"{self.id}.jsonl")
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.root, "blobs", sha256[:2], sha256)
+
+    def _pack(self, value):
+        data = _dumps(value).encode()
+        if len(data) < self.blob_min_bytes:
+            return value
+        sha256 = hashlib.sha256(data).hexdigest()
+        blob = self._blob_path(sha256)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp = f"{blob}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(zlib.compress(data))
+            os.replace(tmp, blob)
+        return {BLOB_KEY: sha256}
+
+    def _unpack(self, value):
+        if isinstance(value, dict) and list(value) == [BLOB_KEY]:
+            with open(self._blob_path(value[BLOB_KEY]), "rb") as f:
+                return json.loads(zlib.decompress(f.read()))
+        return value
+
+    def _map_content(self, record, convert):
+        for part in record.get("parts", []):
+            for field, key in _LARGE_VALUES:
+                if key is None and field in part:
+                    part[field] = convert(part[field])
+                elif key is not None and key in part.get(field, {}):
+                    part[field][key] = convert(part[field][key])
+        return record
+
+    def _unpack_content(self, record):
+        return self._map_content(record, self._unpack)
+
+    def save(self, messages):
+        """
+        Append the Contents of messages past the ones already saved. Earlier entries of messages
+        may have been compacted since; the list only has to keep growing.
+        """
+        new = messages[self.saved:]
+        if not new:
+            return
+        path = self._log_path()
+        lines = [] if os.path.exists(path) else [
+            _dumps({"session": self.id, "work_dir": self.work_dir_path, "started": time.time()})]
+        for content in new:
+            lines.append(_dumps(self._map_content(content.model_dump(mode="json", exclude_none=True), self._pack)))
+        os.makedirs(self.root, exist_ok=True)
+        with open(path, "a") as f:
+            f.write("\n".join(lines) + "\n")
+        self.saved = len(messages)
@@ -0,0 +1,155 @@
+# coding_agent/tracing.py
+"""
+Lightweight span tracing for the agent loop.
+
+run_async opens a session span, one span per iteration, a generate_content span per model call
+and call_function opens a tool span per dispatch. Finished spans go to exporters as dicts using
+OpenTelemetry span field names (traceId, spanId, parentSpanId, startTimeUnixNano, ...), e.g. to a
+JSON-lines file, and profile_summary() renders a flame-style tree of where the time went.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+_current = contextvars.ContextVar("coding_agent_span", default=None)
+
+
+class Span:
+    recording = True
+
+    def __init__(self, tracer, name, parent, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent = parent
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter_ns()
+        self.duration_ns = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self):
+        if self.duration_ns is None:
+            self.duration_ns = time.perf_counter_ns() - self._start
+            self.tracer._finish(self)
+
+    def to_dict(self):
+        return {
+            "traceId": self.tracer.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "path": self.path(),
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.start_ns + self.duration_ns,
+            "durationMs": self.duration_ns / 1e6,
+            "attributes": self.attributes,
+        }
+
+    def path(self):
+        return (self.parent.path() + "/" if self.parent else "") + self.name
+
+
+class _NoopSpan:
+    recording = False
+
+    def set(self, **attributes):
+        pass
+
+    def end(self):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Tracer:
+    """Collects finished spans and hands each one to the exporters."""
+
+    def __init__(self, exporters=()):
+        self.trace_id = os.urandom(16).hex()
+        self.exporters = list(exporters)
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def start(self, name, parent=None, **attributes):
+        """Start a span without making it current (for spans that overlap their siblings)."""
+        return Span(self, name, parent or _current.get(), attributes)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        span = self.start(name, **attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=repr(e))
+            raise
+        finally:
+            _current.reset(token)
+            span.end()
+
+    def _finish(self, span):
+        record = span.to_dict()
+        with self._lock:
+            self.spans.append(record)
+            for exporter in self.exporters:
+                exporter(record)
+
+
+def span(name, **attributes):
+    """Child span of the current one, in the tracer that owns it; a no-op when nothing is being traced."""
+    parent = _current.get()
+    if parent is None:
+        return nullcontext(_NOOP)
+    return parent.tracer.span(name, **attributes)
+
+
+def start(name, **attributes):
+    """Child span of the current one that is not made current; end() it explicitly."""
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    return parent.tracer.start(name, parent, **attributes)
+
+
+def current_span():
+    return _current.get() or _NOOP
+
+
+class JsonlExporter:
+    """Append one JSON line per finished span."""
+
+    def __init__(self, path):
+        self._file = open(path, "a")
+
+    def __call__(self, record):
+        self._file.write(json.dumps(record, default=str) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def profile_summary(spans, width=30):
+    """Flame-style text tree: total time, call count and share of the root per span path."""
+    totals = {}
+    for record in spans:
+        entry = totals.setdefault(record["path"], [0.0, 0])
+        entry[0] += record["durationMs"]
+        entry[1] += 1
+    roots = [path for path in totals if "/" not in path]
+    root_ms = sum(totals[path][0] for path in roots) or 1.0
+    lines = []
+    for path in sorted(totals):
+        total_ms, count = totals[path]
+        depth = path.count("/")
+        label = "  " * depth + path.rsplit("/", 1)[-1] + (f" x{count}" if count > 1 else "")
+        share = total_ms / root_ms
+        lines.append(f"{label:<40}{total_ms / 1000:>9.3f}s {share * 100:>6.1f}% {'#' * round(share * width)}")
+    return "\n".join(lines)
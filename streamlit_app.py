@@ -1,90 +1,30 @@
 # streamlit_app.py
 import os
-import sys
-import tempfile
-import shutil
+import time
+import uuid
 import traceback
+from collections import deque
 from pathlib import Path
 from dotenv import load_dotenv
 import streamlit as st
 from google import genai
-from google.genai.types import Content, Part
-from coding_agent.config import gemini_config
-from coding_agent.functions.call_function import call_function
+from coding_agent.engine import AgentEngine
+from coding_agent.constants import MODEL_NAME
+from coding_agent.ingest import IngestError, cleanup_workspaces, clear_workspace, ingest, workspace_path
+from coding_agent.runs import RunManager
+from coding_agent.sessions import SessionLog
 
-# ---------- helpers ----------
-def _extract_text(response) -> str:
-    """Return best-effort plain text from a response."""
-    if getattr(response, "text", None):
-        return response.text
-    pieces = []
-    for cand in (response.candidates or []):
-        if not cand or not cand.content:
-            continue
-        for part in (cand.content.parts or []):
-            if getattr(part, "text", None):
-                pieces.append(part.text)
-    return "\n".join(pieces).strip()
+# log lines kept on screen while a run streams; older ones stay in the run's full log
+LOG_TAIL_LINES = 200
 
+# ---------- helpers ----------
 def make_client(api_key: str):
     return genai.Client(api_key=api_key)
 
-def run_agent_loop(prompt: str, work_dir_path: str, client, max_iters: int = 20, verbose: bool = False, log_fn=print):
-    """Run the agent loop and return final result + conversation as list of dicts."""
-    messages = [Content(parts=[Part(text=prompt)], role="user")]
-    conversation = [{"role": "user", "text": prompt}]
-
-    for step in range(max_iters):
-        if verbose:
-            log_fn(f"[iter {step}] sending request...")
-
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-001",
-            contents=messages,
-            config=gemini_config,
-        )
-
-        if response is None:
-            log_fn("Response is None")
-            return {"status": "error", "message": "Response is None", "conversation": conversation}
-
-        if verbose and getattr(response, "usage_metadata", None):
-            log_fn(f"[iter {step}] prompt_tokens={response.usage_metadata.prompt_token_count} "
-                   f"resp_tokens={response.usage_metadata.candidates_token_count}")
-
-        # keep model candidates in history
-        if response.candidates:
-            for cand in response.candidates:
-                if cand and cand.content:
-                    messages.append(cand.content)
-
-        # if function calls
-        if response.function_calls:
-            tool_parts = []
-            for fc in response.function_calls:
-                # call user tool and append tool parts (call_function should return a Part-like object)
-                part = call_function(fc.name, fc.args, work_dir_path, verbose)
-                tool_parts.append(part)
-                # log function call and returned part (if present)
-                try:
-                    fr = part.function_response.response
-                except Exception:
-                    fr = getattr(part, "text", str(part))
-                conversation.append({"role": "tool", "name": fc.name, "args": fc.args, "result": fr})
-                log_fn(f"Function call: {fc.name} -> {fr}")
-
-            messages.append(Content(role="tool", parts=tool_parts))
-            # continue loop to let the model consume tool outputs
-            continue
-
-        # no function calls -> final text
-        final_text = _extract_text(response)
-        if final_text:
-            conversation.append({"role": "assistant", "text": final_text})
-            log_fn("Assistant: " + final_text)
-            return {"status": "ok", "text": final_text, "conversation": conversation}
-
-    return {"status": "ok", "text": "", "conversation": conversation}
+@st.cache_resource
+def get_run_manager():
+    """One background loop for every user of this Streamlit server, surviving reruns."""
+    return RunManager()
 
 # ---------- Streamlit UI ----------
 st.set_page_config(page_title="Coding Agent", layout="wide")
@@ -97,9 +37,13 @@ with st.sidebar:
     st.header("Settings")
     load_dotenv()  # load .env if present
     GEMINI_API_KEY = st.text_input("GEMINI_API_KEY (or set in .env)", value=os.getenv("GEMINI_API_KEY", ""), type="password")
-    model = st.selectbox("Model", ["gemini-2.0-flash-001"], index=0)
+    model = st.selectbox("Model", [MODEL_NAME], index=0)
     max_iters = st.number_input("Max iterations", min_value=1, max_value=100, value=20, step=1)
     verbose = st.checkbox("Verbose logs", value=False)
+    # sessions are saved after every iteration; the URL remembers the last one across reloads and restarts
+    continue_session = "session" in st.query_params and st.checkbox(
+        f"Continue session {st.query_params['session']}", value=True,
+        help="Send the prompt to the saved session instead of starting a new one (no tool call is run again)")
     st.markdown("---")
     st.write("Work dir selection (choose one)")
     # Base server folder to expose for browsing - configurable via env var
@@ -113,6 +57,11 @@ run_button = st.button("Run Prompt")
 # Conversation and state
 if "conversation" not in st.session_state:
     st.session_state.conversation = []
+    if "session" in st.query_params:
+        try:
+            st.session_state.conversation = SessionLog.load(st.query_params["session"]).conversation()
+        except FileNotFoundError:
+            del st.query_params["session"]
 if "uploaded_tmp_dir" not in st.session_state:
     st.session_state.uploaded_tmp_dir = None
 
@@ -125,30 +74,32 @@ method = st.radio("Select method", ("Upload files/folder (recommended)", "Browse
 selected_work_dir = None
 
 if method == "Upload files/folder (recommended)":
-    st.write("Upload files (multiple). Uploaded files will be saved into a temporary work directory and used for the run.")
+    st.write("Upload files or zip/tar archives of a project. Archives are extracted with their folders into "
+             "your workspace, which is kept between runs; uploading a new version only rewrites changed files.")
     uploaded = st.file_uploader("Upload files", accept_multiple_files=True)
-    if st.button("Save uploaded files to temp workdir"):
+    # the workspace follows the user through reloads via the URL
+    if "ws" not in st.query_params:
+        st.query_params["ws"] = uuid.uuid4().hex
+    workspace = workspace_path(st.query_params["ws"])
+    if st.button("Add uploads to workspace"):
         if not uploaded:
             st.warning("No files selected to upload.")
         else:
-            # create temp dir and save uploads
-            tmpdir = Path(tempfile.mkdtemp(prefix="sca_agent_"))
-            for f in uploaded:
-                # preserve subfolders if file.name contains path separators (rare), otherwise flat
-                target = tmpdir / Path(f.name).name
-                with open(target, "wb") as out:
-                    out.write(f.getbuffer())
-            st.success(f"Saved {len(uploaded)} file(s) to temporary workdir: `{tmpdir}`")
-            st.session_state.uploaded_tmp_dir = str(tmpdir)
-            selected_work_dir = str(tmpdir)
+            try:
+                stats = ingest(((f.name, f) for f in uploaded), workspace)
+                st.success(f"Workspace `{workspace}`: {stats['written']} file(s) written, "
+                           f"{stats['unchanged']} unchanged, {stats['skipped']} skipped "
+                           f"({stats['bytes_written']} bytes written)")
+            except IngestError as e:
+                st.error(str(e))
+            cleanup_workspaces(keep=[workspace, *get_run_manager().active_work_dirs()])
+            st.session_state.uploaded_tmp_dir = workspace
+            selected_work_dir = workspace
 
     if st.session_state.uploaded_tmp_dir:
-        st.info(f"Current temporary workdir: `{st.session_state.uploaded_tmp_dir}`")
-        if st.button("Clear temporary uploaded workdir"):
-            try:
-                shutil.rmtree(st.session_state.uploaded_tmp_dir)
-            except Exception as ex:
-                st.warning(f"Could not remove temp dir: {ex}")
+        st.info(f"Current workspace: `{st.session_state.uploaded_tmp_dir}`")
+        if st.button("Clear workspace"):
+            clear_workspace(st.session_state.uploaded_tmp_dir)
             st.session_state.uploaded_tmp_dir = None
 
 elif method == "Browse server directories":
@@ -189,15 +140,8 @@ else:
     else:
         st.code("None selected (will default to current working directory)")
 
-# logs area
-log_placeholder = st.empty()
-log_lines = []
-
-def log_fn(msg):
-    log_lines.append(str(msg))
-    log_placeholder.code("\n".join(log_lines), language="text")
-
-# Run
+# Run: the session goes to the background run manager, so this script (and every other user's)
+# keeps serving reruns while it streams
 if run_button:
     if not GEMINI_API_KEY:
         st.error("GEMINI_API_KEY is required. Set it in the sidebar or in your .env file as GEMINI_API_KEY.")
@@ -223,24 +167,59 @@ if run_button:
             client = None
 
         if client:
-            # Clear logs
-            log_lines.clear()
-            log_placeholder.empty()
-            with st.spinner("Running agent..."):
-                result = run_agent_loop(prompt, work_dir_to_use, client, max_iters=max_iters, verbose=verbose, log_fn=log_fn)
-
-            # Append conversation to session state
-            if result.get("conversation"):
-                st.session_state.conversation.extend(result["conversation"])
+            previous = get_run_manager().get(st.session_state.get("run_id"))
+            if previous is not None and not previous.done:
+                previous.cancel()
+            engine = AgentEngine(client, model=model, max_iters=max_iters, save_session=True)
+            resume = st.query_params["session"] if continue_session else None
+            run = get_run_manager().submit(engine, prompt, work_dir_to_use, verbose=verbose, resume=resume)
+            st.session_state.run_id = run.id
+            st.session_state.log_cursor = 0
+            st.session_state.log_tail = deque(maxlen=LOG_TAIL_LINES)
+
+
+@st.fragment(run_every=1.0)
+def show_run():
+    """Poll the current run: append its new log lines, show the streaming text, offer cancel."""
+    run = get_run_manager().get(st.session_state.get("run_id"))
+    if run is None:
+        return
+    new, st.session_state.log_cursor = run.new_lines(st.session_state.log_cursor)
+    st.session_state.log_tail.extend(new)
+    if not run.done:
+        st.info(f"Run {run.id} is {run.status} ({time.time() - run.submitted:.0f}s)")
+        if st.button("Cancel run"):
+            run.cancel()
+    if st.session_state.log_tail:
+        st.code("\n".join(st.session_state.log_tail), language="text")
+    if not run.done:
+        if run.partial:
+            st.markdown(run.partial)
+        return
+
+    if st.session_state.get("recorded_run") != run.id:
+        # first poll after the run ended: record it and refresh the whole page for the history
+        st.session_state.recorded_run = run.id
+        if run.result and run.result.get("conversation"):
+            st.session_state.conversation.extend(run.result["conversation"])
+        if run.result and run.result.get("session"):
+            st.query_params["session"] = run.result["session"]
+        st.rerun()
+    if run.status == "ok":
+        st.success("Finished")
+        st.subheader("Assistant Output")
+        st.write(run.result.get("text", ""))
+    elif run.status == "cancelled":
+        st.warning("Cancelled")
+    elif run.status in ("max_iters", "budget_exceeded"):
+        st.warning("Stopped: " + run.result.get("message", ""))
+        if run.result.get("text"):
+            st.write(run.result["text"])
+    else:
+        st.error("Error: " + (run.result or {}).get("message", "unknown error"))
 
-            # Show result panels
-            if result.get("status") == "ok":
-                st.success("Finished")
-                st.subheader("Assistant Output")
-                st.write(result.get("text", ""))
 
-            else:
-                st.error("Error: " + result.get("message", "unknown error"))
+show_run()
 
 # Show conversation history with expandable items
 st.subheader("Conversation History")
@@ -266,5 +245,7 @@ else:
 st.markdown("---")
 if st.button("Clear conversation"):
     st.session_state.conversation = []
-    log_placeholder.empty()
-    st.experimental_rerun()
+    st.session_state.run_id = None
+    if "session" in st.query_params:
+        del st.query_params["session"]
+    st.rerun()
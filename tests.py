@@ -1,7 +1,395 @@
-from functions.get_files_info import get_files_info
-from functions.get_file_content import get_file_content
-from functions.write_file import write_file
-from functions.run_python_file import run_python_file
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from google import genai
+from google.genai import types
+from coding_agent.batch import RateLimiter, ThrottledClient, run_batch
+from coding_agent.changeset import ChangeSet
+from coding_agent.cli import run_async
+from coding_agent.constants import MODEL_NAME
+from coding_agent.context_cache import ContextCache
+from coding_agent.engine import AgentEngine
+from coding_agent.functions.get_files_info import get_files_info
+from coding_agent.functions.get_file_content import get_file_content
+from coding_agent.functions.write_file import write_file
+from coding_agent.functions.run_python_file import run_python_file
+from coding_agent.functions.cache import ToolCache
+from coding_agent.functions.call_function import call_function
+from coding_agent.functions.edit_file import edit_file
+from coding_agent.functions.search_code import search_code
+from coding_agent.functions.warm_pool import WarmPool
+from coding_agent.history import HistoryManager
+from coding_agent.replay import ScriptedClient, StubCaches
+from coding_agent.response_cache import CachingClient, ResponseCache
+from coding_agent.routing import Route, RoutingPolicy
+from coding_agent.sessions import SessionLog
+
+def check_edit_crlf():
+    # search blocks come with "\n" line breaks; they must match and keep a Windows-style file's "\r\n"
+    working_directory = tempfile.mkdtemp()
+    path = os.path.join(working_directory, "win.py")
+    with open(path, "w", newline="") as f:
+        f.write("def f():\r\n    a = 1\r\n    return a\r\n")
+    result = edit_file(working_directory, "win.py", edits=[{"search": "    a = 1\n    return a\n",
+                                                           "replace": "    a = 2\n    b = 3\n    return a + b\n"}])
+    assert result.startswith("Edited"), result
+    with open(path, newline="") as f:
+        assert f.read() == "def f():\r\n    a = 2\r\n    b = 3\r\n    return a + b\r\n"
+    print("Multi-line edit of a CRLF file: ok")
+
+
+def check_edit_ignores_locale():
+    # edits read and write UTF-8 whatever the locale's encoding is
+    working_directory = tempfile.mkdtemp()
+    with open(os.path.join(working_directory, "u.py"), "w", encoding="utf-8") as f:
+        f.write('s = "h\u00e9llo"\n')
+    code = ("import sys; from coding_agent.functions.edit_file import edit_file; "
+            "print(ascii(edit_file(sys.argv[1], 'u.py', edits=[{'search': 'h\\xe9llo', 'replace': 'w\\xf6rld'}])))")
+    env = dict(os.environ, LC_ALL="C", LANG="C", PYTHONCOERCECLOCALE="0", PYTHONUTF8="0")
+    out = subprocess.run([sys.executable, "-c", code, working_directory], env=env, capture_output=True, text=True)
+    assert "Edited u.py" in out.stdout, out.stdout + out.stderr
+    with open(os.path.join(working_directory, "u.py"), encoding="utf-8") as f:
+        assert f.read() == 's = "w\u00f6rld"\n'
+    print("Edit of a UTF-8 file under the C locale: ok")
+
+
+def check_long_line_paging():
+    # a line longer than a page must page forward by offset, not ask for the same start_line again
+    working_directory = tempfile.mkdtemp()
+    with open(os.path.join(working_directory, "long.txt"), "w") as f:
+        f.write("x" * 25000 + "\nend\n")
+    page = get_file_content(working_directory, "long.txt", start_line=1)
+    assert page.endswith("call again with offset=10000 and no start_line to continue..."), page[-120:]
+    page = get_file_content(working_directory, "long.txt", offset=20000)
+    assert page.endswith("x\nend\n"), page[-120:]
+    assert get_file_content(working_directory, "long.txt", start_line=2, end_line=1).startswith("Error:")
+    print("Paging through a line longer than a page: ok")
+
+
+def check_tool_cache_listings():
+    # a listing must not be served stale after changes below its directory or to its .gitignore
+    working_directory = tempfile.mkdtemp()
+    os.makedirs(os.path.join(working_directory, "pkg", "sub"))
+    cache = ToolCache()
+    listing = lambda **args: call_function("get_files_info", args, working_directory, cache=cache) \
+        .function_response.response["Result"]
+    with open(os.path.join(working_directory, ".gitignore"), "w") as f:
+        f.write("*.log\n")
+    listing(max_depth=3)
+    with open(os.path.join(working_directory, "pkg", "sub", "new.py"), "w") as f:
+        f.write("x = 1\n")
+    assert "new.py" in listing(max_depth=3)
+    assert "new.py" not in listing()
+    assert "pkg" in listing()
+    # rewriting .gitignore in place leaves the directory's mtime as it is
+    with open(os.path.join(working_directory, ".gitignore"), "a") as f:
+        f.write("pkg/\n")
+    assert "pkg" not in listing(), listing()
+    print("Tool cache keeps listings fresh: ok")
+
+
+def check_history_compaction():
+    # six reads of 5000 characters each, the first file read twice, squeezed into 4000 tokens
+    def read(path):
+        call = types.Part(function_call=types.FunctionCall(name="get_file_content", args={"file_path": path}))
+        response = types.Part(function_response=types.FunctionResponse(
+            name="get_file_content", response={"Result": path * (5000 // len(path))}))
+        return [types.Content(role="model", parts=[types.Part(text=f"reading {path}"), call]),
+                types.Content(role="tool", parts=[response])]
+
+    messages = [types.Content(role="user", parts=[types.Part(text="refactor a.py")])]
+    for path in ("a.py", "b.py", "c.py", "a.py", "d.py", "e.py"):
+        messages += read(path)
+    original = list(messages)
+    history = HistoryManager(budget_tokens=4000, keep_recent=2)
+    compacted, before, after = history.compact(messages)
+    result = lambda i: compacted[i].parts[0].function_response.response["Result"]
+    assert messages == original and before > 4000 >= after, (before, after)
+    assert "superseded by a later get_file_content" in result(2)
+    assert result(4).startswith("[compacted] b.py") and len(result(4)) < 600, result(4)
+    # the prompt, the model's own words and the two newest tool turns are kept as they were
+    assert compacted[0] is messages[0] and all(compacted[i] is messages[i] for i in range(1, 13, 2))
+    assert compacted[10] is messages[10] and compacted[12] is messages[12]
+    assert all(len(c.parts) == len(m.parts) for c, m in zip(compacted, messages))
+    assert HistoryManager(budget_tokens=10 ** 6).compact(messages)[0] is messages
+    print("History compaction to a token budget: ok")
+
+
+def check_changeset_rollback():
+    # a session edits one file twice, creates one and edits one that is deleted behind its back
+    root, working_directory = tempfile.mkdtemp(), tempfile.mkdtemp()
+    path = lambda name: os.path.join(working_directory, name)
+    for name in ("a.py", "b.py", "gone.py"):
+        with open(path(name), "w") as f:
+            f.write("same = 1\n")
+    changes = ChangeSet(working_directory, root=root)
+    for name, content in (("a.py", "a = 2\n"), ("a.py", "a = 3\n"), ("b.py", "b = 2\n"), ("new.py", "new\n"),
+                          ("gone.py", "gone = 2\n")):
+        with changes.track("write_file", path(name)):
+            write_file(working_directory, name, content)
+    # the three originals had the same content: one blob, which kept it after the writes
+    blobs = [os.path.join(d, f) for d, _, files in os.walk(os.path.join(root, "blobs")) for f in files]
+    assert len(blobs) == 1 and open(blobs[0]).read() == "same = 1\n", blobs
+    os.remove(path("gone.py"))
+
+    loaded = ChangeSet.load(changes.id, root)
+    assert [e["path"] for e in loaded.entries] == ["a.py", "a.py", "b.py", "new.py", "gone.py"]
+    assert "-same = 1\n+a = 3\n" in loaded.diff() and "+++ b/new.py" in loaded.diff()
+    report = loaded.rollback()
+    assert "gone.py: changed after the session's last write, left alone" in report, report
+    assert not os.path.exists(path("new.py")) and not os.path.exists(path("gone.py"))
+    assert open(path("a.py")).read() == open(path("b.py")).read() == "same = 1\n"
+    assert "gone.py: restored" in ChangeSet.load(changes.id, root).rollback(force=True)
+    assert open(path("gone.py")).read() == "same = 1\n" and ChangeSet.load(changes.id, root).rolled_back
+
+    open(os.path.join(root, "empty.jsonl"), "w").close()
+    try:
+        ChangeSet.load("empty", root)
+        raise AssertionError("an empty change log loaded")
+    except ValueError:
+        pass
+    print("Change-set diff, rollback and blob store: ok")
+
+
+def check_concurrent_search():
+    # one turn's search_code calls run at once; on a cold index they must not race on inserting files
+    working_directory = tempfile.mkdtemp()
+    for i in range(50):
+        with open(os.path.join(working_directory, f"m{i}.py"), "w") as f:
+            f.write(f"def handler_{i}():\n    return {i}\n")
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda q: search_code(working_directory, q), ["handler_1", "handler_2", "return", "def"]))
+    assert not any(r.startswith("Error") or "'error'" in r for r in results), results
+    print("Concurrent search on a cold index: ok")
+
+
+def check_search_sees_other_process():
+    # another process (batch, serve, a second CLI) indexes a new file; this one must not prune it
+    working_directory = tempfile.mkdtemp()
+    with open(os.path.join(working_directory, "a.py"), "w") as f:
+        f.write("def alpha():\n    pass\n")
+    assert "a.py:1:" in search_code(working_directory, "alpha")
+    with open(os.path.join(working_directory, "b.py"), "w") as f:
+        f.write("ZEBRAFISH = 1\n")
+    subprocess.run([sys.executable, "-c", "import sys; from coding_agent.functions.search_code import update_index; "
+                    "update_index(sys.argv[1])", working_directory], check=True)
+    result = search_code(working_directory, "zebrafish")
+    assert "b.py:1:" in result, result
+    print("Search sees files indexed by another process: ok")
+
+
+def check_run_limits():
+    # cold runs get their limits from an exec'd wrapper; the script must see them and its own argv
+    working_directory = tempfile.mkdtemp()
+    with open(os.path.join(working_directory, "limits.py"), "w") as f:
+        f.write("import resource, sys\nprint(resource.getrlimit(resource.RLIMIT_NOFILE)[0], sys.argv[1:])\n")
+    result = run_python_file(working_directory, "limits.py", ["x"], limits={"open_files": 50})
+    assert "50 ['x']" in result and "return code 0" in result, result
+    print("Script limits applied to a cold run: ok")
+
+
+def check_context_cache():
+    # StubCaches stands in for the caching endpoint: one create, then every later turn refers to it
+    turns = [[types.Part(function_call=types.FunctionCall(name="get_files_info", args={}))], ["done"]]
+    client = ScriptedClient(turns)
+    cache = ContextCache()
+    result = asyncio.run(run_async("list", work_dir_path=tempfile.mkdtemp(), client=client, context_cache=cache))
+    assert result["text"] == "done" and client.aio.caches.created == 1, (result, client.aio.caches.created)
+    assert cache.stats() == {"hits": 2, "created": 1, "reused": 0, "refreshed": 0, "fallbacks": 0}, cache.stats()
+
+    # an expired cache or a different prefix is created again
+    caches = StubCaches()
+    stub = SimpleNamespace(aio=SimpleNamespace(caches=caches))
+    cache = ContextCache(ttl=1, refresh=0)
+    config = types.GenerateContentConfig(system_instruction="be brief")
+    for _ in range(2):
+        prepared, prefix = asyncio.run(cache.prepare(stub, MODEL_NAME, config))
+    assert prepared.cached_content and prepared.system_instruction is None and prefix == []
+    assert caches.created == 1
+    time.sleep(1.1)
+    asyncio.run(cache.prepare(stub, MODEL_NAME, config))
+    assert caches.created == 2
+    asyncio.run(cache.prepare(stub, MODEL_NAME, types.GenerateContentConfig(system_instruction="be verbose")))
+    assert caches.created == 3 and cache.hits == 4
+
+    # a prefix the endpoint refuses falls back to plain requests, and is not offered again
+    caches = StubCaches(min_tokens=10 ** 6)
+    stub = SimpleNamespace(aio=SimpleNamespace(caches=caches))
+    cache = ContextCache("pinned file")
+    for _ in range(2):
+        prepared, prefix = asyncio.run(cache.prepare(stub, MODEL_NAME, config))
+        assert prepared is config and prefix == cache.pinned
+    assert cache.fallbacks == 2 and cache.hits == 0 and caches.created == 0
+    print("Context cache against the stub endpoint: ok")
+
+
+def check_routing_and_budgets():
+    policy = RoutingPolicy(light_model="light", default_model="full", read_tokens=100, write_tokens=1000,
+                           max_tokens=1500, large_history_tokens=5000)
+    route = policy.route("explain main.py", 0, 100, [], None, False)
+    assert (route.model, route.max_output_tokens) == ("light", 100)
+    # a write escalates to the full model, a read-only turn after it goes back to the light one
+    route = policy.route("explain main.py", 1, 100, ["write_file"], route, False)
+    assert (route.model, route.max_output_tokens) == ("full", 1000)
+    route = policy.route("explain main.py", 2, 100, ["get_file_content"], route, False)
+    assert (route.model, route.max_output_tokens) == ("light", 100)
+    assert policy.route("fix the bug", 0, 100, [], None, False).model == "light"
+    assert policy.route("fix the bug", 1, 100, ["get_file_content"], None, False).model == "full"
+    assert policy.route("explain main.py", 1, 6000, [], None, False).model == "full"
+    # a response cut off at its cap is retried with twice the room, up to max_tokens
+    route = policy.route("explain main.py", 3, 100, [], Route("full", 1000, "x"), True)
+    assert (route.model, route.max_output_tokens) == ("full", 1500)
+
+    def read_turn(tokens):
+        return [types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(
+                function_call=types.FunctionCall(name="get_files_info", args={}))]))],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(prompt_token_count=tokens,
+                                                                      candidates_token_count=10))]
+
+    working_directory = tempfile.mkdtemp()
+    engine = AgentEngine(ScriptedClient([read_turn(600), read_turn(600), ["done"]]), token_budget=1000)
+    result = engine.run("list", working_directory)
+    assert result["status"] == "budget_exceeded" and "token budget of 1000" in result["message"], result
+
+    # the time budget also ends a batch of tool calls: the call queued behind a slow script is not run
+    with open(os.path.join(working_directory, "slow.py"), "w") as f:
+        f.write("import time\ntime.sleep(1)\n")
+    turns = [[types.Part(function_call=types.FunctionCall(name="run_python_file", args={"file_path": "slow.py"})),
+              types.Part(function_call=types.FunctionCall(name="get_files_info", args={}))], ["done"]]
+    started = time.monotonic()
+    result = AgentEngine(ScriptedClient(turns), time_budget=0.3).run("run it", working_directory)
+    responses = result["messages"][-1].parts
+    assert result["status"] == "budget_exceeded" and time.monotonic() - started < 3, result
+    assert "return code 0" in responses[0].function_response.response["Result"]
+    assert responses[1].function_response.response["error"].startswith("Not run: time budget of 0.3s")
+    print("Routing and session budgets: ok")
+
+
+def check_warm_pool():
+    # a script's own sandbox.py must win over the fork server's helper; a dead worker is replaced, not kept
+    working_directory = tempfile.mkdtemp()
+    with open(os.path.join(working_directory, "sandbox.py"), "w") as f:
+        f.write("OWNER = 'script'\n")
+    with open(os.path.join(working_directory, "main.py"), "w") as f:
+        f.write("import sandbox\nprint(sandbox.OWNER)\n")
+    with WarmPool(1) as pool:
+        assert "STDOUT:\nscript\n" in run_python_file(working_directory, "main.py", pool=pool)
+        worker = pool._idle.get()
+        worker.process.kill()
+        worker.process.wait()
+        pool._idle.put(worker)
+        assert "STDOUT:\nscript\n" in run_python_file(working_directory, "main.py", pool=pool)
+        assert len(pool._all) == 1 and worker not in pool._all
+    print("Warm pool isolates scripts and replaces dead workers: ok")
+
+
+def check_response_cache_skips_empty():
+    # an empty answer is not stored, so the next run asks the model again
+    cache = ResponseCache(tempfile.mkdtemp())
+    client = CachingClient(ScriptedClient([[], ["hello"], ["unused"]]), cache)
+    first = asyncio.run(run_async("hi", work_dir_path=tempfile.mkdtemp(), client=client))
+    second = asyncio.run(run_async("hi", work_dir_path=tempfile.mkdtemp(), client=client))
+    third = asyncio.run(run_async("hi", work_dir_path=tempfile.mkdtemp(), client=client))
+    assert first["status"] == "error" and second["text"] == third["text"] == "hello", (first, second, third)
+    assert client.client.calls == 2 and cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2, cache.stats()
+    print("Response cache does not store empty responses: ok")
+
+
+def check_batch_retries_429():
+    # the first requests are refused with 429; the stream is lazy, so the retry must cover reading it
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            requests.append(self.path)
+            if len(requests) <= 2:
+                status, kind = 429, "application/json"
+                body = json.dumps({"error": {"code": 429, "message": "slow down", "status": "RESOURCE_EXHAUSTED"}})
+            else:
+                status, kind = 200, "text/event-stream"
+                body = "data: " + json.dumps({"candidates": [{"content": {"role": "model", "parts": [{"text": "done"}]}}]})
+                body += "\r\n\r\n"
+            self.send_response(status)
+            self.send_header("Content-Type", kind)
+            self.send_header("Content-Length", str(len(body.encode())))
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = genai.Client(api_key="test", http_options=types.HttpOptions(
+            base_url=f"http://127.0.0.1:{server.server_address[1]}"))
+        throttled = ThrottledClient(client, RateLimiter(0), max_retries=3, backoff=0.01)
+        result = asyncio.run(run_async("hi", work_dir_path=tempfile.mkdtemp(), client=throttled))
+    finally:
+        server.shutdown()
+    assert result["text"] == "done" and throttled.retries == 2 and len(requests) == 3, (result, throttled.retries)
+    print("Batch client retries 429 responses: ok")
+
+
+def check_session_resume_after_crash():
+    # a crash cut the last line short; what the resumed session appends must still load
+    root = tempfile.mkdtemp()
+    call = types.Part(function_call=types.FunctionCall(name="get_files_info", args={}))
+    response = types.Part(function_response=types.FunctionResponse(name="get_files_info", response={"Result": "x"}))
+    messages = [types.Content(role="user", parts=[types.Part(text="list")]), types.Content(role="model", parts=[call]),
+                types.Content(role="tool", parts=[response]), types.Content(role="model", parts=[types.Part(text="ok")])]
+    log = SessionLog(root, root=root)
+    log.save(messages)
+    with open(os.path.join(root, f"{log.id}.jsonl"), "a") as f:
+        f.write('{"parts":[{"function_call":{"na')
+    resumed = SessionLog.load(log.id, root)
+    assert resumed.messages == messages, resumed.messages
+    more = [types.Content(role="user", parts=[types.Part(text="again")]),
+            types.Content(role="model", parts=[types.Part(text="done")])]
+    resumed.save(resumed.messages + more)
+    assert SessionLog.load(log.id, root).messages == messages + more
+    print("Session resumed after a crash keeps its new turns: ok")
+
+
+def check_resume_after_user_turn():
+    # a crash right after the prompt was saved: carrying on must not add a second user turn
+    log = SessionLog(tempfile.mkdtemp())
+    log.save([types.Content(role="user", parts=[types.Part(text="say hi")])])
+    requests = []
+    client = ScriptedClient(lambda contents: requests.append([c.role for c in contents]) or ["hi"])
+    result = AgentEngine(client).run(None, resume=log.id)
+    assert result["text"] == "hi" and requests == [["user"]], (result, requests)
+    print("Resume of a session saved on its user turn: ok")
+
+
+def check_max_iters_status():
+    # a session that never answers must not look finished, so batch runs it again on resume
+    working_directory = tempfile.mkdtemp()
+    client = ScriptedClient(lambda contents: [types.Part(function_call=types.FunctionCall(name="get_files_info",
+                                                                                          args={}))])
+    output = os.path.join(working_directory, "results.jsonl")
+    jobs = [{"id": "loop", "prompt": "list", "work_dir": working_directory}]
+    for _ in range(2):
+        summary = asyncio.run(run_batch(jobs, output, client, max_iters=2))
+        assert summary["max_iters"] == 1 and summary["skipped"] == 0, summary
+    with open(output) as f:
+        record = json.loads(f.readline())
+    assert record["status"] == "max_iters" and "2 iterations" in record["message"], record
+    print("Iteration cap reported as max_iters: ok")
+
 
 def main():
     # working_directory = "dummy"
@@ -28,9 +416,35 @@ def main():
     # run_result = run_python_file(working_directory, "test_folder/test.py")
     # print("Run Result:\n", run_result)
     
-    working_directory = ""
-    run_result = run_python_file(working_directory, "main.py", args=["what is 1+1 give in 1 token"])
-    print("Run Result:\n", run_result)
+    # offline: the scripted model writes a script, runs it and answers, no API key needed
+    working_directory = tempfile.mkdtemp()
+    turns = [
+        [types.Part(function_call=types.FunctionCall(
+            name="write_file", args={"file_path": "add.py", "content": "print(1 + 1)"}))],
+        [types.Part(function_call=types.FunctionCall(name="run_python_file", args={"file_path": "add.py"}))],
+        ["1 + 1 = 2"],
+    ]
+    result = asyncio.run(run_async("what is 1+1", work_dir_path=working_directory, client=ScriptedClient(turns)))
+    print("Run Result:\n", run_python_file(working_directory, "add.py"))
+    print("Agent answer:", result["text"])
+
+    check_edit_crlf()
+    check_edit_ignores_locale()
+    check_long_line_paging()
+    check_tool_cache_listings()
+    check_history_compaction()
+    check_changeset_rollback()
+    check_concurrent_search()
+    check_search_sees_other_process()
+    check_run_limits()
+    check_context_cache()
+    check_routing_and_budgets()
+    check_warm_pool()
+    check_response_cache_skips_empty()
+    check_batch_retries_429()
+    check_session_resume_after_crash()
+    check_resume_after_user_turn()
+    check_max_iters_status()
     
     
     